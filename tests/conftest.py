@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+import shutil
+
+import pytest
+from uszipcode.search import SearchEngine
+from uszipcode.db import DEFAULT_SIMPLE_DB_FILE_PATH
+
+
+@pytest.fixture
+def db_file_path(tmp_path):
+    """
+    A copy of the simple database file in a temp dir, so sidecar files are
+    written next to it.
+    """
+    SearchEngine().close()  # download the db file if not exists
+    path = str(tmp_path / "simple_db.sqlite")
+    shutil.copy(DEFAULT_SIMPLE_DB_FILE_PATH.abspath, path)
+    return path
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from pathlib_mate import Path
+from uszipcode.cache import LRUCache, NOTHING
+
+
+class TestLRUCache(object):
+    def test(self):
+        with pytest.raises(ValueError):
+            LRUCache(maxsize=0)
+
+        cache = LRUCache(maxsize=2)
+        assert cache.hit_rate == 0.0
+
+        cache.put("a", 1)
+        cache.put("b", None)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") is NOTHING
+        assert cache.get("c", 0) == 0
+        assert (cache.hits, cache.misses) == (2, 2)
+        assert cache.hit_rate == 0.5
+
+        # "a" is the least recently used one
+        cache.get("b")
+        cache.put("c", 3)
+        assert "a" not in cache
+        assert len(cache) == 2
+
+        cache.clear()
+        assert len(cache) == 0
+        assert (cache.hits, cache.misses) == (0, 0)
+
+    def test_ttl(self):
+        with pytest.raises(ValueError):
+            LRUCache(ttl=0)
+
+        now = [0.0, ]
+        cache = LRUCache(maxsize=2, ttl=10, timer=lambda: now[0])
+        cache.put("a", 1)
+        now[0] = 5.0
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+
+        now[0] = 10.0
+        assert cache.get("a") is NOTHING
+        assert "a" not in cache
+        assert cache.get("b") == 2
+
+        cache.put("c", 3)
+        cache.put("d", 4)
+        assert cache.stats() == dict(
+            size=2, maxsize=2, hits=2, misses=1, hit_rate=2 / 3,
+            evictions=1, expirations=1,
+        )
+
+    def test_dump_and_load(self):
+        path = Path(__file__).change(new_basename="lru_cache.json")
+        path.remove_if_exists()
+
+        cache = LRUCache(maxsize=2)
+        cache.put(("new york", "ny"), ("New York", "NY"))
+        cache.put(("unknown", None), None)
+        cache.dump(path.abspath)
+
+        new_cache = LRUCache(maxsize=2)
+        new_cache.load(path.abspath)
+        assert new_cache.get(("new york", "ny")) == ["New York", "NY"]
+        assert new_cache.get(("unknown", None)) is None
+
+        path.remove_if_exists()
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
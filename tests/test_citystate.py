@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import sqlite3
+
+import pytest
+from uszipcode.search import SearchEngine, SimpleZipcode
+from uszipcode.citystate import (
+    get_city_state_file_path, ensure_city_state_file, build_city_state_data,
+)
+
+
+def test_build_city_state_data():
+    city_list, state_to_city_mapper, city_to_state_mapper = build_city_state_data([
+        ("Springfield", "il"),
+        ("Chicago", "IL"),
+        ("Springfield", "MA"),
+        ("Springfield", "IL"),
+        ("Nowhere", None),
+        (None, "NY"),
+    ])
+    assert city_list == ["Chicago", "Nowhere", "Springfield"]
+    assert list(state_to_city_mapper.items()) == [
+        ("IL", ["Chicago", "Springfield"]),
+        ("MA", ["Springfield"]),
+    ]
+    assert list(city_to_state_mapper.items()) == [
+        ("Chicago", ["IL"]),
+        ("Springfield", ["IL", "MA"]),
+    ]
+
+
+def test_ensure_city_state_file(db_file_path, tmp_path):
+    city_state_file_path = ensure_city_state_file(
+        db_file_path, SimpleZipcode.__tablename__,
+    )
+    assert city_state_file_path == get_city_state_file_path(db_file_path)
+    assert city_state_file_path.endswith("simple_db.citystate.json")
+
+    # a copy of the db file and the sidecar file, like an install, is valid
+    copy_dir = tmp_path / "copy"
+    copy_dir.mkdir()
+    copy_db_file_path = str(copy_dir / "simple_db.sqlite")
+    shutil.copy(db_file_path, copy_db_file_path)
+    shutil.copy(city_state_file_path, get_city_state_file_path(copy_db_file_path))
+    mtime = os.stat(get_city_state_file_path(copy_db_file_path)).st_mtime_ns
+    ensure_city_state_file(copy_db_file_path, SimpleZipcode.__tablename__)
+    assert os.stat(get_city_state_file_path(copy_db_file_path)).st_mtime_ns == mtime
+
+    # rebuilt if the db file is changed
+    conn = sqlite3.connect(db_file_path)
+    conn.execute("UPDATE simple_zipcode SET major_city = 'Uszipcode City'")
+    conn.commit()
+    conn.close()
+    ensure_city_state_file(db_file_path, SimpleZipcode.__tablename__)
+    with open(city_state_file_path, "r", encoding="utf-8") as f:
+        assert json.load(f)["city_list"] == ["Uszipcode City", ]
+
+
+def test_use_city_state_file(db_file_path):
+    expected = SearchEngine(db_file_path=db_file_path)
+    city_state_file_path = get_city_state_file_path(db_file_path)
+
+    search = SearchEngine(db_file_path=db_file_path, use_city_state_file=True)
+    assert search.city_list == expected.city_list
+    assert os.path.exists(city_state_file_path)
+
+    # the next engine loads the tables from the file, not the table
+    search = SearchEngine(db_file_path=db_file_path, use_city_state_file=True)
+    search.ses.execute = None
+    assert search.city_list == expected.city_list
+    assert search.state_list == expected.state_list
+    assert search.state_to_city_mapper == expected.state_to_city_mapper
+    assert search.city_to_state_mapper == expected.city_to_state_mapper
+
+    # a broken file is rebuilt
+    with open(city_state_file_path, "w") as f:
+        f.write("{")
+    search = SearchEngine(db_file_path=db_file_path, use_city_state_file=True)
+    assert search.city_to_state_mapper == expected.city_to_state_mapper
+    with open(city_state_file_path, "r", encoding="utf-8") as f:
+        assert json.load(f)["city_list"] == expected.city_list
+
+
+def test_warmup_city_state(db_file_path):
+    search = SearchEngine(
+        db_file_path=db_file_path,
+        use_city_state_file=True,
+        warmup_city_state=True,
+    )
+    search._warmup_thread.join()
+    assert search._city_to_state_mapper is not None
+    assert os.path.exists(get_city_state_file_path(db_file_path))
+
+    expected = SearchEngine(db_file_path=db_file_path)
+    assert search.city_list == expected.city_list
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
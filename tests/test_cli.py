@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import csv
+
+import pytest
+from uszipcode.cli import main, enrich
+from uszipcode.search import SearchEngine
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def read_csv(path):
+    with open(path, "r", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_enrich_by_coordinates(tmp_path):
+    in_path = str(tmp_path / "points.csv")
+    out_path = str(tmp_path / "out.csv")
+    write_csv(in_path, [
+        dict(id="1", lat="38.897835", lng="-77.036541"),  # White House
+        dict(id="2", lat="", lng="-77.036541"),
+        dict(id="3", lat="40.750742", lng="-73.996530"),  # New York
+    ] * 5)
+
+    assert main([
+        "enrich", "--in", in_path, "--out", out_path,
+        "--lat-col", "lat", "--lng-col", "lng",
+        "--fields", "major_city,state", "--workers", "2", "--chunk-size", "2",
+    ]) == 0
+
+    with SearchEngine() as search:
+        expected = search.by_coordinates(38.897835, -77.036541, returns=1)[0]
+
+    rows = read_csv(out_path)
+    assert len(rows) == 15
+    assert list(rows[0]) == [
+        "id", "lat", "lng", "zipcode", "dist_in_miles", "major_city", "state",
+    ]
+    assert [row["id"] for row in rows] == ["1", "2", "3"] * 5
+    for row in rows[0::3]:
+        assert row["zipcode"] == expected.zipcode
+        assert row["state"] == expected.state
+    for row in rows[1::3]:
+        assert row["zipcode"] == ""
+        assert row["state"] == ""
+
+
+def test_enrich_by_zipcode(tmp_path):
+    in_path = str(tmp_path / "users.csv")
+    out_path = str(tmp_path / "out.csv")
+    write_csv(in_path, [
+        dict(id="1", zip="10001"),
+        dict(id="2", zip="123456789"),
+        dict(id="3", zip=""),
+    ])
+
+    n_rows = enrich(
+        in_path, out_path, zipcode_col="zip", fields=["state"], prefix="z_",
+        workers=1,
+    )
+    assert n_rows == 3
+    rows = read_csv(out_path)
+    assert [row["z_state"] for row in rows] == ["NY", "", ""]
+
+
+def test_enrich_parquet(tmp_path):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+
+    in_path = str(tmp_path / "users.csv")
+    out_path = str(tmp_path / "out.parquet")
+    write_csv(in_path, [dict(zip="10001"), dict(zip="")])
+    enrich(
+        in_path, out_path, zipcode_col="zip",
+        fields=["state", "population", "lat"], workers=1,
+    )
+    table = pyarrow_parquet.read_table(out_path)
+    assert table.column("state").to_pylist() == ["NY", None]
+    assert table.schema.field("population").type == "int64"
+
+
+def test_invalid_arguments(tmp_path):
+    in_path = str(tmp_path / "users.csv")
+    write_csv(in_path, [dict(zip="10001")])
+    assert main([
+        "enrich", "--in", in_path, "--out", str(tmp_path / "out.csv"),
+    ]) == 1
+    assert main([
+        "enrich", "--in", in_path, "--out", str(tmp_path / "out.csv"),
+        "--zipcode-col", "zip", "--fields", "InValid Field",
+    ]) == 1
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import shutil
+import sqlite3
+
 import pytest
 from pathlib_mate import Path
 from uszipcode.db import (
     download_db_file,
+    get_db_file_signature,
     SIMPLE_DB_FILE_DOWNLOAD_URL,
     COMPREHENSIVE_DB_FILE_DOWNLOAD_URL,
 )
@@ -35,6 +39,25 @@ def test_download_db_file():
     pass
 
 
+
+def test_get_db_file_signature(db_file_path, tmp_path):
+    signature = get_db_file_signature(db_file_path, "1", "simple_zipcode")
+    assert signature.startswith("1|simple_zipcode|")
+
+    # the same content has the same signature
+    copy_db_file_path = str(tmp_path / "copy.sqlite")
+    shutil.copy(db_file_path, copy_db_file_path)
+    assert get_db_file_signature(copy_db_file_path, "1", "simple_zipcode") == signature
+    assert get_db_file_signature(copy_db_file_path, "2", "simple_zipcode") != signature
+
+    # any write changes the signature
+    conn = sqlite3.connect(copy_db_file_path)
+    conn.execute("UPDATE simple_zipcode SET population = 0 WHERE zipcode = '10001'")
+    conn.commit()
+    conn.close()
+    assert get_db_file_signature(copy_db_file_path, "1", "simple_zipcode") != signature
+
+
 if __name__ == "__main__":
     import os
 
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+import os
+import gzip
+import lzma
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from uszipcode.download import (
+    download_file, get_part_file_path, get_state_file_path,
+    DownloadError, CompressionEnum, detect_compression,
+)
+
+DATA = os.urandom(100 * 1024 + 123)
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+COMPRESSED = {
+    "/data.sqlite.gz": gzip.compress(DATA),
+    "/data.sqlite.xz": lzma.compress(DATA),
+    "/truncated.sqlite.xz": lzma.compress(DATA)[:-100],
+}
+try:
+    import zstandard
+
+    COMPRESSED["/data.sqlite.zst"] = zstandard.ZstdCompressor().compress(DATA)
+except ImportError:  # pragma: no cover
+    pass
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Serve ``DATA`` at ``/ranged`` with range request support, at ``/plain``
+    without it, ``/missing`` is 404. ``fail_ranges`` is a set of range start
+    that fail once with 500. ``COMPRESSED`` files are served as is. Paths
+    prefixed with ``/no_head`` reject ``HEAD`` with 403, like presigned S3
+    urls.
+    """
+
+    fail_ranges = set()
+    range_requests = list()
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self, status, length, ranged):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        if ranged:
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", '"{}"'.format(SHA256))
+        self.end_headers()
+
+    def do_HEAD(self):
+        if self.path.startswith("/no_head"):
+            self._send_headers(403, 0, False)
+        elif self.path in COMPRESSED:
+            self._send_headers(200, len(COMPRESSED[self.path]), True)
+        elif self.path == "/missing":
+            self._send_headers(404, 0, False)
+        else:
+            self._send_headers(200, len(DATA), self.path == "/ranged")
+
+    def do_GET(self):
+        path = self.path
+        if path.startswith("/no_head"):
+            path = path[len("/no_head"):]
+        if path in COMPRESSED:
+            self._send_headers(200, len(COMPRESSED[path]), False)
+            self.wfile.write(COMPRESSED[path])
+            return
+        if path == "/missing":
+            self._send_headers(404, 0, False)
+            return
+        range_header = self.headers.get("Range")
+        if (path == "/ranged") and range_header:
+            start, end = range_header.split("=")[1].split("-")
+            start, end = int(start), int(end)
+            self.range_requests.append(start)
+            if start in self.fail_ranges:
+                self.fail_ranges.remove(start)
+                self._send_headers(500, 0, False)
+                return
+            body = DATA[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header(
+                "Content-Range", "bytes {}-{}/{}".format(start, end, len(DATA))
+            )
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_headers(200, len(DATA), False)
+            self.wfile.write(DATA)
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_download_file(base_url, tmp_path):
+    path = str(tmp_path / "ranged.sqlite")
+    download_file(
+        base_url + "/ranged", path,
+        sha256=SHA256, part_size=10 * 1024, n_workers=4, chunk_size=1000,
+    )
+    assert read(path) == DATA
+    assert not os.path.exists(get_part_file_path(path))
+    assert not os.path.exists(get_state_file_path(path))
+
+    path = str(tmp_path / "plain.sqlite")
+    download_file(base_url + "/plain", path, sha256=SHA256)
+    assert read(path) == DATA
+
+
+def test_head_rejected(base_url, tmp_path):
+    # falls back to a GET range request
+    path = str(tmp_path / "ranged.sqlite")
+    Handler.range_requests.clear()
+    download_file(
+        base_url + "/no_head/ranged", path, sha256=SHA256, part_size=10 * 1024,
+    )
+    assert read(path) == DATA
+    assert 10 * 1024 in Handler.range_requests
+
+    # then to a single GET
+    path = str(tmp_path / "plain.sqlite")
+    download_file(base_url + "/no_head/plain", path, sha256=SHA256)
+    assert read(path) == DATA
+
+
+def test_resume(base_url, tmp_path):
+    path = str(tmp_path / "resume.sqlite")
+    part_size = 10 * 1024
+    Handler.range_requests.clear()
+    Handler.fail_ranges = {3 * part_size, 7 * part_size}
+    with pytest.raises(DownloadError):
+        download_file(
+            base_url + "/ranged", path, part_size=part_size, n_workers=2,
+        )
+    assert not os.path.exists(path)
+    assert os.path.exists(get_state_file_path(path))
+
+    # only the failed parts are fetched again
+    Handler.range_requests.clear()
+    download_file(base_url + "/ranged", path, part_size=part_size, sha256=SHA256)
+    assert sorted(Handler.range_requests) == [3 * part_size, 7 * part_size]
+    assert read(path) == DATA
+
+
+def test_mirror_and_checksum(base_url, tmp_path):
+    path = str(tmp_path / "mirror.sqlite")
+    download_file(
+        [base_url + "/missing", base_url + "/ranged"], path, sha256=SHA256,
+    )
+    assert read(path) == DATA
+
+    path = str(tmp_path / "bad.sqlite")
+    with pytest.raises(DownloadError):
+        download_file(base_url + "/ranged", path, sha256="0" * 64)
+    assert not os.path.exists(path)
+    assert not os.path.exists(get_part_file_path(path))
+
+
+def test_detect_compression():
+    assert detect_compression("https://host/simple_db.sqlite") is None
+    assert detect_compression("https://host/simple_db.sqlite.gz") is CompressionEnum.gzip
+    assert detect_compression("https://host/simple_db.sqlite.xz?sig=1") is CompressionEnum.xz
+    assert detect_compression("https://host/simple_db.sqlite.ZST") is CompressionEnum.zstd
+    assert detect_compression("https://host/simple_db.sqlite.zstd") is CompressionEnum.zstd
+
+
+def test_compressed(base_url, tmp_path):
+    for url_path, data in COMPRESSED.items():
+        if url_path.startswith("/truncated"):
+            continue
+        path = str(tmp_path / "compressed.sqlite")
+        download_file(
+            base_url + url_path, path,
+            sha256=hashlib.sha256(data).hexdigest(), chunk_size=1000,
+        )
+        assert read(path) == DATA
+
+    path = str(tmp_path / "truncated.sqlite")
+    with pytest.raises(DownloadError):
+        download_file(base_url + "/truncated.sqlite.xz", path)
+    assert not os.path.exists(path)
+
+    # falls back to the next mirror
+    download_file(
+        [base_url + "/truncated.sqlite.xz", base_url + "/data.sqlite.xz"], path,
+    )
+    assert read(path) == DATA
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+import pyarrow.ipc
+import pyarrow.parquet
+import sqlalchemy as sa
+import sqlalchemy_mate as sam
+import sqlalchemy_mate.api
+from uszipcode.search import SearchEngine, ComprehensiveZipcode
+from uszipcode.export import ExportFormatEnum, infer_schema, export
+
+
+class TestExport:
+    search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.comprehensive,
+    )
+
+    def test_infer_schema(self):
+        stmt = sa.select(
+            ComprehensiveZipcode.__table__.c.zipcode,
+            ComprehensiveZipcode.__table__.c.population,
+            ComprehensiveZipcode.__table__.c.lat,
+            ComprehensiveZipcode.__table__.c.polygon,
+        )
+        schema = infer_schema(self.search.engine, stmt, batch_size=100)
+        assert schema.field("zipcode").type == pa.string()
+        assert schema.field("population").type == pa.int64()
+        assert schema.field("lat").type == pa.float64()
+        assert pa.types.is_list(schema.field("polygon").type)
+
+    def test_export(self, tmp_path):
+        columns = ["zipcode", "state", "population", "polygon"]
+        filters = [ComprehensiveZipcode.state == "DC"]
+        expected = self.search.query(state="DC", zipcode_type=None, returns=None)
+
+        for format in ExportFormatEnum:
+            path = str(tmp_path / "zipcode.{}".format(format.value))
+            n_rows = self.search.export(
+                path,
+                format=format.value,
+                columns=columns,
+                filters=filters,
+                batch_size=7,
+            )
+            assert n_rows == len(expected)
+
+            if format is ExportFormatEnum.parquet:
+                table = pyarrow.parquet.read_table(path)
+                assert pyarrow.parquet.ParquetFile(path).num_row_groups \
+                       == (n_rows + 6) // 7
+            else:
+                table = pyarrow.ipc.open_file(path).read_all()
+            assert table.column_names == columns
+            assert table.column("zipcode").to_pylist() == \
+                   [z.zipcode for z in expected]
+            assert table.column("polygon").to_pylist() == \
+                   [z.polygon for z in expected]
+
+    def test_invalid_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            self.search.export(str(tmp_path / "zipcode.csv"), format="csv")
+
+
+def test_incompatible_json(tmp_path):
+    metadata = sa.MetaData()
+    t = sa.Table(
+        "t", metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("data", sam.types.api.CompressedJSONType),
+    )
+    engine = sa.create_engine("sqlite://")
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(t.insert(), [
+            dict(id=1, data={"x": 1}),
+            dict(id=2, data={"x": "a"}),
+            dict(id=3, data=None),
+        ])
+
+    path = str(tmp_path / "t.parquet")
+    stmt = sa.select(t.c.id, t.c.data).order_by(t.c.id)
+    assert export(engine, stmt, path, batch_size=1) == 3
+    table = pyarrow.parquet.read_table(path)
+    assert table.column("data").to_pylist() == [
+        json.dumps({"x": 1}), json.dumps({"x": "a"}), None,
+    ]
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+from fuzzywuzzy.fuzz import WRatio
+from fuzzywuzzy.process import extract, extractOne
+from uszipcode.fuzzy import to_trigrams, FuzzyIndex
+
+
+def test_to_trigrams():
+    assert to_trigrams("Ab") == {"  a", " ab", "ab "}
+    assert to_trigrams("New-York") == to_trigrams("new york")
+    assert to_trigrams("") == set()
+
+
+class TestFuzzyIndex(object):
+    choices = [
+        "Arlington", "Boston", "Dickerson", "Dickerson Run", "Emerson",
+        "Ericson", "Everson", "Keldron", "New York", "New York Mills",
+        "Nickerson", "Phoenix", "Saint Louis", "San Francisco",
+    ]
+    fuzzy_index = FuzzyIndex(choices, n_candidates=5)
+
+    def test_candidates(self):
+        assert len(self.fuzzy_index) == len(self.choices)
+        candidates = self.fuzzy_index.candidates("kerson")
+        assert len(candidates) == 5
+        assert "Nickerson" in candidates
+        assert candidates == sorted(candidates)
+
+        # no shared trigram, all choices are candidates
+        assert self.fuzzy_index.candidates("xq") == self.choices
+
+    def test_extract(self):
+        for query in ["phonix", "arlingten", "san fran", "newyork", "kerson"]:
+            assert self.fuzzy_index.extract_one(query) \
+                   == extractOne(query, self.choices)
+            # low score fillers may differ, they are never above min_similarity
+            assert [
+                (choice, score)
+                for choice, score in self.fuzzy_index.extract(query, limit=3)
+                if score >= 70
+            ] == [
+                (choice, score)
+                for choice, score in extract(query, self.choices, limit=3)
+                if score >= 70
+            ]
+
+
+def test_extract_one_many_choices():
+    # many long names share trigrams with the query by chance
+    rnd = random.Random(0)
+    bases = [
+        "Spring", "Green", "Oak", "Maple", "Cedar", "River", "Fair", "Rock",
+        "Pine", "Brook", "Mill", "Glen", "Ridge", "Salem", "Franklin",
+        "Clinton", "Madison", "Arlington", "Washington", "Jackson", "Lincoln",
+        "Chester", "Dover", "Kingston", "Newport", "Milton", "Dayton",
+    ]
+    prefixes = ["", "", "North ", "South ", "East ", "West ", "New ", "Mount ", "Fort "]
+    suffixes = ["", "field", "ville", "ton", "dale", "wood", "port", "burg"]
+    postfixes = ["", "", " Springs", " Heights", " City", " Junction", " Falls", " Village"]
+    cities = sorted({
+        rnd.choice(prefixes) + rnd.choice(bases) + rnd.choice(suffixes) + rnd.choice(postfixes)
+        for _ in range(1000)
+    })
+    fuzzy_index = FuzzyIndex(cities, n_candidates=20)
+
+    for _ in range(40):
+        chars = list(rnd.choice(cities).lower())
+        for _ in range(rnd.randint(0, 2)):
+            chars[rnd.randrange(len(chars))] = rnd.choice("abcdefghijklmnopqrstuvwxyz")
+        query = "".join(chars)
+        if rnd.random() < 0.3:
+            query = query.split(" ")[0]
+
+        # the best choice may differ if several choices have the best score
+        city, score = fuzzy_index.extract_one(query)
+        assert score == extractOne(query, cities)[1]
+        assert WRatio(query, city) == score
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
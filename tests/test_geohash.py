@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+from haversine import haversine, Unit
+from uszipcode.search import SearchEngine, SimpleZipcode
+from uszipcode.geohash import (
+    GeohashIndex,
+    encode_geohash, geohash_bounds, geohash_neighbors, precision_for_radius,
+)
+
+
+def brute_force(records, lat, lng, radius=None, zipcode_type=None):
+    pairs = list()
+    for zipcode, z_type, z_lat, z_lng in records:
+        if (zipcode_type is not None) and (z_type != zipcode_type):
+            continue
+        dist = haversine((z_lat, z_lng), (lat, lng), unit=Unit.MILES)
+        if (radius is None) or (dist <= radius):
+            pairs.append((dist, zipcode))
+    pairs.sort()
+    return pairs
+
+
+def test_encode_geohash():
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    west, south, east, north = geohash_bounds("u4pruydqqvj")
+    assert west <= 10.40744 <= east
+    assert south <= 57.64911 <= north
+
+    neighbors = geohash_neighbors("dqcj")
+    assert len(neighbors) == 8
+    assert "dqcj" not in neighbors
+    # across the antimeridian
+    assert "800" in geohash_neighbors("xbp")
+
+    assert precision_for_radius(38.9, 0.1) > precision_for_radius(38.9, 25)
+    assert precision_for_radius(38.9, 5000) == 0
+
+
+class TestGeohashIndex(object):
+    random.seed(0)
+    records = [
+        (
+            str(i).zfill(5),
+            random.choice(["STANDARD", "PO BOX"]),
+            random.uniform(18, 72),
+            random.uniform(-179, -65),
+        )
+        for i in range(2000)
+    ]
+    records.append(("99999", "STANDARD", None, None))
+    index = GeohashIndex(records)
+
+    def test_query(self):
+        records = self.records[:-1]
+        assert len(self.index) == len(records)
+        random.seed(1)
+        for _ in range(50):
+            lat, lng = random.uniform(18, 72), random.uniform(-179, -65)
+            for radius in [1, 10, 50, 200, 3000]:
+                assert self.index.query_radius(lat, lng, radius) \
+                    == brute_force(records, lat, lng, radius)
+            for k in [1, 5]:
+                assert self.index.query_nearest(
+                    lat, lng, k=k, zipcode_type="STANDARD",
+                ) == brute_force(records, lat, lng, zipcode_type="STANDARD")[:k]
+
+        cells = self.index.cover(38.897835, -77.036541, radius=25)
+        assert len(cells) == 9
+        for cell in cells:
+            for i in self.index.cell_range(cell):
+                assert self.index.geohashes[i].startswith(cell)
+
+
+def test_use_geohash_index():
+    search = SearchEngine(use_geohash_index=True)
+    sql_search = SearchEngine()
+
+    # Use White House in DC
+    lat, lng = 38.897835, -77.036541
+    for kwargs in [
+        dict(),
+        dict(returns=0),
+        dict(radius=100, ascending=False),
+        dict(radius=10, sort_by=SimpleZipcode.population.name, ascending=False),
+    ]:
+        expected = sql_search.by_coordinates(lat, lng, **kwargs)
+        res = search.by_coordinates(lat, lng, **kwargs)
+        assert [z.zipcode for z in res] == [z.zipcode for z in expected]
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
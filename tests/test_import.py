@@ -1,8 +1,19 @@
 # -*- coding: utf-8 -*-
 
+import sys
+import subprocess
+
 import pytest
 
 
+def _loaded_modules(statement: str, names):
+    code = "import sys; {}; print(' '.join(n for n in {!r} if n in sys.modules))".format(
+        statement, list(names),
+    )
+    output = subprocess.check_output([sys.executable, "-c", code])
+    return output.decode("utf-8").split()
+
+
 def test():
     import uszipcode
 
@@ -11,6 +22,18 @@ def test():
     _ = uszipcode.ComprehensiveZipcode
     _ = uszipcode.ZipcodeTypeEnum
     _ = uszipcode.SORT_BY_DIST
+    assert "SearchEngine" in dir(uszipcode)
+    with pytest.raises(AttributeError):
+        _ = uszipcode.NotExists
+
+
+def test_lazy_import():
+    assert _loaded_modules(
+        "import uszipcode", ["sqlalchemy", "requests", "fuzzywuzzy"],
+    ) == []
+    assert _loaded_modules(
+        "import uszipcode.search", ["requests", "fuzzywuzzy"],
+    ) == []
 
 
 if __name__ == "__main__":
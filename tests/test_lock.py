@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from uszipcode.lock import FileLock
+from uszipcode.db import download_db_file_if_not_exists
+
+DATA = b"SQLite format 3\0" * 1000
+
+
+class Handler(BaseHTTPRequestHandler):
+    n_get = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(DATA)))
+        self.end_headers()
+
+    def do_GET(self):
+        # the ``Range: bytes=0-0`` probe is not a download
+        if self.headers.get("Range") is None:
+            Handler.n_get += 1
+        time.sleep(0.3)  # slow enough for other threads to wait on the lock
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(DATA)))
+        self.end_headers()
+        self.wfile.write(DATA)
+
+
+def test_file_lock(tmp_path):
+    path = str(tmp_path / "test.lock")
+    code = (
+        "import sys, time\n"
+        "from uszipcode.lock import FileLock\n"
+        "with FileLock(sys.argv[1]):\n"
+        "    print('locked', flush=True)\n"
+        "    time.sleep(1)\n"
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-c", code, path], stdout=subprocess.PIPE,
+    )
+    try:
+        assert process.stdout.readline().strip() == b"locked"
+        with pytest.raises(TimeoutError):
+            FileLock(path, timeout=0.2).acquire()
+        with FileLock(path, timeout=10) as lock:
+            assert lock.is_locked
+        assert not lock.is_locked
+    finally:
+        process.wait()
+
+
+def test_download_db_file_if_not_exists(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/simple_db.sqlite".format(server.server_address[1])
+    path = str(tmp_path / "simple_db.sqlite")
+
+    results = list()
+
+    def download():
+        results.append(download_db_file_if_not_exists(
+            db_file_path=path,
+            download_url=url,
+            chunk_size=1024,
+            progress_size=1024 * 1024,
+        ))
+
+    try:
+        threads = [threading.Thread(target=download) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert sorted(results) == [False, False, False, True]
+    assert Handler.n_get == 1
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
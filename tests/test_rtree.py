@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import os
+import math
+import sqlite3
+
+import pytest
+import sqlalchemy as sa
+from uszipcode.search import SearchEngine, SimpleZipcode, ZipcodeTypeEnum
+from uszipcode.rtree import (
+    get_rtree_file_path, ensure_rtree_file, _read_signature,
+    rtree_filter, centroid_rtree,
+)
+
+
+def test_ensure_rtree_file(db_file_path):
+    rtree_file_path = ensure_rtree_file(db_file_path, SimpleZipcode.__tablename__)
+    assert rtree_file_path == get_rtree_file_path(db_file_path)
+    assert rtree_file_path.endswith("simple_db.rtree.sqlite")
+    signature = _read_signature(rtree_file_path)
+    assert signature is not None
+
+    # not rebuilt if the db file is not changed
+    mtime = os.stat(rtree_file_path).st_mtime_ns
+    ensure_rtree_file(db_file_path, SimpleZipcode.__tablename__)
+    assert os.stat(rtree_file_path).st_mtime_ns == mtime
+
+    # not rebuilt if only the modify time is changed, like a copy
+    stat = os.stat(db_file_path)
+    os.utime(db_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    ensure_rtree_file(db_file_path, SimpleZipcode.__tablename__)
+    assert _read_signature(rtree_file_path) == signature
+
+    # rebuilt if the db file is changed
+    conn = sqlite3.connect(db_file_path)
+    conn.execute("UPDATE simple_zipcode SET lat = lat + 0.001")
+    conn.commit()
+    conn.close()
+    ensure_rtree_file(db_file_path, SimpleZipcode.__tablename__)
+    assert _read_signature(rtree_file_path) != signature
+
+
+def test_use_rtree(db_file_path):
+    search = SearchEngine(db_file_path=db_file_path, use_rtree=True)
+    sql_search = SearchEngine(db_file_path=db_file_path)
+
+    # Use White House in DC
+    lat, lng = 38.897835, -77.036541
+    for kwargs in [
+        dict(radius=10, returns=0),
+        dict(radius=50, sort_by=SimpleZipcode.zipcode.name, returns=0),
+        dict(radius=30, population_lower=1000, ascending=False),
+    ]:
+        expected = sql_search.query(lat=lat, lng=lng, **kwargs)
+        res = search.query(lat=lat, lng=lng, **kwargs)
+        assert len(res) > 0
+        assert [z.zipcode for z in res] == [z.zipcode for z in expected]
+
+    for bbox in [(-77.2, 38.8, -76.9, 39.0), (-125.0, 24.0, -66.0, 50.0)]:
+        expected = sql_search.by_bbox(*bbox, max_points=50)
+        res = search.by_bbox(*bbox, max_points=50)
+        assert len(res) == len(expected)
+        for c, c_expected in zip(res, expected):
+            assert c.to_dict() == pytest.approx(c_expected.to_dict())
+
+    stmt = sa.select(SimpleZipcode.zipcode).where(rtree_filter(
+        SimpleZipcode.zipcode, centroid_rtree, 38.8, 39.0, -77.1, -76.9,
+    ))
+    assert len(search.ses.scalars(stmt).all()) > 0
+
+    with pytest.raises(ValueError):
+        SearchEngine(engine=search.engine, use_rtree=True)
+
+
+def test_use_rtree_bbox_edge_on_centroid(db_file_path):
+    search = SearchEngine(db_file_path=db_file_path, use_rtree=True)
+    sql_search = SearchEngine(db_file_path=db_file_path)
+
+    # the rtree rounds the centroid outward to float32, the edges right on
+    # and right next to the centroid must give the same result
+    z = sql_search.ses.scalars(
+        sa.select(SimpleZipcode)
+        .where(
+            SimpleZipcode.zipcode_type == ZipcodeTypeEnum.Standard.value,
+            SimpleZipcode.lat.is_not(None),
+        )
+        .order_by(SimpleZipcode.zipcode)
+    ).first()
+    for bbox in [
+        (z.lng, z.lat - 0.5, z.lng + 0.5, z.lat + 0.5),
+        (math.nextafter(z.lng, 180), z.lat - 0.5, z.lng + 0.5, z.lat + 0.5),
+        (z.lng - 0.5, z.lat - 0.5, math.nextafter(z.lng, -180), z.lat + 0.5),
+        (z.lng - 0.5, math.nextafter(z.lat, 90), z.lng + 0.5, z.lat + 0.5),
+        (z.lng - 0.5, z.lat - 0.5, z.lng + 0.5, math.nextafter(z.lat, -90)),
+        (179.0, z.lat - 0.5, math.nextafter(z.lng, -180), z.lat + 0.5),
+    ]:
+        expected = [z_.zipcode for z_ in sql_search.by_bbox(*bbox, max_points=1000)]
+        res = [z_.zipcode for z_ in search.by_bbox(*bbox, max_points=1000)]
+        assert res == expected
+        assert (z.zipcode in res) == (bbox[0] == z.lng)
+
+
+
+def test_use_rtree_not_writable(db_file_path):
+    # a directory at the sidecar path, like a read only directory, makes
+    # the sidecar file impossible to write
+    rtree_file_path = get_rtree_file_path(db_file_path)
+    os.mkdir(rtree_file_path)
+    with pytest.warns(UserWarning):
+        search = SearchEngine(db_file_path=db_file_path, use_rtree=True)
+    assert search.use_rtree is False
+    # no temp file is left
+    assert sorted(os.listdir(os.path.dirname(db_file_path))) == sorted([
+        os.path.basename(db_file_path), os.path.basename(rtree_file_path),
+    ])
+    assert len(search.by_coordinates(38.897835, -77.036541, radius=10)) > 0
+    search.close()
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -15,6 +15,37 @@ class TestSearchEngineQuery(SearchEngineBaseTest):
         assert z.city == "San Francisco"
         assert z.state == "CA"
 
+    def test_by_zipcodes(self):
+        z_list = self.sr.by_zipcodes([10001, "10001", "123456789", "20001"])
+        assert len(z_list) == 4
+        assert z_list[0].zipcode == "10001"
+        assert z_list[1] is z_list[0]
+        assert z_list[2] is None
+        assert z_list[3].zipcode == "20001"
+
+        assert self.sr.by_zipcodes([]) == []
+
+
+class TestSearchEnginePkCache(SearchEngineBaseTest):
+    search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.simple,
+        pk_cache_size=2,
+    )
+
+    def test_pk_cache(self):
+        z = self.sr.by_zipcode("10001")
+        assert self.sr.by_zipcode(10001) is z
+        assert self.sr.pk_cache.hits == 1
+
+        assert self.sr.by_zipcode("123456789") is None
+        assert "123456789" in self.sr.pk_cache
+
+        z_list = self.sr.by_zipcodes(["10001", "20001", "20001"])
+        assert z_list[0] is z
+        assert z_list[1].zipcode == "20001"
+        assert z_list[2] is z_list[1]
+        assert len(self.sr.pk_cache) == 2
+
 if __name__ == "__main__":
     import os
 
@@ -3,6 +3,7 @@
 import pytest
 from uszipcode.tests import SearchEngineBaseTest, assert_descending_by
 from uszipcode.search import SearchEngine, ComprehensiveZipcode as Zipcode
+from uszipcode.cache import LRUCache
 
 
 class TestSearchEngine(SearchEngineBaseTest):
@@ -30,6 +31,45 @@ class TestSearchEngine(SearchEngineBaseTest):
             assert_descending_by(z_list, sort_by)
 
 
+class TestSearchEngineQueryCache(SearchEngineBaseTest):
+    search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.comprehensive,
+        query_cache=LRUCache(maxsize=10, ttl=3600),
+    )
+
+    def test_query_cache(self):
+        cache = self.sr.query_cache
+        cache.clear()
+
+        z_list = self.sr.by_population(lower=10000, upper=50000)
+        assert cache.stats()["misses"] == 1
+        # normalized arguments hit the same key
+        assert self.sr.query(
+            population_lower=10000, population_upper=50000,
+            sort_by=Zipcode.population, ascending=0,
+        ) == z_list
+        assert cache.hits == 1
+
+        # cached zipcode objects are detached and fully loaded
+        for z in z_list:
+            assert z not in self.sr.ses
+            assert z.population_by_year is z.population_by_year
+
+        # the returned list and dict are copies
+        z_list.clear()
+        assert len(self.sr.by_population(lower=10000, upper=50000)) > 0
+        row_list = self.sr.by_prefix("100", fields=["zipcode"])
+        row_list[0]["zipcode"] = None
+        assert self.sr.by_prefix("100", fields=["zipcode"])[0]["zipcode"] is not None
+
+        stats = cache.stats()
+        assert stats["hits"] == 3
+        assert stats["misses"] == 2
+        assert stats["size"] == 2
+
+        assert SearchEngine(query_cache=10).query_cache.maxsize == 10
+
+
 if __name__ == "__main__":
     import os
 
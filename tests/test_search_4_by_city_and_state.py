@@ -4,6 +4,7 @@ import pytest
 from uszipcode.tests import SearchEngineBaseTest
 from uszipcode.state_abbr import MAPPER_STATE_ABBR_SHORT_TO_LONG, MAPPER_STATE_ABBR_LONG_TO_SHORT
 from uszipcode.search import SearchEngine
+from uszipcode.cache import LRUCache
 
 PASSWORD = "yFTFNgn%vMPQcQGjmU8DxmQt3@b7iB5P"
 
@@ -129,6 +130,34 @@ class TestSearchEngine(SearchEngineBaseTest):
             self.search.query(lat=34, lng=-72)
 
 
+class TestSearchEngineCityStateCache(SearchEngineBaseTest):
+    cache = LRUCache(maxsize=100)
+    search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.simple,
+        city_state_cache=cache,
+    )
+
+    def test_city_state_cache(self):
+        res1 = self.search.by_city_and_state(city="arlingten", state="virgnea")
+        assert self.cache.misses == 1
+        res2 = self.search.by_city_and_state(city="arlingten", state="virgnea")
+        assert self.cache.hits == 1
+        assert res1 == res2
+
+        # cache is shared
+        other = SearchEngine(city_state_cache=self.cache)
+        assert other.by_state("ilinoy") == self.search.by_state("ilinoy")
+        assert self.cache.hits == 2
+
+        # not found is cached too
+        assert self.search.by_city(PASSWORD) == []
+        assert self.search.by_city(PASSWORD) == []
+        assert self.cache.get((PASSWORD, None)) is None
+
+        search = SearchEngine(city_state_cache=10)
+        assert search.city_state_cache.maxsize == 10
+
+
 if __name__ == "__main__":
     import os
 
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import sys
+
 import pytest
 from uszipcode.tests import (
     SearchEngineBaseTest,
     assert_ascending, assert_descending,
     assert_ascending_by, assert_descending_by,
 )
+from uszipcode.spatial import to_rings, point_in_rings, Cluster
 from uszipcode.search import (
     SearchEngine,
     ComprehensiveZipcode as Zipcode,
@@ -121,6 +124,235 @@ class TestSearchEngine(SearchEngineBaseTest):
         res6 = self.search.by_coordinates(lat, lng)
         assert len(res6) == 0
 
+    def test_fields(self):
+        with pytest.raises(ValueError):
+            self.search.by_prefix("100", fields=["InValid Field"])
+
+        with pytest.raises(ValueError):
+            self.search.by_prefix("100", fields=[])
+
+        z_list = self.search.by_prefix("100")
+        row_list = self.search.by_prefix(
+            "100", fields=["zipcode", Zipcode.major_city])
+        assert row_list == [
+            dict(zipcode=z.zipcode, major_city=z.major_city)
+            for z in z_list
+        ]
+
+        # Use White House in DC
+        lat, lng = 38.897835, -77.036541
+        z_list = self.search.by_coordinates(lat, lng, radius=5)
+        row_list = self.search.by_coordinates(
+            lat, lng, radius=5, fields=[Zipcode.zipcode, Zipcode.lat])
+        assert [row["zipcode"] for row in row_list] == \
+               [z.zipcode for z in z_list]
+
+        row = self.search.by_zipcode("10001", fields=["zipcode", "state"])
+        assert row == dict(zipcode="10001", state="NY")
+        assert self.search.by_zipcode("123456789", fields=["zipcode"]) is None
+
+    def test_iter_query(self):
+        with pytest.raises(ValueError):
+            self.search.iter_query(batch_size=0)
+
+        expected = [
+            z.zipcode for z in self.search.query(prefix="1", returns=None)
+        ]
+        self.search.ses.expunge_all()
+        zipcode_list = list()
+        for z in self.search.iter_query(prefix="1", batch_size=7):
+            # only the current batch is in the session
+            assert len(self.search.ses.identity_map) <= 7
+            zipcode_list.append(z.zipcode)
+        assert zipcode_list == expected
+        assert len(self.search.ses.identity_map) == 0
+
+        # Use White House in DC
+        lat, lng = 38.897835, -77.036541
+        expected = self.search.by_coordinates(lat, lng, radius=10, returns=0)
+        row_list = list(self.search.iter_query(
+            lat=lat, lng=lng, radius=10, sort_by=SORT_BY_DIST,
+            fields=["zipcode"], batch_size=3,
+        ))
+        assert [row["zipcode"] for row in row_list] == \
+               [z.zipcode for z in expected]
+
+
+class TestSearchEngineByPoint(SearchEngineBaseTest):
+    search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.comprehensive,
+    )
+
+    def test_by_point(self):
+        z = self.search.by_zipcode("10001")
+        z_by_point = self.search.by_point(z.lat, z.lng)
+        assert z_by_point is not None
+        assert point_in_rings(to_rings(z_by_point.polygon), z.lng, z.lat)
+
+        # Use Eiffel Tower in Paris
+        assert self.search.by_point(48.858388, 2.294581) is None
+
+        row = self.search.by_point(z.lat, z.lng, fields=["zipcode"])
+        assert row == dict(zipcode=z_by_point.zipcode)
+
+        with pytest.raises(ValueError):
+            SearchEngine().by_point(z.lat, z.lng)
+
+
+class TestSearchEngineByBBox(SearchEngineBaseTest):
+    search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.simple,
+    )
+
+    def test_by_bbox(self):
+        # New York City
+        west, south, east, north = -74.1, 40.6, -73.8, 40.9
+        z_list = self.search.by_bbox(west, south, east, north)
+        assert 0 < len(z_list) <= 500
+        assert_ascending_by(z_list, Zipcode.zipcode.name)
+        for z in z_list:
+            assert west <= z.lng <= east
+            assert south <= z.lat <= north
+
+        row_list = self.search.by_bbox(
+            west, south, east, north, fields=["zipcode"])
+        assert row_list == [dict(zipcode=z.zipcode) for z in z_list]
+
+        # continental US
+        west, south, east, north = -125.0, 24.0, -66.0, 50.0
+        z_list = self.search.by_bbox(west, south, east, north, max_points=10 ** 6)
+        for max_points, zoom in [(50, None), (50, 4), (200, None)]:
+            clusters = self.search.by_bbox(
+                west, south, east, north, zoom=zoom, max_points=max_points,
+            )
+            assert all([isinstance(c, Cluster) for c in clusters])
+            if zoom is None:
+                assert len(clusters) <= max_points
+            assert sum([c.count for c in clusters]) == len(z_list)
+            assert sum([c.population for c in clusters]) \
+                == sum([z.population or 0 for z in z_list])
+            for c in clusters:
+                assert c.west <= c.lng <= c.east
+                assert c.south <= c.lat <= c.north
+
+        # crosses the antimeridian
+        clusters = self.search.by_bbox(170, south, east, north, max_points=10)
+        assert sum([c.count for c in clusters]) == len(z_list)
+
+        with pytest.raises(ValueError):
+            self.search.by_bbox(west, north, east, south)
+
+
+class TestSearchEngineSpatialIndex(SearchEngineBaseTest):
+    search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.simple,
+        use_spatial_index=True,
+    )
+    sql_search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.simple,
+    )
+
+    def test_by_coordinates(self):
+        # Use White House in DC
+        lat, lng = 38.897835, -77.036541
+
+        for kwargs in [
+            dict(ascending=True),
+            dict(ascending=False),
+            dict(ascending=True, returns=0),
+            dict(radius=5, sort_by=Zipcode.zipcode.name),
+            dict(radius=10, zipcode_type=None, returns=0),
+            dict(radius=10, sort_by=Zipcode.population.name, ascending=False),
+        ]:
+            expected = self.sql_search.by_coordinates(lat, lng, **kwargs)
+            res = self.search.by_coordinates(lat, lng, **kwargs)
+            assert [z.zipcode for z in res] == [z.zipcode for z in expected]
+
+        res = self.search.query(
+            lat=lat, lng=lng, radius=10, population_lower=10000, returns=0,
+        )
+        for z in res:
+            assert z.population >= 10000
+            assert z.dist_from(lat, lng) <= 10
+
+        # Use Eiffel Tower in Paris
+        assert self.search.by_coordinates(48.858388, 2.294581) == []
+
+        row_list = self.search.by_coordinates(
+            lat, lng, radius=5, fields=[Zipcode.zipcode, Zipcode.population])
+        z_list = self.sql_search.by_coordinates(lat, lng, radius=5)
+        assert row_list == [
+            dict(zipcode=z.zipcode, population=z.population)
+            for z in z_list
+        ]
+
+        z_list = list(self.search.iter_query(
+            lat=lat, lng=lng, radius=10, sort_by=SORT_BY_DIST, batch_size=3,
+        ))
+        expected = self.sql_search.by_coordinates(lat, lng, radius=10, returns=0)
+        assert [z.zipcode for z in z_list] == [z.zipcode for z in expected]
+        for z in z_list:
+            assert z not in self.search.ses
+
+    def test_batch_nearest(self):
+        lats = [38.897835, 40.750742, 48.858388, None]
+        lngs = [-77.036541, -73.996530, 2.294581, -77.036541]
+
+        zipcodes, dists = self.search.batch_nearest(lats, lngs, radius=25)
+        assert len(zipcodes) == len(dists) == 4
+        for lat, lng, zipcode, dist in list(zip(lats, lngs, zipcodes, dists))[:2]:
+            z = self.search.by_coordinates(lat, lng, returns=1)[0]
+            assert zipcode == z.zipcode
+            assert dist == pytest.approx(z.dist_from(lat, lng))
+        assert zipcodes[2:] == [None, None]
+        assert dists[2:] == [None, None]
+
+        zipcodes, dists = self.search.batch_nearest(lats, lngs, k=3)
+        assert zipcodes[0] == [
+            z.zipcode for z in self.search.by_coordinates(
+                lats[0], lngs[0], returns=3,
+            )
+        ]
+        assert_ascending(dists[0])
+        assert len(zipcodes[2]) == 3
+        assert zipcodes[3] == []
+
+    def test_batch_nearest_without_numpy(self, monkeypatch):
+        lats = [38.897835, 40.750742, 48.858388, None]
+        lngs = [-77.036541, -73.996530, 2.294581, -77.036541]
+        for kwargs in [dict(radius=25), dict(k=3)]:
+            expected = self.search.batch_nearest(lats, lngs, **kwargs)
+            with monkeypatch.context() as m:
+                m.setitem(sys.modules, "numpy", None)  # import numpy fails
+                zipcodes, dists = self.search.batch_nearest(lats, lngs, **kwargs)
+            assert zipcodes == expected[0]
+            for dist, expected_dist in zip(dists, expected[1]):
+                if expected_dist is None:
+                    assert dist is None
+                else:
+                    assert dist == pytest.approx(expected_dist)
+
+    def test_batch_nearest_numpy_array(self):
+        np = pytest.importorskip("numpy")
+        lats = np.array([38.897835, 40.750742, np.nan])
+        lngs = np.array([-77.036541, -73.996530, -77.036541])
+        expected_zipcodes, expected_dists = self.search.batch_nearest(
+            lats.tolist(), lngs.tolist(),
+        )
+
+        zipcodes, dists = self.search.batch_nearest(lats, lngs)
+        assert isinstance(zipcodes, np.ndarray) and isinstance(dists, np.ndarray)
+        assert zipcodes.shape == dists.shape == (3,)
+        assert zipcodes.tolist() == expected_zipcodes == [
+            expected_zipcodes[0], expected_zipcodes[1], None,
+        ]
+        assert dists[:2].tolist() == pytest.approx(expected_dists[:2])
+        assert np.isnan(dists[2])
+
+        zipcodes, dists = self.search.batch_nearest(lats, lngs, k=3)
+        assert zipcodes.shape == dists.shape == (3, 3)
+        assert zipcodes[2].tolist() == [None, None, None]
+
 
 if __name__ == "__main__":
     import os
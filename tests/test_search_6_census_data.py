@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import pytest
+import sqlalchemy as sa
 from uszipcode.tests import SearchEngineBaseTest
-from uszipcode.model import ZipcodeTypeEnum, ComprehensiveZipcode
+from uszipcode.model import (
+    ZipcodeTypeEnum, ComprehensiveZipcode, DeferredGroupEnum,
+)
 from uszipcode.search import SearchEngine
 
 class TestSearchEngineCensusData(SearchEngineBaseTest):
@@ -25,6 +28,68 @@ class TestSearchEngineCensusData(SearchEngineBaseTest):
         assert z.zipcode_type != ZipcodeTypeEnum.Standard.value
         assert z.lat is not None
 
+    def test_json_columns_after_close(self):
+        with SearchEngine(
+            simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.comprehensive
+        ) as search:
+            z = search.by_zipcode("10001")
+            z_list = search.by_prefix("100", returns=3)
+        # all columns are loaded with the row by default
+        _ = z.population_by_age
+        _ = z.to_json()
+        for z in z_list:
+            _ = z.polygon
+
+
+def test_defer_groups():
+    search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.comprehensive,
+        defer_groups=["geometry", DeferredGroupEnum.demographics],
+    )
+    statements = list()
+
+    @sa.event.listens_for(search.engine, "before_cursor_execute")
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    z_list = search.by_prefix("100", returns=3)
+    assert len(statements) == 1
+    for z in z_list:
+        # only the columns of the deferred groups are not loaded
+        assert "polygon" not in z.__dict__
+        assert "population_by_age" not in z.__dict__
+        assert "household_income" in z.__dict__
+
+        # one query per group
+        n_statements = len(statements)
+        _ = z.population_by_age
+        _ = z.population_by_year
+        _ = z.children_by_age
+        assert len(statements) == n_statements + 1
+        for key in ComprehensiveZipcode.get_group_keys("demographics"):
+            assert key in z.__dict__
+        assert "polygon" not in z.__dict__
+
+        data = z.to_dict()
+        assert len(statements) == n_statements + 2
+        assert "polygon" in data
+    search.close()
+
+    with pytest.raises(ValueError):
+        SearchEngine(defer_groups=["geometry", ])
+    with pytest.raises(ValueError):
+        SearchEngine(
+            simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.comprehensive,
+            defer_groups=["not_a_group", ],
+        )
+    with pytest.raises(ValueError):
+        SearchEngine(
+            simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.comprehensive,
+            defer_groups=["geometry", ],
+            thread_safe=True,
+            pk_cache_size=10,
+        )
+
 
 if __name__ == "__main__":
     import os
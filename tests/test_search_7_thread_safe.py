@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+import sqlalchemy as sa
+from concurrent.futures import ThreadPoolExecutor
+from uszipcode.tests import SearchEngineBaseTest
+from uszipcode.search import SearchEngine
+
+
+class TestSearchEngineThreadSafe(SearchEngineBaseTest):
+    search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.simple,
+        use_spatial_index=True,
+        pk_cache_size=100,
+        thread_safe=True,
+    )
+
+    def test_concurrent_query(self):
+        # Use White House in DC
+        lat, lng = 38.897835, -77.036541
+
+        def lookup(i):
+            z = self.search.by_zipcode("10001")
+            z_list = self.search.by_coordinates(lat, lng, radius=10)
+            z_list_by_state = self.search.by_state("DC", returns=3)
+            self.search.close()
+            return (
+                z.zipcode,
+                [z.zipcode for z in z_list],
+                [z.zipcode for z in z_list_by_state],
+            )
+
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            results = list(executor.map(lookup, range(100)))
+        assert len(set(map(repr, results))) == 1
+        assert results[0][0] == "10001"
+
+    def test_read_only(self):
+        with pytest.raises(sa.exc.OperationalError):
+            self.search.ses.execute(
+                self.search.zip_klass.__table__.delete()
+            )
+        self.search.ses.rollback()
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("greenlet")
+
+from uszipcode.async_search import AsyncSearchEngine
+from uszipcode.search import SearchEngine
+
+
+def test_async_search_engine():
+    # Use White House in DC
+    lat, lng = 38.897835, -77.036541
+
+    with SearchEngine() as search:
+        expected = [z.zipcode for z in search.by_coordinates(lat, lng)]
+
+    async def main():
+        async with AsyncSearchEngine(use_spatial_index=True) as search:
+            results = await asyncio.gather(*[
+                search.by_zipcode("10001"),
+                search.by_zipcodes(["10001", "123456789"]),
+                search.by_coordinates(lat, lng),
+                search.by_state("DC", returns=3),
+                search.find_state("virginia"),
+            ] * 5)
+        return results
+
+    results = asyncio.run(main())
+    for i in range(0, len(results), 5):
+        z, z_list, z_list_by_coord, z_list_by_state, state_list = results[i:i + 5]
+        assert z.zipcode == "10001"
+        assert z_list[0].zipcode == "10001" and z_list[1] is None
+        assert [z.zipcode for z in z_list_by_coord] == expected
+        assert len(z_list_by_state) == 3
+        assert state_list == ["VA", ]
+
+
+def test_index_built_once(monkeypatch):
+    from uszipcode.spatial import SpatialIndex
+
+    calls = list()
+    from_session = SpatialIndex.from_session.__func__
+
+    def counted_from_session(cls, *args, **kwargs):
+        calls.append(1)
+        return from_session(cls, *args, **kwargs)
+
+    monkeypatch.setattr(
+        SpatialIndex, "from_session", classmethod(counted_from_session),
+    )
+
+    async def main():
+        async with AsyncSearchEngine(use_spatial_index=True) as search:
+            return await asyncio.gather(*[
+                search.by_coordinates(38.897835, -77.036541)
+                for _ in range(10)
+            ])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert len({tuple(z.zipcode for z in z_list) for z_list in results}) == 1
+
+
+def test_async_search_engine_comprehensive():
+    async def main():
+        async with AsyncSearchEngine(
+            simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.comprehensive,
+        ) as search:
+            return await search.by_zipcode("10001")
+
+    # the json columns are loaded before the object is detached
+    z = asyncio.run(main())
+    assert "polygon" in z.__dict__
+    _ = z.population_by_age
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
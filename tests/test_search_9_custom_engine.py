@@ -17,6 +17,23 @@ def test_custom_engine():
     assert z.state == "NY"
 
 
+def test_in_memory():
+    for thread_safe in [False, True]:
+        sr = SearchEngine(in_memory=True, thread_safe=thread_safe)
+        z = sr.by_zipcode("10001")
+        assert z.state == "NY"
+        assert len(sr.by_prefix("100", returns=3)) > 0
+        sr.close()
+
+    # every engine has its own in memory database
+    sr1 = SearchEngine(in_memory=True)
+    sr2 = SearchEngine(in_memory=True)
+    with sr1.engine.begin() as conn:
+        conn.execute(sr1.zip_klass.__table__.delete())
+    assert sr1.by_zipcode("10001") is None
+    assert sr2.by_zipcode("10001").state == "NY"
+
+
 if __name__ == "__main__":
     import os
 
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from uszipcode.search import SearchEngine
+from uszipcode.snapshot import Snapshot
+
+
+class TestSnapshot:
+    search = SearchEngine(
+        simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.simple,
+    )
+
+    def test(self, tmp_path):
+        path = str(tmp_path / "simple.snapshot")
+        n_rows = self.search.create_snapshot(path)
+        expected_list = self.search.query(zipcode_type=None, returns=None)
+        assert n_rows == len(expected_list)
+
+        with Snapshot(path) as snapshot:
+            assert len(snapshot) == n_rows
+            for expected in expected_list:
+                z = snapshot.by_zipcode(expected.zipcode)
+                assert z.to_dict() == expected.to_dict()
+
+            assert snapshot.by_zipcode(10001).zipcode == "10001"
+            assert snapshot.by_zipcode("123456789") is None
+            assert snapshot.by_zipcode("00000") is None
+            assert snapshot.by_zipcode("日本") is None
+
+            z_list = snapshot.by_zipcodes(["10001", "123456789"])
+            assert z_list[0].zipcode == "10001"
+            assert z_list[1] is None
+
+    def test_comprehensive(self, tmp_path):
+        search = SearchEngine(
+            simple_or_comprehensive=SearchEngine.SimpleOrComprehensiveArgEnum.comprehensive,
+        )
+        path = str(tmp_path / "comprehensive.snapshot")
+        search.create_snapshot(path)
+        with Snapshot(path) as snapshot:
+            z = snapshot.by_zipcode("10001")
+            assert z.major_city == search.by_zipcode("10001").major_city
+
+    def test_invalid_file(self, tmp_path):
+        path = tmp_path / "invalid.snapshot"
+        path.write_bytes(b"not a snapshot file")
+        with pytest.raises(ValueError):
+            Snapshot(str(path))
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
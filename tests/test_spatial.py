@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+import sqlalchemy as sa
+from haversine import haversine, Unit
+from uszipcode.spatial import (
+    SpatialIndex, RTree,
+    SQLITE_DIST_FUNCTION_NAME, dist_in_miles, sql_dist_in_miles,
+    to_rings, rings_bounds, point_in_rings,
+)
+
+
+def brute_force(records, lat, lng, radius=None, zipcode_type=None):
+    pairs = list()
+    for zipcode, z_type, z_lat, z_lng in records:
+        if (zipcode_type is not None) and (z_type != zipcode_type):
+            continue
+        dist = haversine((z_lat, z_lng), (lat, lng), unit=Unit.MILES)
+        if (radius is None) or (dist <= radius):
+            pairs.append((dist, zipcode))
+    pairs.sort()
+    return pairs
+
+
+class TestSpatialIndex(object):
+    random.seed(0)
+    records = [
+        (
+            str(i).zfill(5),
+            random.choice(["STANDARD", "PO BOX"]),
+            random.uniform(18, 72),
+            random.uniform(-170, -65),
+        )
+        for i in range(2000)
+    ]
+    records.append(("99999", "STANDARD", None, None))
+    index = SpatialIndex(records)
+
+    def test_len(self):
+        assert len(self.index) == 2000
+
+    def test_query_radius(self):
+        for lat, lng, radius in [
+            (38.897835, -77.036541, 100),
+            (40.7, -74.0, 500),
+            (64.8, -147.7, 2000),
+            (0, 0, 10),
+        ]:
+            assert self.index.query_radius(lat, lng, radius) \
+                   == brute_force(self.records[:-1], lat, lng, radius)
+            assert self.index.query_radius(
+                lat, lng, radius, zipcode_type="PO BOX",
+            ) == brute_force(
+                self.records[:-1], lat, lng, radius, zipcode_type="PO BOX",
+            )
+
+    def test_query_nearest(self):
+        for lat, lng in [(38.897835, -77.036541), (48.858388, 2.294581)]:
+            expected = brute_force(self.records[:-1], lat, lng)
+            assert self.index.query_nearest(lat, lng, k=1) == expected[:1]
+            assert self.index.query_nearest(lat, lng, k=7) == expected[:7]
+            assert self.index.query_nearest(lat, lng, k=0) == []
+
+        lat, lng = 38.897835, -77.036541
+        assert self.index.query_nearest(lat, lng, k=10, radius=200) \
+               == brute_force(self.records[:-1], lat, lng, radius=200)[:10]
+        assert self.index.query_nearest(48.858388, 2.294581, radius=25) == []
+
+    def test_batch_query_nearest(self, monkeypatch):
+        np = pytest.importorskip("numpy")
+        import uszipcode.spatial
+
+        # several chunks
+        monkeypatch.setattr(uszipcode.spatial, "BATCH_MATRIX_SIZE", 2000 * 7)
+        random.seed(1)
+        points = [
+            (random.uniform(15, 75), random.uniform(-175, -60))
+            for _ in range(200)
+        ] + [
+            (48.858388, 2.294581), (60.0, 179.9), (60.0, -180.0), (89.9, -100.0),
+            (None, -77.0), (float("nan"), -77.0),
+        ]
+        lats = [lat for lat, _ in points]
+        lngs = [lng for _, lng in points]
+        for tile_size, kwargs in [
+            (tile_size, kwargs)
+            for tile_size in [0.5, 5, 20]
+            for kwargs in [
+                dict(k=1),
+                dict(k=5),
+                dict(k=3, radius=150),
+                dict(k=4, zipcode_type="PO BOX"),
+            ]
+        ]:
+            monkeypatch.setattr(uszipcode.spatial, "BATCH_TILE_SIZE", tile_size)
+            self.index._arrays.clear()
+            positions, dists = self.index.batch_query_nearest(lats, lngs, **kwargs)
+            assert positions.shape == dists.shape == (len(points), kwargs["k"])
+            for (lat, lng), row_positions, row_dists in zip(points, positions, dists):
+                if (lat is None) or (lat != lat):
+                    expected = []
+                else:
+                    expected = self.index.query_nearest(lat, lng, **kwargs)
+                found = row_positions >= 0
+                assert [self.index.zipcodes[i] for i in row_positions[found]] \
+                       == [zipcode for _, zipcode in expected]
+                assert row_dists[found].tolist() \
+                       == pytest.approx([dist for dist, _ in expected])
+                assert np.isnan(row_dists[~found]).all()
+
+        positions, dists = self.index.batch_query_nearest([], [], k=2)
+        assert positions.shape == (0, 2)
+
+        # the nearest centroid is just outside of the 9 tiles around the point
+        monkeypatch.setattr(uszipcode.spatial, "BATCH_TILE_SIZE", 1)
+        index = SpatialIndex([
+            ("00001", "STANDARD", 10.5, 12.05),
+            ("00002", "STANDARD", 11.9, 11.9),
+        ])
+        positions, dists = index.batch_query_nearest([10.5], [10.5], k=1)
+        assert index.zipcodes[positions[0, 0]] == "00001"
+
+
+class TestRTree(object):
+    random.seed(1)
+    items = list()
+    for i in range(1000):
+        west, south = random.uniform(-170, -65), random.uniform(18, 72)
+        items.append((
+            i, west, south,
+            west + random.uniform(0, 2), south + random.uniform(0, 2),
+        ))
+    rtree = RTree(items, node_size=8)
+
+    def brute_force(self, west, south, east, north):
+        return sorted([
+            key for key, w, s, e, n in self.items
+            if not ((w > east) or (e < west) or (s > north) or (n < south))
+        ])
+
+    def test_query(self):
+        assert len(self.rtree) == 1000
+        for west, south, east, north in [
+            (-100, 30, -90, 40),
+            (-77.5, 38.5, -77.5, 38.5),
+            (0, 0, 10, 10),
+            (-180, -90, 180, 90),
+        ]:
+            assert sorted(self.rtree.query_bbox(west, south, east, north)) \
+                   == self.brute_force(west, south, east, north)
+        assert sorted(self.rtree.query_point(-77.5, 38.5)) \
+               == self.brute_force(-77.5, 38.5, -77.5, 38.5)
+
+        assert RTree([]).query_point(0, 0) == []
+
+
+def test_point_in_rings():
+    square = [[0, 0], [4, 0], [4, 4], [0, 4]]
+    hole = [[1, 1], [2, 1], [2, 2], [1, 2]]
+    rings = to_rings(square)
+    assert rings_bounds(rings) == (0, 0, 4, 4)
+    assert point_in_rings(rings, 1, 1) is True
+    assert point_in_rings(rings, 5, 1) is False
+
+    rings = to_rings([square, hole])
+    assert point_in_rings(rings, 3, 3) is True
+    assert point_in_rings(rings, 1.5, 1.5) is False
+
+    rings = to_rings([[square], [[[10, 10], [11, 10], [11, 11]]]])
+    assert point_in_rings(rings, 10.8, 10.2) is True
+    assert point_in_rings(rings, 10.2, 10.8) is False
+
+
+def test_dist_in_miles():
+    assert dist_in_miles(38.9, -77.0, 40.7, -74.0) \
+           == haversine((38.9, -77.0), (40.7, -74.0), unit=Unit.MILES)
+    assert dist_in_miles(None, -77.0, 40.7, -74.0) is None
+
+
+def test_sql_dist_in_miles():
+    engine = sa.create_engine("sqlite://")
+    lat_column, lng_column = sa.literal(38.9), sa.literal(-77.0)
+    with engine.connect() as conn:
+        conn.connection.dbapi_connection.create_function(
+            SQLITE_DIST_FUNCTION_NAME, 4, dist_in_miles,
+        )
+        expr = sql_dist_in_miles(lat_column, lng_column, 40.7, -74.0, "sqlite")
+        assert conn.scalar(sa.select(expr)) == dist_in_miles(38.9, -77.0, 40.7, -74.0)
+
+        # the haversine formula for other databases
+        expr = sql_dist_in_miles(lat_column, lng_column, 40.7, -74.0, "postgresql")
+        try:
+            dist = conn.scalar(sa.select(expr))
+        except sa.exc.OperationalError:  # pragma: no cover
+            pytest.skip("sqlite is compiled without math functions")
+        assert dist == pytest.approx(dist_in_miles(38.9, -77.0, 40.7, -74.0))
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
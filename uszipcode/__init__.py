@@ -17,12 +17,37 @@ __maintainer__ = "Sanhe Hu"
 __maintainer_email__ = "husanhe@gmail.com"
 __github_username__ = "MacHu-GWU"
 
-try:
-    from .search import (
-        SearchEngine,
-        SimpleZipcode, ComprehensiveZipcode, ZipcodeTypeEnum, SORT_BY_DIST,
-    )
-except ImportError as e:  # pragma: no cover
-    print(e)
-except: # pragma: no cover
-    raise
\ No newline at end of file
+import typing
+import importlib
+
+# Public names are loaded on first access (PEP 562), so ``import uszipcode``
+# doesn't import sqlalchemy, and only reading the metadata above is cheap.
+_lazy_names = {
+    "SearchEngine": ".search",
+    "SimpleZipcode": ".model",
+    "ComprehensiveZipcode": ".model",
+    "ZipcodeTypeEnum": ".model",
+    "SORT_BY_DIST": ".search",
+}
+
+__all__ = list(_lazy_names)
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    from .search import SearchEngine, SORT_BY_DIST
+    from .model import SimpleZipcode, ComprehensiveZipcode, ZipcodeTypeEnum
+
+
+def __getattr__(name: str):
+    try:
+        module_name = _lazy_names[name]
+    except KeyError:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name)
+        ) from None
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names))
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+Asyncio version of :class:`~uszipcode.search.SearchEngine`.
+
+It requires the ``aiosqlite`` (or any other sqlalchemy async driver for a
+custom ``engine``) and ``greenlet`` package::
+
+    pip install aiosqlite greenlet
+"""
+
+import asyncio
+import functools
+import typing
+
+import sqlalchemy.orm as orm
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from .search import SearchEngine
+
+
+class _TaskScopedSearchEngine(SearchEngine):
+    """
+    A :class:`~uszipcode.search.SearchEngine` whose ``ses`` is a proxy to the
+    session of the current asyncio task. :class:`AsyncSearchEngine` sets the
+    session before calling any method.
+    """
+
+    def _create_session(self) -> orm.scoped_session:
+        return orm.scoped_session(
+            orm.sessionmaker(), scopefunc=asyncio.current_task,
+        )
+
+    def close(self):
+        pass
+
+    def _build_indexes(self, names: typing.List[str]):
+        for name in names:
+            getattr(self, name)
+
+
+def _async_method(method_name: str):
+    """
+    Turn a :class:`~uszipcode.search.SearchEngine` method into a coroutine
+    that runs it with the session of an ``AsyncSession``.
+    """
+    sync_method = getattr(SearchEngine, method_name)
+
+    @functools.wraps(sync_method)
+    async def method(self: 'AsyncSearchEngine', *args, **kwargs):
+        return await self._run(method_name, *args, **kwargs)
+
+    return method
+
+
+class AsyncSearchEngine(object):
+    """
+    Zipcode Search Engine for asyncio.
+
+    It has the same public methods as :class:`~uszipcode.search.SearchEngine`
+    as coroutines, and runs on sqlalchemy async engine. Since every call uses
+    its own ``AsyncSession``, one instance can serve many concurrent tasks.
+    Zipcode objects are returned detached from the session.
+
+    :param engine: a sqlalchemy ``AsyncEngine``. if not specified, use the
+        ``aiosqlite`` driver to open the bundled sqlite file.
+
+    Other arguments are the same as :class:`~uszipcode.search.SearchEngine`.
+
+    Usage::
+
+        >>> async with AsyncSearchEngine() as search:
+        ...     zipcode = await search.by_zipcode("10001")
+        ...     z_list = await search.by_coordinates(lat, lng, radius=10)
+    """
+
+    def __init__(
+        self,
+        simple_or_comprehensive: SearchEngine.SimpleOrComprehensiveArgEnum = SearchEngine.SimpleOrComprehensiveArgEnum.simple,
+        db_file_path: typing.Union[str, None] = None,
+        download_url: typing.Union[str, typing.List[str], None] = None,
+        engine: AsyncEngine = None,
+        use_spatial_index: bool = False,
+        pk_cache_size: int = 0,
+        use_geohash_index: bool = False,
+    ):
+        if isinstance(engine, AsyncEngine):
+            self.search = _TaskScopedSearchEngine(
+                simple_or_comprehensive=simple_or_comprehensive,
+                engine=engine.sync_engine,
+                use_spatial_index=use_spatial_index,
+                pk_cache_size=pk_cache_size,
+                use_geohash_index=use_geohash_index,
+            )
+        else:
+            self.search = _TaskScopedSearchEngine(
+                simple_or_comprehensive=simple_or_comprehensive,
+                db_file_path=db_file_path,
+                download_url=download_url,
+                use_spatial_index=use_spatial_index,
+                pk_cache_size=pk_cache_size,
+                use_geohash_index=use_geohash_index,
+            )
+            engine = create_async_engine(
+                "sqlite+aiosqlite:///{}".format(self.search.db_file_path)
+            )
+            # the search engine has created a sync engine on the file
+            self.search.engine.dispose()
+            self.search.engine = self.search.eng = engine.sync_engine
+        self.engine = engine
+        self.eng = self.engine
+        self.zip_klass = self.search.zip_klass
+        # all tasks run on the event loop thread, the lock of the search
+        # engine doesn't stop two tasks from building the same index
+        self._index_lock: typing.Optional[asyncio.Lock] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """
+        close all database connections.
+        """
+        await self.engine.dispose()
+
+    def _run_sync(
+        self,
+        ses: orm.Session,
+        method_name: str,
+        args: tuple,
+        kwargs: dict,
+    ):
+        self.search.ses.registry.set(ses)
+        try:
+            return getattr(self.search, method_name)(*args, **kwargs)
+        finally:
+            self.search.ses.registry.clear()
+
+    def _pending_indexes(self, method_name: str) -> typing.List[str]:
+        """
+        Names of the lazy loaded in memory indexes the method may use, which
+        are not built yet.
+        """
+        search = self.search
+        names = list()
+        if search.use_geohash_index:
+            if search._geohash_index is None:
+                names.append("geohash_index")
+        elif search.use_spatial_index:
+            if search._spatial_index is None:
+                names.append("spatial_index")
+        if (method_name == "by_point") \
+                and hasattr(search.zip_klass, "polygon") \
+                and (search._polygon_index is None):
+            names.append("polygon_index")
+        return names
+
+    async def _build_indexes(self, method_name: str):
+        """
+        Build the indexes the method may use, only once, before the method
+        runs.
+        """
+        if not self._pending_indexes(method_name):
+            return
+        if self._index_lock is None:
+            self._index_lock = asyncio.Lock()
+        async with self._index_lock:
+            # another task may have built them while we were waiting
+            names = self._pending_indexes(method_name)
+            if names:
+                async with AsyncSession(self.engine) as async_ses:
+                    await async_ses.run_sync(
+                        self._run_sync, "_build_indexes", (names,), {},
+                    )
+
+    async def _run(self, method_name: str, *args, **kwargs):
+        await self._build_indexes(method_name)
+        async with AsyncSession(self.engine) as async_ses:
+            return await async_ses.run_sync(
+                self._run_sync, method_name, args, kwargs,
+            )
+
+    find_state = _async_method("find_state")
+    find_city = _async_method("find_city")
+    query = _async_method("query")
+    by_zipcode = _async_method("by_zipcode")
+    by_zipcodes = _async_method("by_zipcodes")
+    by_prefix = _async_method("by_prefix")
+    by_pattern = _async_method("by_pattern")
+    by_city = _async_method("by_city")
+    by_state = _async_method("by_state")
+    by_city_and_state = _async_method("by_city_and_state")
+    by_coordinates = _async_method("by_coordinates")
+    by_point = _async_method("by_point")
+    by_bbox = _async_method("by_bbox")
+    batch_nearest = _async_method("batch_nearest")
+    by_population = _async_method("by_population")
+    by_population_density = _async_method("by_population_density")
+    by_land_area_in_sqmi = _async_method("by_land_area_in_sqmi")
+    by_water_area_in_sqmi = _async_method("by_water_area_in_sqmi")
+    by_housing_units = _async_method("by_housing_units")
+    by_occupied_housing_units = _async_method("by_occupied_housing_units")
+    by_median_home_value = _async_method("by_median_home_value")
+    by_median_household_income = _async_method("by_median_household_income")
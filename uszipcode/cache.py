@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Small in memory cache utilities used by :class:`~uszipcode.search.SearchEngine`.
+"""
+
+import json
+import time
+import typing
+import threading
+from collections import OrderedDict
+
+from atomicwrites import atomic_write
+
+NOTHING = object()
+"""
+sentinel returned by :meth:`LRUCache.get` on cache miss, since ``None`` is a
+valid cached value (for example, a zipcode that doesn't exist).
+"""
+
+
+class LRUCache(object):
+    """
+    A bounded least recently used cache with hit / miss counters. It is safe
+    to share one cache between threads.
+
+    :param maxsize: max number of items, the least recently used item is
+        evicted when it is full.
+    :param ttl: default None, if specified, an item expires ``ttl`` seconds
+        after it is put, expired items are treated as missing.
+    :param timer: the clock used for ``ttl``, in seconds.
+
+    Usage::
+
+        >>> cache = LRUCache(maxsize=2)
+        >>> cache.put("10001", zipcode)
+        >>> cache.get("10001")
+        zipcode
+        >>> cache.get("10002") is NOTHING
+        True
+        >>> cache.hits, cache.misses
+        (1, 1)
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: typing.Optional[float] = None,
+        timer: typing.Callable[[], float] = time.monotonic,
+    ):
+        if maxsize <= 0:
+            raise ValueError("`maxsize` has to be greater than 0!")
+        if (ttl is not None) and (ttl <= 0):
+            raise ValueError("`ttl` has to be greater than 0!")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data: typing.Dict[typing.Hashable, typing.Any] = OrderedDict()
+        self._expire_at: typing.Dict[typing.Hashable, float] = dict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: typing.Hashable):
+        return key in self._data
+
+    def _pop(self, key: typing.Hashable):
+        del self._data[key]
+        self._expire_at.pop(key, None)
+
+    def get(self, key: typing.Hashable, default: typing.Any = NOTHING):
+        """
+        Return the cached value and mark it as recently used, or ``default``
+        if the key is not cached or expired.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if (self.ttl is not None) and (self._expire_at[key] <= self.timer()):
+                self._pop(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: typing.Hashable, value: typing.Any):
+        """
+        Cache a value, evict the least recently used item if it is full.
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.ttl is not None:
+                self._expire_at[key] = self.timer() + self.ttl
+            while len(self._data) > self.maxsize:
+                self._pop(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all items and reset the counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self._expire_at.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.expirations = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Ratio of lookups answered from the cache, 0.0 if never used.
+        """
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+    def stats(self) -> typing.Dict[str, typing.Union[int, float]]:
+        """
+        Counters of the cache, for monitoring.
+        """
+        with self._lock:
+            return dict(
+                size=len(self._data),
+                maxsize=self.maxsize,
+                hits=self.hits,
+                misses=self.misses,
+                hit_rate=self.hit_rate,
+                evictions=self.evictions,
+                expirations=self.expirations,
+            )
+
+    def dump(self, path: str):
+        """
+        Save all items to a json file, least recently used first. Keys and
+        values have to be json serializable, tuple is saved as list. The
+        expiration time is not saved, loaded items get a new ``ttl``.
+        """
+        with self._lock:
+            data = [[key, value] for key, value in self._data.items()]
+        with atomic_write(path, mode="w", overwrite=True) as f:
+            json.dump(data, f)
+
+    def load(self, path: str):
+        """
+        Load items saved by :meth:`LRUCache.dump`. List keys are converted
+        back to tuple. Counters are not changed.
+        """
+        with open(path, "r") as f:
+            data = json.load(f)
+        for key, value in data:
+            if isinstance(key, list):
+                key = tuple(key)
+            self.put(key, value)
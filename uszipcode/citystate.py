@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sidecar json file of the city / state lookup tables.
+
+The fuzzy city / state search needs all city names, and the city list of
+each state, built from a full table scan. The sidecar is a json file next
+to the database file, for example ``simple_db.citystate.json`` for
+``simple_db.sqlite``, so only the first process scans the table, later
+processes load the tables from the file.
+
+The file stores the signature of the database file content and the table
+name (see :func:`~uszipcode.db.get_db_file_signature`), it is ignored and
+rebuilt if the database file changes, and still valid for a copy of the same
+database file, so it can be built at install time.
+"""
+
+import json
+import sqlite3
+import typing
+from collections import OrderedDict
+
+from pathlib_mate import Path
+from atomicwrites import atomic_write
+
+from .db import get_db_file_signature
+
+CITY_STATE_FORMAT_VERSION = "1"
+
+CityStateData = typing.Tuple[
+    typing.List[str],
+    typing.Dict[str, typing.List[str]],
+    typing.Dict[str, typing.List[str]],
+]
+"""
+``(city_list, state_to_city_mapper, city_to_state_mapper)``.
+"""
+
+
+def get_city_state_file_path(db_file_path: str) -> str:
+    """
+    Path of the sidecar file of a database file.
+    """
+    p = Path(db_file_path)
+    return Path(p.parent, "{}.citystate.json".format(p.fname)).abspath
+
+
+def build_city_state_data(
+    rows: typing.Iterable[typing.Tuple[typing.Optional[str], typing.Optional[str]]],
+) -> CityStateData:
+    """
+    Build the lookup tables from ``(major_city, state)`` rows. Cities and
+    states are sorted, states are upper case.
+    """
+    city_set = set()
+    state_to_city_set: typing.Dict[str, set] = dict()
+    city_to_state_set: typing.Dict[str, set] = dict()
+    for major_city, state in rows:
+        if major_city is not None:
+            city_set.add(major_city)
+            if state is not None:
+                state = state.upper()
+                state_to_city_set.setdefault(state, set()).add(major_city)
+                city_to_state_set.setdefault(major_city, set()).add(state)
+
+    city_list = sorted(city_set)
+    state_to_city_mapper = OrderedDict(
+        (state, sorted(state_to_city_set[state]))
+        for state in sorted(state_to_city_set)
+    )
+    city_to_state_mapper = OrderedDict(
+        (city, sorted(city_to_state_set[city]))
+        for city in sorted(city_to_state_set)
+    )
+    return city_list, state_to_city_mapper, city_to_state_mapper
+
+
+def read_city_state_file(
+    city_state_file_path: str,
+    signature: str,
+) -> typing.Optional[CityStateData]:
+    """
+    Load the lookup tables from the sidecar file.
+
+    :return: None if the file doesn't exist, is broken, or is built from
+        another database file.
+    """
+    try:
+        with open(city_state_file_path, "r", encoding="utf-8") as f:
+            data = json.load(f, object_pairs_hook=OrderedDict)
+        if data["signature"] != signature:
+            return None
+        return (
+            data["city_list"],
+            data["state_to_city_mapper"],
+            data["city_to_state_mapper"],
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_city_state_file(
+    city_state_file_path: str,
+    signature: str,
+    city_state_data: CityStateData,
+):
+    """
+    Write the lookup tables to the sidecar file. It is written to a temp
+    file first, then moved to ``city_state_file_path``, so readers never
+    see a partial file.
+    """
+    city_list, state_to_city_mapper, city_to_state_mapper = city_state_data
+    data = OrderedDict([
+        ("signature", signature),
+        ("city_list", city_list),
+        ("state_to_city_mapper", state_to_city_mapper),
+        ("city_to_state_mapper", city_to_state_mapper),
+    ])
+    with atomic_write(city_state_file_path, overwrite=True, encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def load_city_state_data(
+    db_file_path: str,
+    table_name: str,
+    rows_factory: typing.Callable[[], typing.Iterable],
+) -> CityStateData:
+    """
+    Load the lookup tables of the zipcode table ``table_name`` from the
+    sidecar file, or build them from ``rows_factory()`` and save the sidecar
+    file if it doesn't exist or the database file has changed.
+
+    If the sidecar file can't be written, for example the database file is
+    in a read only directory, the built tables are still returned.
+
+    :param rows_factory: returns the ``(major_city, state)`` rows of the
+        table, only called if the sidecar file is not usable.
+    """
+    city_state_file_path = get_city_state_file_path(db_file_path)
+    signature = get_db_file_signature(db_file_path, CITY_STATE_FORMAT_VERSION, table_name)
+    city_state_data = read_city_state_file(city_state_file_path, signature)
+    if city_state_data is None:
+        city_state_data = build_city_state_data(rows_factory())
+        try:
+            write_city_state_file(city_state_file_path, signature, city_state_data)
+        except OSError:  # pragma: no cover
+            pass
+    return city_state_data
+
+
+def ensure_city_state_file(db_file_path: str, table_name: str) -> str:
+    """
+    Return the sidecar file path of the database file, build it if it doesn't
+    exist or the database file has changed. Call it at install / deploy time
+    to ship the sidecar with the database file.
+    """
+
+    def rows_factory():
+        uri = "{}?mode=ro".format(Path(db_file_path).absolute().as_uri())
+        conn = sqlite3.connect(uri, uri=True)
+        try:
+            return conn.execute(
+                "SELECT major_city, state FROM {}".format(table_name)
+            ).fetchall()
+        finally:
+            conn.close()
+
+    city_state_file_path = get_city_state_file_path(db_file_path)
+    signature = get_db_file_signature(db_file_path, CITY_STATE_FORMAT_VERSION, table_name)
+    if read_city_state_file(city_state_file_path, signature) is None:
+        write_city_state_file(
+            city_state_file_path, signature, build_city_state_data(rows_factory()),
+        )
+    return city_state_file_path
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+
+"""
+``uszipcode`` command line interface.
+
+Enrich a csv file of coordinates or zipcodes with zipcode information::
+
+    uszipcode enrich --in points.csv --out out.csv --lat-col lat --lng-col lng
+    uszipcode enrich --in users.csv --out out.parquet --zipcode-col zip --workers 8
+
+The input is read in chunks, the chunks are resolved by a pool of worker
+processes, each of them opens its own read only
+:class:`~uszipcode.search.SearchEngine`, and the results are written in the
+input order as soon as they are ready. Parquet output requires ``pyarrow``.
+"""
+
+import os
+import sys
+import csv
+import json
+import typing
+import argparse
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
+from .search import SearchEngine
+
+DEFAULT_FIELDS = "major_city,county,state,timezone"
+"""
+default zipcode columns appended to each input row.
+"""
+
+DIST_COLUMN = "dist_in_miles"
+"""
+output column of the distance between the coordinates and the nearest
+zipcode center.
+"""
+
+_search: typing.Optional[SearchEngine] = None
+"""
+the search engine of the current worker process.
+"""
+
+
+def _init_worker(search_kwargs: dict):
+    global _search
+    _search = SearchEngine(thread_safe=True, **search_kwargs)
+
+
+def _to_float(value: typing.Optional[str]) -> typing.Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def enrich_rows(
+    search: SearchEngine,
+    rows: typing.List[dict],
+    fields: typing.List[str],
+    zipcode_col: typing.Optional[str] = None,
+    lat_col: typing.Optional[str] = None,
+    lng_col: typing.Optional[str] = None,
+    radius: typing.Optional[float] = None,
+    prefix: str = "",
+) -> typing.List[dict]:
+    """
+    Add zipcode information to each row, in place.
+
+    If ``zipcode_col`` is specified, rows are looked up by zipcode. Otherwise,
+    the nearest zipcode of ``lat_col``, ``lng_col`` is used, the zipcode and
+    the distance are added too.
+
+    :param fields: zipcode columns added to each row, prefixed by ``prefix``.
+    """
+    if zipcode_col is not None:
+        zipcode_list = [row.get(zipcode_col) or None for row in rows]
+        dist_list = None
+    else:
+        zipcode_list, dist_list = search.batch_nearest(
+            [_to_float(row.get(lat_col)) for row in rows],
+            [_to_float(row.get(lng_col)) for row in rows],
+            k=1,
+            radius=radius,
+            zipcode_type=None,
+        )
+
+    data_list = search.by_zipcodes(
+        [zipcode for zipcode in zipcode_list if zipcode is not None],
+        fields=fields,
+    )
+    data_iter = iter(data_list)
+    for ind, (row, zipcode) in enumerate(zip(rows, zipcode_list)):
+        data = None if zipcode is None else next(data_iter)
+        if dist_list is not None:
+            row[prefix + "zipcode"] = zipcode
+            row[prefix + DIST_COLUMN] = dist_list[ind]
+        for field in fields:
+            row[prefix + field] = None if data is None else data[field]
+    return rows
+
+
+def _enrich_chunk(rows: typing.List[dict], kwargs: dict) -> typing.List[dict]:
+    return enrich_rows(_search, rows, **kwargs)
+
+
+def _iter_chunks(
+    reader: typing.Iterable[dict],
+    chunk_size: int,
+) -> typing.Iterator[typing.List[dict]]:
+    chunk = list()
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = list()
+    if chunk:
+        yield chunk
+
+
+def _iter_results(
+    chunks: typing.Iterable[typing.List[dict]],
+    kwargs: dict,
+    workers: int,
+    search_kwargs: dict,
+) -> typing.Iterator[typing.List[dict]]:
+    """
+    Resolve the chunks with a process pool, yield the results in order. At
+    most ``2 * workers`` chunks are in flight, so memory is bounded.
+    """
+    if workers <= 1:
+        _init_worker(search_kwargs)
+        for chunk in chunks:
+            yield _enrich_chunk(chunk, kwargs)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(search_kwargs,),
+    ) as executor:
+        futures = collections.deque()
+        for chunk in chunks:
+            futures.append(executor.submit(_enrich_chunk, chunk, kwargs))
+            if len(futures) >= 2 * workers:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+class _CsvWriter(object):
+    def __init__(self, path: str, columns: typing.List[str]):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.f, fieldnames=columns)
+        self.writer.writeheader()
+
+    def write(self, rows: typing.List[dict]):
+        for row in rows:
+            self.writer.writerow({
+                key: json.dumps(value) if isinstance(value, (list, dict)) else value
+                for key, value in row.items()
+            })
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetWriter(object):
+    def __init__(
+        self,
+        path: str,
+        columns: typing.List[str],
+        column_types: typing.Dict[str, typing.Any],
+    ):
+        import pyarrow as pa
+        import pyarrow.parquet
+
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([
+            pa.field(column, column_types.get(column, pa.string()))
+            for column in columns
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows: typing.List[dict]):
+        arrays = list()
+        for field in self.schema:
+            values = [row.get(field.name) for row in rows]
+            if field.type == self.pa.string():
+                values = [
+                    json.dumps(value) if isinstance(value, (list, dict)) else value
+                    for value in values
+                ]
+            arrays.append(self.pa.array(values, type=field.type))
+        self.writer.write_table(
+            self.pa.Table.from_arrays(arrays, schema=self.schema)
+        )
+
+    def close(self):
+        self.writer.close()
+
+
+def enrich(
+    in_path: str,
+    out_path: str,
+    zipcode_col: typing.Optional[str] = None,
+    lat_col: typing.Optional[str] = None,
+    lng_col: typing.Optional[str] = None,
+    radius: typing.Optional[float] = None,
+    fields: typing.List[str] = None,
+    prefix: str = "",
+    workers: int = None,
+    chunk_size: int = 1000,
+    search_kwargs: dict = None,
+) -> int:
+    """
+    Enrich a csv file with zipcode information, write to csv or parquet
+    (if ``out_path`` ends with ``.parquet``).
+
+    :param search_kwargs: arguments of :class:`~uszipcode.search.SearchEngine`
+        used in each worker process.
+
+    :return: number of rows.
+    """
+    if (zipcode_col is None) == ((lat_col is None) or (lng_col is None)):
+        raise ValueError(
+            "You have to specify either `zipcode_col`, or both `lat_col` and `lng_col`!"
+        )
+    if fields is None:
+        fields = DEFAULT_FIELDS.split(",")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if search_kwargs is None:
+        search_kwargs = dict()
+
+    # validate the fields and download the database before forking workers
+    with SearchEngine(**search_kwargs) as search:
+        columns = search._resolve_fields(fields)
+
+    kwargs = dict(
+        fields=fields,
+        zipcode_col=zipcode_col,
+        lat_col=lat_col,
+        lng_col=lng_col,
+        radius=radius,
+        prefix=prefix,
+    )
+
+    n_rows = 0
+    with open(in_path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        out_columns = list(reader.fieldnames or [])
+        if zipcode_col is None:
+            out_columns.extend([prefix + "zipcode", prefix + DIST_COLUMN])
+        out_columns.extend([prefix + field for field in fields])
+        # keep the first occurrence if an output column already exists
+        out_columns = list(collections.OrderedDict.fromkeys(out_columns))
+
+        if out_path.endswith(".parquet"):
+            from .export import _to_arrow_type
+            import pyarrow as pa
+
+            column_types = {
+                prefix + column.name: _to_arrow_type(column)
+                for column in columns
+            }
+            if zipcode_col is None:
+                column_types[prefix + DIST_COLUMN] = pa.float64()
+            writer = _ParquetWriter(out_path, out_columns, column_types)
+        else:
+            writer = _CsvWriter(out_path, out_columns)
+
+        try:
+            for rows in _iter_results(
+                _iter_chunks(reader, chunk_size),
+                kwargs=kwargs,
+                workers=workers,
+                search_kwargs=search_kwargs,
+            ):
+                writer.write(rows)
+                n_rows += len(rows)
+        finally:
+            writer.close()
+    return n_rows
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="uszipcode",
+        description="USA zipcode programmable database.",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    p = subparsers.add_parser(
+        "enrich",
+        help="add zipcode information to a csv file of coordinates or zipcodes",
+    )
+    p.add_argument("--in", dest="in_path", required=True, help="input csv file")
+    p.add_argument(
+        "--out", dest="out_path", required=True,
+        help="output csv file, or parquet file if it ends with .parquet",
+    )
+    p.add_argument("--zipcode-col", help="zipcode column of the input")
+    p.add_argument("--lat-col", help="latitude column of the input")
+    p.add_argument("--lng-col", help="longitude column of the input")
+    p.add_argument(
+        "--radius", type=float, default=None,
+        help="ignore zipcode further than this miles from the coordinates",
+    )
+    p.add_argument(
+        "--fields", default=DEFAULT_FIELDS,
+        help="comma separated zipcode columns to add, default: %(default)s",
+    )
+    p.add_argument(
+        "--prefix", default="",
+        help="prefix of the added column names",
+    )
+    p.add_argument(
+        "--workers", type=int, default=None,
+        help="number of worker processes, default: number of cpu",
+    )
+    p.add_argument(
+        "--chunk-size", type=int, default=1000,
+        help="number of rows sent to a worker at a time, default: %(default)s",
+    )
+    p.add_argument(
+        "--comprehensive", action="store_true",
+        help="use the comprehensive database",
+    )
+    p.add_argument("--db-file-path", default=None, help="sqlite database file")
+    return parser
+
+
+def main(args: typing.List[str] = None) -> int:
+    """
+    Entry point of the ``uszipcode`` command.
+    """
+    args = _build_parser().parse_args(args)
+    if args.command == "enrich":
+        if args.comprehensive:
+            simple_or_comprehensive = SearchEngine.SimpleOrComprehensiveArgEnum.comprehensive
+        else:
+            simple_or_comprehensive = SearchEngine.SimpleOrComprehensiveArgEnum.simple
+        try:
+            n_rows = enrich(
+                in_path=args.in_path,
+                out_path=args.out_path,
+                zipcode_col=args.zipcode_col,
+                lat_col=args.lat_col,
+                lng_col=args.lng_col,
+                radius=args.radius,
+                fields=[
+                    field.strip()
+                    for field in args.fields.split(",")
+                    if field.strip()
+                ],
+                prefix=args.prefix,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                search_kwargs=dict(
+                    simple_or_comprehensive=simple_or_comprehensive,
+                    db_file_path=args.db_file_path,
+                ),
+            )
+        except ValueError as e:
+            sys.stderr.write("error: {}\n".format(e))
+            return 1
+        sys.stdout.write("enriched {} rows to {}\n".format(n_rows, args.out_path))
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    sys.exit(main())
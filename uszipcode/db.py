@@ -10,12 +10,19 @@ The dataset for ``uszipcode`` is from multiple source, and integrated by Sanhe H
 - 2015-10-01 geometry google map geocoding data from http://maps.google.com
 """
 
-import requests
+import os
+import uuid
+import typing
+import sqlite3
+import hashlib
+
+import sqlalchemy as sa
 from pathlib_mate import Path
-from pathlib_mate.helper import repr_data_size
-from atomicwrites import atomic_write
 import sqlalchemy_mate as sam
 
+from .download import download_file, DEFAULT_N_WORKERS, DEFAULT_PART_SIZE
+from .lock import FileLock, DEFAULT_LOCK_TIMEOUT
+
 SIMPLE_DB_FILE_DOWNLOAD_URL = "https://github.com/MacHu-GWU/uszipcode-project/releases/download/1.0.1.db/simple_db.sqlite"
 COMPREHENSIVE_DB_FILE_DOWNLOAD_URL = "https://github.com/MacHu-GWU/uszipcode-project/releases/download/1.0.1.db/comprehensive_db.sqlite"
 
@@ -23,27 +30,160 @@ USZIPCODE_HOME = Path(Path.home(), ".uszipcode")
 DEFAULT_SIMPLE_DB_FILE_PATH = Path(USZIPCODE_HOME, "simple_db.sqlite")
 DEFAULT_COMPREHENSIVE_DB_FILE_PATH = Path(USZIPCODE_HOME, "comprehensive_db.sqlite")
 
+SIGNATURE_SAMPLE_SIZE = 1024 * 1024
+"""
+number of bytes hashed at the start and at the end of the database file by
+:func:`get_db_file_signature`.
+"""
+
 
 def download_db_file(
     db_file_path: str,
     download_url: str,
     chunk_size: int,
     progress_size: int,
+    mirror_urls: typing.Optional[typing.List[str]] = None,
+    sha256: typing.Optional[str] = None,
+    n_workers: int = DEFAULT_N_WORKERS,
+    part_size: int = DEFAULT_PART_SIZE,
 ):
+    """
+    Download the sqlite database file, see :func:`uszipcode.download.download_file`.
+    It fetches the file in parallel parts, resumes an interrupted download,
+    and falls back to ``mirror_urls`` if ``download_url`` fails. Urls of
+    compressed file, such as ``simple_db.sqlite.xz``, are decompressed on
+    the fly.
+
+    :param sha256: the expected hex SHA-256 of the file, if known.
+    """
+    db_file_path = Path(db_file_path).abspath
+    Path(db_file_path).parent.mkdir(parents=True, exist_ok=True)
+    download_file(
+        urls=[download_url, ] + list(mirror_urls or []),
+        path=db_file_path,
+        sha256=sha256,
+        n_workers=n_workers,
+        part_size=part_size,
+        chunk_size=chunk_size,
+        progress_size=progress_size,
+    )
+
+
+def get_lock_file_path(db_file_path: str) -> str:
+    """
+    Path of the lock file guarding the download of a database file.
+    """
+    return db_file_path + ".lock"
+
+
+def download_db_file_if_not_exists(
+    db_file_path: str,
+    download_url: str,
+    chunk_size: int,
+    progress_size: int,
+    mirror_urls: typing.Optional[typing.List[str]] = None,
+    sha256: typing.Optional[str] = None,
+    lock_timeout: typing.Optional[float] = DEFAULT_LOCK_TIMEOUT,
+) -> bool:
+    """
+    Download the database file if it doesn't exist, only one process does
+    it at a time. Other processes wait for the lock up to ``lock_timeout``
+    seconds, then find the finished file.
+
+    :return: True if this process downloaded the file.
+    """
+    db_file_path = Path(db_file_path).abspath
+    if Path(db_file_path).exists():
+        return False
     Path(db_file_path).parent.mkdir(parents=True, exist_ok=True)
+    with FileLock(get_lock_file_path(db_file_path), timeout=lock_timeout):
+        # another process may have downloaded it while we were waiting
+        if Path(db_file_path).exists():
+            return False
+        download_db_file(
+            db_file_path=db_file_path,
+            download_url=download_url,
+            chunk_size=chunk_size,
+            progress_size=progress_size,
+            mirror_urls=mirror_urls,
+            sha256=sha256,
+        )
+    return True
+
+
+def get_db_file_signature(db_file_path: str, *keys: str) -> str:
+    """
+    Signature of the database file content, used to find out whether a
+    sidecar file (see :mod:`uszipcode.rtree` and :mod:`uszipcode.citystate`)
+    is built from this database file.
+
+    It is the file size and the SHA-256 of the first and the last
+    :data:`SIGNATURE_SAMPLE_SIZE` bytes, not of the whole file, so it takes
+    milliseconds even for the comprehensive database. Unlike the modify time,
+    it doesn't change when the file is downloaded again, copied or unpacked
+    by an installer. Any write to a sqlite file changes the file change
+    counter in the header, which is in the first bytes.
+
+    :param keys: other values of the signature, such as the sidecar format
+        version and the table name.
+    """
+    size = os.path.getsize(db_file_path)
+    sha256 = hashlib.sha256()
+    with open(db_file_path, "rb") as f:
+        sha256.update(f.read(SIGNATURE_SAMPLE_SIZE))
+        if size > SIGNATURE_SAMPLE_SIZE:
+            f.seek(max(SIGNATURE_SAMPLE_SIZE, size - SIGNATURE_SAMPLE_SIZE))
+            sha256.update(f.read())
+    return "|".join(list(keys) + [str(size), sha256.hexdigest()])
+
+
+def _read_only_uri(db_file_path: str) -> str:
+    return "{}?mode=ro".format(Path(db_file_path).absolute().as_uri())
+
+
+def create_read_only_sqlite_engine(db_file_path: str) -> sa.engine.Engine:
+    """
+    Create a sqlalchemy engine that opens the sqlite file in read only mode
+    with a connection pool, connections can be used in any thread.
+
+    The pool never blocks, every thread that is holding a session can have
+    its own connection.
+    """
+    uri = _read_only_uri(db_file_path)
+    return sa.create_engine(
+        "sqlite://",
+        creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False),
+        poolclass=sa.pool.QueuePool,
+        max_overflow=-1,
+    )
+
+
+def create_in_memory_sqlite_engine(db_file_path: str) -> sa.engine.Engine:
+    """
+    Copy the sqlite file into an in memory database with the sqlite backup
+    API, and create a sqlalchemy engine on it. Queries never touch the disk.
+
+    The in memory database uses shared cache, so all pooled connections,
+    from any thread, see the same data. It lives as long as the engine.
+    """
+    uri = "file:uszipcode-{}?mode=memory&cache=shared".format(uuid.uuid4().hex)
+    keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    source = sqlite3.connect(_read_only_uri(db_file_path), uri=True)
+    try:
+        source.backup(keeper)
+    finally:
+        source.close()
+
+    def creator():
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    # the database is dropped when its last connection is closed, the engine
+    # holds ``creator``, so it keeps ``keeper`` alive as long as the engine
+    creator.keeper = keeper
 
-    print(f"Download {db_file_path} from {download_url} ...")
-    response = requests.get(download_url, stream=True)
-
-    downloaded_size = 0
-    next_log_threshold = progress_size
-    with atomic_write(db_file_path, mode="wb", overwrite=True) as f:
-        for chunk in response.iter_content(chunk_size):
-            if not chunk:
-                break
-            f.write(chunk)
-            downloaded_size += chunk_size
-            if downloaded_size >= next_log_threshold:
-                print("  {} downloaded ...".format(repr_data_size(downloaded_size)))
-                next_log_threshold += progress_size
-    print("  Complete!")
+    return sa.create_engine(
+        "sqlite://",
+        creator=creator,
+        poolclass=sa.pool.QueuePool,
+        max_overflow=-1,
+    )
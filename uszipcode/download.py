@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parallel, resumable file download over HTTP.
+
+The file is split into parts of ``part_size`` bytes, the parts are fetched
+concurrently with ``Range`` requests over a pooled ``requests.Session``, and
+written in place into ``<path>.part``. Finished parts are recorded in
+``<path>.part.json``, so an interrupted download only fetches the missing
+parts next time. When all parts are done, the SHA-256 of the file is
+verified (if known), then it is moved to ``path``.
+
+If a server doesn't support ``Range`` requests, the file is fetched in a
+single stream. If a url fails, the next mirror url is tried.
+
+Compressed files (``.gz``, ``.xz``, ``.zst``, see :class:`CompressionEnum`)
+are fetched in a single stream and decompressed on the fly, the compressed
+file is never written to disk. ``.zst`` requires the ``zstandard`` package::
+
+    pip install zstandard
+"""
+
+import os
+import enum
+import json
+import lzma
+import zlib
+import typing
+import hashlib
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from pathlib_mate.helper import repr_data_size
+from atomicwrites import atomic_write
+
+if typing.TYPE_CHECKING:  # pragma: no cover
+    # requests is only imported when a file is downloaded
+    import requests
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+"""
+default number of bytes fetched by one ``Range`` request.
+"""
+
+DEFAULT_N_WORKERS = 4
+"""
+default number of parts fetched concurrently.
+"""
+
+DEFAULT_TIMEOUT = 60
+"""
+default connect / read timeout of each request, in seconds.
+"""
+
+
+class CompressionEnum(enum.Enum):
+    """
+    Compression format of a downloaded file, the value is the file
+    extension.
+    """
+    gzip = "gz"
+    xz = "xz"
+    zstd = "zst"
+
+
+def detect_compression(url: str) -> typing.Optional[CompressionEnum]:
+    """
+    Detect the compression format from the file extension of the url,
+    None if it is not compressed.
+    """
+    url_path = urllib.parse.urlparse(url).path.lower()
+    if url_path.endswith(".zstd"):
+        return CompressionEnum.zstd
+    for compression in CompressionEnum:
+        if url_path.endswith("." + compression.value):
+            return compression
+    return None
+
+
+def _create_decompressor(
+    compression: CompressionEnum,
+) -> typing.Tuple[typing.Any, typing.Tuple[typing.Type[Exception], ...]]:
+    """
+    A streaming decompressor object, with ``decompress(data)`` method and
+    ``eof`` attribute, and the errors it raises on corrupted data.
+    """
+    if compression is CompressionEnum.gzip:
+        return zlib.decompressobj(16 + zlib.MAX_WBITS), (zlib.error, )
+    elif compression is CompressionEnum.xz:
+        return lzma.LZMADecompressor(), (lzma.LZMAError, )
+    else:
+        try:
+            import zstandard
+        except ImportError:  # pragma: no cover
+            raise ImportError(
+                "zstandard is required for .zst file, "
+                "install it with `pip install zstandard`!"
+            )
+        return zstandard.ZstdDecompressor().decompressobj(), (zstandard.ZstdError, )
+
+
+class DownloadError(Exception):
+    """
+    The file can't be downloaded from the url.
+    """
+
+
+class ChecksumMismatchError(DownloadError):
+    """
+    The SHA-256 of the downloaded file is not the expected one.
+    """
+
+
+def get_part_file_path(path: str) -> str:
+    """
+    Path of the partially downloaded file.
+    """
+    return path + ".part"
+
+
+def get_state_file_path(path: str) -> str:
+    """
+    Path of the json file of the finished parts.
+    """
+    return path + ".part.json"
+
+
+def sha256_of_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Hex SHA-256 of a file.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class _Progress(object):
+    """
+    Thread safe downloaded bytes counter, print a line every
+    ``progress_size`` bytes.
+    """
+
+    def __init__(self, progress_size: int, downloaded_size: int = 0):
+        self.progress_size = progress_size
+        self.downloaded_size = downloaded_size
+        self.next_log_threshold = (downloaded_size // progress_size + 1) * progress_size
+        self._lock = threading.Lock()
+
+    def add(self, size: int):
+        with self._lock:
+            self.downloaded_size += size
+            if self.downloaded_size >= self.next_log_threshold:
+                print("  {} downloaded ...".format(repr_data_size(self.downloaded_size)))
+                while self.next_log_threshold <= self.downloaded_size:
+                    self.next_log_threshold += self.progress_size
+
+
+def create_session(n_workers: int = DEFAULT_N_WORKERS) -> 'requests.Session':
+    """
+    A ``requests.Session`` whose connection pool fits ``n_workers`` threads.
+    """
+    import requests
+    import requests.adapters
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=n_workers,
+        pool_maxsize=n_workers,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _probe(
+    session: 'requests.Session',
+    url: str,
+    timeout: float,
+) -> typing.Tuple[typing.Optional[int], bool, str]:
+    """
+    Find the file size, whether ``Range`` requests are supported, and the
+    ``ETag`` or ``Last-Modified`` of the file.
+
+    Many servers reject ``HEAD``, for example presigned S3 urls are only
+    signed for ``GET``, then it asks for the first byte with a ``GET`` range
+    request. If both fail, the size is unknown and the file is downloaded
+    in one request.
+    """
+    import requests
+
+    try:
+        response = session.head(url, allow_redirects=True, timeout=timeout)
+        response.raise_for_status()
+        try:
+            size = int(response.headers["Content-Length"])
+        except (KeyError, ValueError):
+            size = None
+        accept_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    except requests.RequestException:
+        size, accept_ranges = None, False
+
+    if (size is None) or (not accept_ranges):
+        try:
+            with session.get(
+                url, headers={"Range": "bytes=0-0"}, stream=True, timeout=timeout,
+            ) as response:
+                content_range = response.headers.get("Content-Range", "")
+                if (response.status_code != 206) \
+                        or (not content_range.startswith("bytes ")):
+                    return None, False, ""
+                try:
+                    size = int(content_range.split("/")[1])
+                except (IndexError, ValueError):  # "bytes 0-0/*"
+                    return None, False, ""
+                accept_ranges = True
+        except requests.RequestException:
+            return None, False, ""
+
+    validator = response.headers.get("ETag") \
+        or response.headers.get("Last-Modified") \
+        or ""
+    return size, accept_ranges, validator
+
+
+def _load_state(state_file_path: str, state_id: dict) -> typing.Set[int]:
+    """
+    Indexes of the finished parts of an interrupted download of the same
+    file, empty if there is none.
+    """
+    try:
+        with open(state_file_path, "r") as f:
+            state = json.load(f)
+        if state["id"] == state_id:
+            return set(state["done"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return set()
+
+
+def _fetch_range(
+    session: 'requests.Session',
+    url: str,
+    part_file_path: str,
+    start: int,
+    end: int,
+    chunk_size: int,
+    timeout: float,
+    progress: _Progress,
+):
+    """
+    Fetch bytes ``start`` to ``end`` (inclusive) and write them in place.
+    """
+    headers = {"Range": "bytes={}-{}".format(start, end)}
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise DownloadError("{} doesn't support range request!".format(url))
+        written = 0
+        with open(part_file_path, "r+b") as f:
+            f.seek(start)
+            for chunk in response.iter_content(chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+                progress.add(len(chunk))
+    if written != end - start + 1:
+        raise DownloadError(
+            "got {} bytes of range {}-{} from {}!".format(written, start, end, url)
+        )
+
+
+def _download_ranges(
+    session: 'requests.Session',
+    url: str,
+    path: str,
+    size: int,
+    validator: str,
+    part_size: int,
+    n_workers: int,
+    chunk_size: int,
+    timeout: float,
+    progress_size: int,
+):
+    part_file_path = get_part_file_path(path)
+    state_file_path = get_state_file_path(path)
+    state_id = dict(size=size, validator=validator, part_size=part_size)
+
+    done = _load_state(state_file_path, state_id)
+    if not (done and os.path.exists(part_file_path)
+            and os.path.getsize(part_file_path) == size):
+        done = set()
+        with open(part_file_path, "wb") as f:
+            f.truncate(size)
+
+    n_parts = (size + part_size - 1) // part_size
+    todo = [ind for ind in range(n_parts) if ind not in done]
+    progress = _Progress(
+        progress_size,
+        downloaded_size=sum([
+            min(part_size, size - ind * part_size) for ind in done
+        ]),
+    )
+    if done:
+        print("  resume from {} ...".format(repr_data_size(progress.downloaded_size)))
+
+    lock = threading.Lock()
+
+    def fetch_part(ind: int):
+        start = ind * part_size
+        end = min(start + part_size, size) - 1
+        _fetch_range(
+            session, url, part_file_path, start, end, chunk_size, timeout, progress,
+        )
+        with lock:
+            done.add(ind)
+            with atomic_write(state_file_path, mode="w", overwrite=True) as f:
+                json.dump(dict(id=state_id, done=sorted(done)), f)
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(fetch_part, ind) for ind in todo]
+    # all parts are tried, the finished ones are kept in the state, then
+    # raise the first error
+    for future in futures:
+        future.result()
+
+
+def _download_stream(
+    session: 'requests.Session',
+    url: str,
+    path: str,
+    chunk_size: int,
+    timeout: float,
+    progress_size: int,
+    compression: typing.Optional[CompressionEnum] = None,
+) -> str:
+    """
+    Fetch the file in a single stream, decompress it on the fly if
+    ``compression`` is specified.
+
+    :return: hex SHA-256 of the fetched (compressed) bytes.
+    """
+    progress = _Progress(progress_size)
+    sha256 = hashlib.sha256()
+    decompressor, errors = None, tuple()
+    if compression is not None:
+        decompressor, errors = _create_decompressor(compression)
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(get_part_file_path(path), "wb") as f:
+            try:
+                for chunk in response.iter_content(chunk_size):
+                    sha256.update(chunk)
+                    progress.add(len(chunk))
+                    if decompressor is None:
+                        f.write(chunk)
+                    else:
+                        f.write(decompressor.decompress(chunk))
+            except errors as e:
+                raise DownloadError("failed to decompress {}: {}".format(url, e))
+    if (decompressor is not None) and (not decompressor.eof):
+        raise DownloadError("{} is truncated!".format(url))
+    return sha256.hexdigest()
+
+
+def _remove_partial_files(path: str):
+    for p in [get_part_file_path(path), get_state_file_path(path)]:
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def download_file(
+    urls: typing.Union[str, typing.List[str]],
+    path: str,
+    sha256: typing.Optional[str] = None,
+    n_workers: int = DEFAULT_N_WORKERS,
+    part_size: int = DEFAULT_PART_SIZE,
+    chunk_size: int = 1024 * 1024,
+    progress_size: int = 1024 * 1024,
+    timeout: float = DEFAULT_TIMEOUT,
+    session: typing.Optional['requests.Session'] = None,
+    compression: typing.Union[str, CompressionEnum, None] = None,
+):
+    """
+    Download a file, see the module docstring.
+
+    :param urls: the url, or a list of mirror urls of the same file, tried
+        in order.
+    :param path: the output file path.
+    :param sha256: the expected hex SHA-256 of the file, the compressed
+        one if it is compressed. If the downloaded file doesn't match, it is
+        removed and the next url is tried.
+    :param n_workers: number of parts fetched concurrently.
+    :param part_size: number of bytes per ``Range`` request.
+    :param chunk_size: number of bytes read from the response at a time.
+    :param progress_size: print the progress every this many bytes.
+    :param timeout: connect / read timeout of each request, in seconds.
+    :param session: the ``requests.Session`` to use, by default a new one
+        from :func:`create_session`.
+    :param compression: one of :class:`CompressionEnum`, by default it is
+        detected from the url by :func:`detect_compression`.
+    """
+    import requests
+
+    if compression is not None:
+        compression = CompressionEnum(compression)
+    if isinstance(urls, str):
+        urls = [urls, ]
+    if not urls:
+        raise ValueError("`urls` can't be empty!")
+    if sha256 is not None:
+        sha256 = sha256.lower()
+
+    own_session = session is None
+    if own_session:
+        session = create_session(n_workers)
+
+    errors = list()
+    try:
+        for url in urls:
+            print(f"Download {path} from {url} ...")
+            try:
+                url_compression = compression or detect_compression(url)
+                size, accept_ranges, validator = _probe(session, url, timeout)
+                part_file_path = get_part_file_path(path)
+                if (url_compression is None) and (size is not None) \
+                        and accept_ranges and (size > 0):
+                    _download_ranges(
+                        session, url, path, size, validator,
+                        part_size, n_workers, chunk_size, timeout, progress_size,
+                    )
+                    actual = None if sha256 is None else sha256_of_file(part_file_path)
+                else:
+                    actual = _download_stream(
+                        session, url, path, chunk_size, timeout, progress_size,
+                        compression=url_compression,
+                    )
+                if sha256 is not None:
+                    if actual != sha256:
+                        _remove_partial_files(path)
+                        raise ChecksumMismatchError(
+                            "SHA-256 of {} is {}, expected {}!".format(url, actual, sha256)
+                        )
+                os.replace(part_file_path, path)
+                _remove_partial_files(path)
+                print("  Complete!")
+                return
+            except (requests.RequestException, DownloadError) as e:
+                print("  Failed: {}".format(e))
+                errors.append(e)
+    finally:
+        if own_session:
+            session.close()
+    raise DownloadError(
+        "failed to download {} from all urls: {}".format(
+            path, "; ".join([str(e) for e in errors])
+        )
+    )
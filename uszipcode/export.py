@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""
+Export the zipcode table to columnar files for analytics tools, such as
+Spark, DuckDB and pandas.
+
+It requires the ``pyarrow`` package::
+
+    pip install "pyarrow>=14.0.0"
+
+Rows are read from the database in batches and each batch is written as a
+row group (parquet) or a record batch (arrow / feather), the full table is
+never held in memory. Compressed json columns become nested ``list`` /
+``struct`` columns.
+"""
+
+import enum
+import json
+import typing
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+import sqlalchemy_mate as sam
+import sqlalchemy_mate.api
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet
+
+
+class ExportFormatEnum(enum.Enum):
+    """
+    Supported export file format.
+
+    - parquet: Apache Parquet file, one row group per batch.
+    - arrow: Arrow IPC file, one record batch per batch.
+    - feather: Feather V2 file, it is an Arrow IPC file with lz4
+      compression.
+    """
+    parquet = "parquet"
+    arrow = "arrow"
+    feather = "feather"
+
+
+def _is_json_column(column: sa.Column) -> bool:
+    return isinstance(column.type, sam.types.api.CompressedJSONType)
+
+
+def _to_arrow_type(column: sa.Column) -> pa.DataType:
+    """
+    Arrow data type of a scalar column.
+    """
+    if isinstance(column.type, sa.Integer):
+        return pa.int64()
+    elif isinstance(column.type, sa.Float):
+        return pa.float64()
+    else:
+        return pa.string()
+
+
+def _unify_types(type1: pa.DataType, type2: pa.DataType) -> pa.DataType:
+    """
+    Merge two inferred types of the same column, for example, struct fields
+    are merged, null and int are promoted. Raise ``pyarrow.ArrowInvalid``
+    if they are not compatible.
+    """
+    return pa.unify_schemas(
+        [
+            pa.schema([pa.field("value", type1)]),
+            pa.schema([pa.field("value", type2)]),
+        ],
+        promote_options="permissive",
+    ).field("value").type
+
+
+def _iter_batches(
+    engine: Engine,
+    stmt: sa.Select,
+    batch_size: int,
+) -> typing.Iterator[typing.List[sa.Row]]:
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(stmt)
+        for rows in result.partitions():
+            yield rows
+
+
+def infer_schema(
+    engine: Engine,
+    stmt: sa.Select,
+    batch_size: int = 10000,
+) -> pa.Schema:
+    """
+    Infer the arrow schema of the result of ``stmt``.
+
+    Scalar columns are mapped from the sqlalchemy type. The type of json
+    columns is inferred from all values, it takes a full scan of these
+    columns. If the values don't share a compatible type, for example, a
+    field is sometimes int and sometimes str, the column is exported as json
+    string.
+    """
+    columns = list(stmt.selected_columns)
+    json_columns = [column for column in columns if _is_json_column(column)]
+
+    json_types: typing.Dict[str, typing.Optional[pa.DataType]] = {
+        column.name: pa.null()
+        for column in json_columns
+    }
+    if json_columns:
+        for rows in _iter_batches(
+            engine, stmt.with_only_columns(*json_columns), batch_size,
+        ):
+            for ind, column in enumerate(json_columns):
+                if json_types[column.name] is None:
+                    continue
+                try:
+                    json_types[column.name] = _unify_types(
+                        json_types[column.name],
+                        pa.array([row[ind] for row in rows]).type,
+                    )
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    json_types[column.name] = None
+
+    fields = list()
+    for column in columns:
+        if _is_json_column(column):
+            arrow_type = json_types[column.name]
+            if arrow_type is None:
+                arrow_type = pa.string()
+        else:
+            arrow_type = _to_arrow_type(column)
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _to_record_batch(
+    rows: typing.List[sa.Row],
+    columns: typing.List[sa.Column],
+    schema: pa.Schema,
+) -> pa.RecordBatch:
+    arrays = list()
+    for ind, (column, field) in enumerate(zip(columns, schema)):
+        values = [row[ind] for row in rows]
+        if _is_json_column(column) and (field.type == pa.string()):
+            values = [
+                None if value is None else json.dumps(value)
+                for value in values
+            ]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export(
+    engine: Engine,
+    stmt: sa.Select,
+    path: str,
+    format: typing.Union[str, ExportFormatEnum] = ExportFormatEnum.parquet,
+    batch_size: int = 10000,
+) -> int:
+    """
+    Write the result of ``stmt`` to a columnar file.
+
+    :param engine: the database engine.
+    :param stmt: a select statement of table columns.
+    :param path: the output file path.
+    :param format: one of :class:`ExportFormatEnum`.
+    :param batch_size: number of rows per row group / record batch.
+
+    :return: number of exported rows.
+    """
+    format = ExportFormatEnum(format)
+    if batch_size <= 0:
+        raise ValueError("`batch_size` has to be greater than 0!")
+
+    columns = list(stmt.selected_columns)
+    schema = infer_schema(engine, stmt, batch_size=batch_size)
+
+    if format is ExportFormatEnum.parquet:
+        writer = pyarrow.parquet.ParquetWriter(path, schema)
+    elif format is ExportFormatEnum.arrow:
+        writer = pyarrow.ipc.new_file(path, schema)
+    else:
+        writer = pyarrow.ipc.new_file(
+            path, schema,
+            options=pyarrow.ipc.IpcWriteOptions(compression="lz4"),
+        )
+
+    n_rows = 0
+    with writer:
+        for rows in _iter_batches(engine, stmt, batch_size):
+            batch = _to_record_batch(rows, columns, schema)
+            if format is ExportFormatEnum.parquet:
+                writer.write_table(pa.Table.from_batches([batch, ]))
+            else:
+                writer.write_batch(batch)
+            n_rows += len(rows)
+    return n_rows
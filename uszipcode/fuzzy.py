@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fuzzy string matching on a fixed list of choices, such as all city names.
+
+``fuzzywuzzy`` scores the query against every choice, which is slow for tens
+of thousands of city names. :class:`FuzzyIndex` keeps a trigram inverted
+index of the choices, and only scores the choices sharing the largest part
+of their trigrams with the query.
+"""
+
+import heapq
+import typing
+
+from fuzzywuzzy.process import extract, extractOne
+from fuzzywuzzy.utils import full_process
+
+
+def to_trigrams(text: str) -> typing.Set[str]:
+    """
+    Return the trigrams of each word of the normalized text. Words are padded
+    so the first and the last letters have their own trigrams.
+
+    Usage::
+
+        >>> sorted(to_trigrams("New York"))
+        ['  n', '  y', ' ne', ' yo', 'ew ', 'new', 'ork', 'rk ', 'yor']
+    """
+    trigrams = set()
+    for word in full_process(text).split():
+        padded = "  {} ".format(word)
+        for i in range(len(padded) - 2):
+            trigrams.add(padded[i:i + 3])
+    return trigrams
+
+
+class FuzzyIndex(object):
+    """
+    A trigram inverted index of a list of choices.
+
+    Scores are the same as ``fuzzywuzzy.process.extract`` (``WRatio``),
+    only the set of scored choices is narrowed. If no choice shares a
+    trigram with the query, all choices are scored.
+
+    :param choices: the list of string to match against.
+    :param n_candidates: max number of choices to score for each query.
+    """
+
+    def __init__(
+        self,
+        choices: typing.List[str],
+        n_candidates: int = 50,
+    ):
+        self.choices = list(choices)
+        self.n_candidates = n_candidates
+        self._postings: typing.Dict[str, typing.List[int]] = dict()
+        self._n_trigrams: typing.List[int] = list()
+        for ind, choice in enumerate(self.choices):
+            trigrams = to_trigrams(choice)
+            self._n_trigrams.append(len(trigrams))
+            for trigram in trigrams:
+                try:
+                    self._postings[trigram].append(ind)
+                except KeyError:
+                    self._postings[trigram] = [ind, ]
+
+    def __len__(self):
+        return len(self.choices)
+
+    def candidates(self, query: str) -> typing.List[str]:
+        """
+        Return the choices sharing the largest part of their trigrams with
+        the query, in the original order of ``choices``.
+
+        Choices are ranked by the shared trigram count divided by the
+        trigram count of the shorter of the query and the choice, so a choice
+        containing the query, or contained in it, ranks first whatever its
+        length, like the partial ratios of ``WRatio``. Ties are broken by the
+        Jaccard similarity. The raw shared count would let long choices
+        sharing many trigrams by chance push out the best match.
+        """
+        query_trigrams = to_trigrams(query)
+        counter: typing.Dict[int, int] = dict()
+        for trigram in query_trigrams:
+            for ind in self._postings.get(trigram, ()):
+                counter[ind] = counter.get(ind, 0) + 1
+        if not counter:
+            return self.choices
+        if len(counter) > self.n_candidates:
+            n_query = len(query_trigrams)
+
+            def overlap(ind: int) -> typing.Tuple[float, float]:
+                n_shared, n_choice = counter[ind], self._n_trigrams[ind]
+                return (
+                    n_shared / min(n_query, n_choice),
+                    n_shared / (n_query + n_choice - n_shared),
+                )
+
+            ind_list = heapq.nlargest(self.n_candidates, counter, key=overlap)
+        else:
+            ind_list = list(counter)
+        ind_list.sort()
+        return [self.choices[ind] for ind in ind_list]
+
+    def extract_one(
+        self,
+        query: str,
+    ) -> typing.Optional[typing.Tuple[str, int]]:
+        """
+        Same as ``fuzzywuzzy.process.extractOne(query, choices)``.
+        """
+        return extractOne(query, self.candidates(query))
+
+    def extract(
+        self,
+        query: str,
+        limit: int = 5,
+    ) -> typing.List[typing.Tuple[str, int]]:
+        """
+        Same as ``fuzzywuzzy.process.extract(query, choices, limit=limit)``.
+        """
+        return extract(query, self.candidates(query), limit=limit)
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+"""
+Geohash encoding, and the in memory geohash cell index for zipcode
+centroids.
+
+A geohash splits the world into a grid of cells, each cell is named by a
+base32 string, and the cells of a longer geohash are nested in the cell of
+its prefix. All zipcode are sorted by the geohash of their centroid, so the
+zipcode in a cell are a contiguous range found by binary search.
+
+A radius query picks the smallest cell size that is not smaller than the
+radius, then only looks at the cell of the center and its 8 neighbors. The
+candidate set grows with the radius, not with the dataset, and the same
+``(cell, radius)`` always gives the same candidates, so the cells can be
+used as cache keys, see :meth:`GeohashIndex.cover`.
+"""
+
+import math
+import bisect
+import typing
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+from haversine import haversine, Unit
+
+from .model import SimpleZipcode, ComprehensiveZipcode
+from .spatial import EARTH_RADIUS_IN_MILES, normalize_lng
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+"""
+the geohash alphabet.
+"""
+
+GEOHASH_PRECISION = 6
+"""
+default geohash length of the zipcode centroids in :class:`GeohashIndex`,
+a cell is about 0.68 x 0.38 miles.
+"""
+
+_BASE32_INDEX = {char: ind for ind, char in enumerate(BASE32)}
+
+_MILES_PER_DEGREE = EARTH_RADIUS_IN_MILES * math.pi / 180
+
+_MAX_CHAR = "~"  # greater than all BASE32 chars
+
+
+def encode_geohash(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    """
+    Geohash of the coordinates.
+
+    :param precision: length of the geohash.
+    """
+    lat_lower, lat_upper = -90.0, 90.0
+    lng_lower, lng_upper = -180.0, 180.0
+    chars = list()
+    bits, n_bits = 0, 0
+    is_lng = True
+    while len(chars) < precision:
+        if is_lng:
+            mid = (lng_lower + lng_upper) / 2
+            if lng >= mid:
+                bits = (bits << 1) | 1
+                lng_lower = mid
+            else:
+                bits = bits << 1
+                lng_upper = mid
+        else:
+            mid = (lat_lower + lat_upper) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_lower = mid
+            else:
+                bits = bits << 1
+                lat_upper = mid
+        is_lng = not is_lng
+        n_bits += 1
+        if n_bits == 5:
+            chars.append(BASE32[bits])
+            bits, n_bits = 0, 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash: str) -> typing.Tuple[float, float, float, float]:
+    """
+    Bounds of a geohash cell.
+
+    :return: ``(west, south, east, north)``.
+    """
+    lat_lower, lat_upper = -90.0, 90.0
+    lng_lower, lng_upper = -180.0, 180.0
+    is_lng = True
+    for char in geohash:
+        bits = _BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            bit = (bits >> shift) & 1
+            if is_lng:
+                mid = (lng_lower + lng_upper) / 2
+                if bit:
+                    lng_lower = mid
+                else:
+                    lng_upper = mid
+            else:
+                mid = (lat_lower + lat_upper) / 2
+                if bit:
+                    lat_lower = mid
+                else:
+                    lat_upper = mid
+            is_lng = not is_lng
+    return lng_lower, lat_lower, lng_upper, lat_upper
+
+
+def cell_size(precision: int) -> typing.Tuple[float, float]:
+    """
+    Width and height in degree of the geohash cells of this length.
+    """
+    n_bits = 5 * precision
+    return 360.0 / 2 ** ((n_bits + 1) // 2), 180.0 / 2 ** (n_bits // 2)
+
+
+def geohash_neighbors(geohash: str) -> typing.List[str]:
+    """
+    The geohash cells around a cell, at most 8. Cells beyond the poles
+    don't exist, cells across the antimeridian wrap around.
+    """
+    west, south, east, north = geohash_bounds(geohash)
+    width, height = east - west, north - south
+    lat, lng = (south + north) / 2, (west + east) / 2
+    neighbors = list()
+    for d_lat in (-1, 0, 1):
+        n_lat = lat + d_lat * height
+        if not (-90 < n_lat < 90):
+            continue
+        for d_lng in (-1, 0, 1):
+            if d_lat == d_lng == 0:
+                continue
+            neighbor = encode_geohash(
+                n_lat, normalize_lng(lng + d_lng * width), len(geohash),
+            )
+            if (neighbor != geohash) and (neighbor not in neighbors):
+                neighbors.append(neighbor)
+    return neighbors
+
+
+def precision_for_radius(
+    lat: float,
+    radius: float,
+    max_precision: int = GEOHASH_PRECISION,
+) -> int:
+    """
+    The longest geohash whose cells are at least ``radius`` miles wide and
+    high around ``lat``. Then the cell of a point and its neighbors cover
+    the circle of ``radius`` around the point.
+
+    :return: the geohash length, 0 if even the largest cells are too small.
+    """
+    lat_delta = radius / _MILES_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(abs(lat) + lat_delta, 90.0)))
+    for precision in range(max_precision, 0, -1):
+        width, height = cell_size(precision)
+        if (height * _MILES_PER_DEGREE >= radius) \
+                and (width * cos_lat * _MILES_PER_DEGREE >= radius):
+            return precision
+    return 0
+
+
+class GeohashIndex(object):
+    """
+    Zipcode centroids sorted by geohash.
+
+    It has the same ``query_radius`` and ``query_nearest`` methods as
+    :class:`~uszipcode.spatial.SpatialIndex`.
+
+    :param records: iterable of ``(zipcode, zipcode_type, lat, lng)``.
+        records without coordinates are ignored.
+    :param precision: geohash length of the centroids, the smallest cell
+        used by queries.
+
+    Usage::
+
+        >>> index = GeohashIndex.from_session(ses, SimpleZipcode)
+        >>> index.cover(38.897835, -77.036541, radius=5)
+        ['dqcj', 'dqbu', 'dqch', 'dqck', ...]
+        >>> index.query_radius(38.897835, -77.036541, radius=5)
+        [(0.38, "20004"), (0.52, "20006"), ...]
+    """
+
+    def __init__(
+        self,
+        records: typing.Iterable[typing.Tuple[str, str, float, float]],
+        precision: int = GEOHASH_PRECISION,
+    ):
+        self.precision = precision
+        rows = list()
+        for zipcode, zipcode_type, lat, lng in records:
+            if (lat is None) or (lng is None):
+                continue
+            rows.append((
+                encode_geohash(lat, lng, precision),
+                zipcode, zipcode_type, lat, lng,
+            ))
+        rows.sort()
+        self.geohashes: typing.List[str] = [row[0] for row in rows]
+        self.zipcodes: typing.List[str] = [row[1] for row in rows]
+        self.zipcode_types: typing.List[str] = [row[2] for row in rows]
+        self.lats: typing.List[float] = [row[3] for row in rows]
+        self.lngs: typing.List[float] = [row[4] for row in rows]
+
+    @classmethod
+    def from_session(
+        cls,
+        ses: orm.Session,
+        zip_klass: typing.Union[typing.Type[SimpleZipcode], typing.Type[ComprehensiveZipcode]],
+        **kwargs
+    ) -> 'GeohashIndex':
+        """
+        Load all zipcode centroids from the database in one query and build
+        the index. Only four columns are selected, no ORM object is created.
+        """
+        stmt = sa.select(
+            zip_klass.zipcode,
+            zip_klass.zipcode_type,
+            zip_klass.lat,
+            zip_klass.lng,
+        )
+        return cls(ses.execute(stmt), **kwargs)
+
+    def __len__(self):
+        return len(self.zipcodes)
+
+    def cell_range(self, geohash: str) -> range:
+        """
+        Positions of the zipcode in the cell.
+        """
+        return range(
+            bisect.bisect_left(self.geohashes, geohash),
+            bisect.bisect_left(self.geohashes, geohash + _MAX_CHAR),
+        )
+
+    def cover(
+        self,
+        lat: float,
+        lng: float,
+        radius: float,
+    ) -> typing.Optional[typing.List[str]]:
+        """
+        The geohash cells covering the circle of ``radius`` miles around
+        ``lat``, ``lng``: the cell of the point, then its neighbors.
+
+        :return: list of geohash, None if the radius is too large for the
+            largest cells.
+        """
+        precision = precision_for_radius(lat, radius, self.precision)
+        if precision == 0:
+            return None
+        geohash = encode_geohash(lat, lng, precision)
+        cells = [geohash, ] + geohash_neighbors(geohash)
+        if len(cells) < 9:  # near the poles
+            return None
+        return cells
+
+    def _candidates(
+        self,
+        cells: typing.Optional[typing.List[str]],
+        zipcode_type: typing.Optional[str],
+    ) -> typing.Iterator[int]:
+        if cells is None:
+            ranges = [range(len(self.zipcodes)), ]
+        else:
+            ranges = [self.cell_range(cell) for cell in cells]
+        for range_ in ranges:
+            for i in range_:
+                if (zipcode_type is None) or (self.zipcode_types[i] == zipcode_type):
+                    yield i
+
+    def _dist(self, i: int, lat: float, lng: float) -> float:
+        return haversine(
+            (self.lats[i], self.lngs[i]), (lat, lng), unit=Unit.MILES,
+        )
+
+    def query_radius(
+        self,
+        lat: float,
+        lng: float,
+        radius: float,
+        zipcode_type: typing.Optional[str] = None,
+    ) -> typing.List[typing.Tuple[float, str]]:
+        """
+        Find all zipcode within ``radius`` miles from ``lat``, ``lng``.
+
+        :param zipcode_type: if specified, only returns this zipcode type.
+
+        :return: list of ``(dist, zipcode)`` sorted by distance ascending.
+        """
+        pairs = list()
+        for i in self._candidates(self.cover(lat, lng, radius), zipcode_type):
+            dist = self._dist(i, lat, lng)
+            if dist <= radius:
+                pairs.append((dist, self.zipcodes[i]))
+        pairs.sort()
+        return pairs
+
+    def query_nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int = 1,
+        radius: typing.Optional[float] = None,
+        zipcode_type: typing.Optional[str] = None,
+    ) -> typing.List[typing.Tuple[float, str]]:
+        """
+        Find the ``k`` nearest zipcode from ``lat``, ``lng``.
+
+        Without ``radius``, it starts from the smallest cells and moves to
+        larger cells until the ``k`` th nearest zipcode is inside the
+        covered circle.
+
+        :param radius: if specified, ignore zipcode further than ``radius``
+            miles.
+        :param zipcode_type: if specified, only returns this zipcode type.
+
+        :return: list of ``(dist, zipcode)`` sorted by distance ascending,
+            at most ``k`` items.
+        """
+        if k <= 0:
+            return []
+        if radius is not None:
+            return self.query_radius(lat, lng, radius, zipcode_type)[:k]
+
+        for precision in range(self.precision, 0, -1):
+            width, height = cell_size(precision)
+            geohash = encode_geohash(lat, lng, precision)
+            cells = [geohash, ] + geohash_neighbors(geohash)
+            if len(cells) < 9:  # near the poles
+                break
+            # the cell of the point and its neighbors cover this circle
+            cos_lat = math.cos(math.radians(min(abs(lat) + 2 * height, 90.0)))
+            covered = min(height, width * cos_lat) * _MILES_PER_DEGREE
+            pairs = [
+                (self._dist(i, lat, lng), self.zipcodes[i])
+                for i in self._candidates(cells, zipcode_type)
+            ]
+            pairs.sort()
+            if (len(pairs) >= k) and (pairs[k - 1][0] <= covered):
+                return pairs[:k]
+        pairs = [
+            (self._dist(i, lat, lng), self.zipcodes[i])
+            for i in self._candidates(None, zipcode_type)
+        ]
+        pairs.sort()
+        return pairs[:k]
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cross process file lock.
+
+It is an advisory lock on a lock file, ``fcntl.flock`` on posix and
+``msvcrt.locking`` on windows. The operating system releases it when the
+process exits, so a crashed process never leaves a stale lock. The lock file
+itself is never removed, removing it would let two processes lock two
+different files.
+"""
+
+import os
+import time
+import typing
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+    import msvcrt
+
+DEFAULT_LOCK_TIMEOUT = 30 * 60
+"""
+default seconds to wait for a lock, long enough for another process to
+download the comprehensive database.
+"""
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:  # pragma: no cover
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:  # pragma: no cover
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class FileLock(object):
+    """
+    Exclusive lock shared by all processes (and threads, each with its own
+    :class:`FileLock` object) using the same lock file path.
+
+    :param path: the lock file path, it is created if not exists.
+    :param timeout: max seconds to wait for the lock, then raise
+        ``TimeoutError``. None means wait forever.
+    :param poll_interval: seconds between two attempts.
+
+    Usage::
+
+        >>> with FileLock("/tmp/simple_db.sqlite.lock", timeout=60):
+        ...     # only one process runs this at a time
+    """
+
+    def __init__(
+        self,
+        path: str,
+        timeout: typing.Optional[float] = DEFAULT_LOCK_TIMEOUT,
+        poll_interval: float = 0.1,
+    ):
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd: typing.Optional[int] = None
+
+    @property
+    def is_locked(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self):
+        """
+        Wait until the lock is acquired.
+        """
+        if self._fd is not None:
+            raise RuntimeError("{} is already acquired!".format(self.path))
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        start = time.monotonic()
+        while not _try_lock(fd):
+            if (self.timeout is not None) \
+                    and (time.monotonic() - start >= self.timeout):
+                os.close(fd)
+                raise TimeoutError(
+                    "failed to acquire {} in {} seconds!".format(self.path, self.timeout)
+                )
+            time.sleep(self.poll_interval)
+        self._fd = fd
+
+    def release(self):
+        """
+        Release the lock.
+        """
+        if self._fd is None:
+            return
+        try:
+            _unlock(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -147,64 +147,182 @@ class AbstractSimpleZipcode(Base, sam.api.ExtendedBase):
         return json.dumps(data, indent=4)
 
 
+class DeferredGroupEnum(enum.Enum):
+    """
+    Groups of the json columns of :class:`AbstractComprehensiveZipcode`,
+    which can be deferred per query, see
+    :meth:`AbstractComprehensiveZipcode.defer_groups`.
+    """
+    geometry = "geometry"
+    demographics = "demographics"
+    housing = "housing"
+    income = "income"
+    education = "education"
+
+
+def _json_column(group: DeferredGroupEnum) -> sa.Column:
+    """
+    A compressed json column in the ``group``.
+    """
+    return sa.Column(
+        sam.types.api.CompressedJSONType, info={"group": group.value},
+    )
+
+
+class _LoadDeferredGroup(object):
+    """
+    Per instance loader of a deferred json column. It loads and decompresses
+    all not loaded columns of the group in one query, sqlalchemy alone loads
+    the columns deferred by query options one by one.
+    """
+
+    def __init__(self, keys: typing.List[str]):
+        self.keys = keys
+
+    def __call__(self, state: orm.InstanceState, passive: orm.PassiveFlag):
+        if not passive & orm.PassiveFlag.SQL_OK:
+            return orm.LoaderCallableStatus.PASSIVE_NO_RESULT
+        session = state.session
+        if session is None:
+            raise orm.exc.DetachedInstanceError(
+                "{}{} is not bound to a Session, deferred columns {} can't be "
+                "loaded!".format(state.class_.__name__, state.identity, self.keys)
+            )
+        keys = [key for key in self.keys if key not in state.dict]
+        mapper = state.mapper
+        stmt = sa.select(
+            *[getattr(mapper.class_, key) for key in keys]
+        ).where(*[
+            column == value
+            for column, value in zip(mapper.primary_key, state.identity)
+        ])
+        row = session.execute(stmt).one()
+        obj = state.obj()
+        for key, value in zip(keys, row):
+            orm.attributes.set_committed_value(obj, key, value)
+        return orm.LoaderCallableStatus.ATTR_WAS_SET
+
+
 class AbstractComprehensiveZipcode(AbstractSimpleZipcode):
+    """
+    Base class for Zipcode with geometry and demographic data.
+
+    The json columns are loaded with the row. They are grouped by
+    :class:`DeferredGroupEnum`, the groups you don't need can be deferred per
+    query with :meth:`AbstractComprehensiveZipcode.defer_groups`, then the
+    first access of any column in a group loads and decompresses the whole
+    group in one query.
+    """
     __abstract__ = True
 
-    polygon = sa.Column(sam.types.api.CompressedJSONType)
+    polygon = _json_column(DeferredGroupEnum.geometry)
 
     # Stats and Demographics
-    population_by_year = sa.Column(sam.types.api.CompressedJSONType)
-    population_by_age = sa.Column(sam.types.api.CompressedJSONType)
-    population_by_gender = sa.Column(sam.types.api.CompressedJSONType)
-    population_by_race = sa.Column(sam.types.api.CompressedJSONType)
-    head_of_household_by_age = sa.Column(sam.types.api.CompressedJSONType)
-    families_vs_singles = sa.Column(sam.types.api.CompressedJSONType)
-    households_with_kids = sa.Column(sam.types.api.CompressedJSONType)
-    children_by_age = sa.Column(sam.types.api.CompressedJSONType)
+    population_by_year = _json_column(DeferredGroupEnum.demographics)
+    population_by_age = _json_column(DeferredGroupEnum.demographics)
+    population_by_gender = _json_column(DeferredGroupEnum.demographics)
+    population_by_race = _json_column(DeferredGroupEnum.demographics)
+    head_of_household_by_age = _json_column(DeferredGroupEnum.demographics)
+    families_vs_singles = _json_column(DeferredGroupEnum.demographics)
+    households_with_kids = _json_column(DeferredGroupEnum.demographics)
+    children_by_age = _json_column(DeferredGroupEnum.demographics)
 
     # Real Estate and Housing
-    housing_type = sa.Column(sam.types.api.CompressedJSONType)
-    year_housing_was_built = sa.Column(sam.types.api.CompressedJSONType)
-    housing_occupancy = sa.Column(sam.types.api.CompressedJSONType)
-    vacancy_reason = sa.Column(sam.types.api.CompressedJSONType)
-    owner_occupied_home_values = sa.Column(sam.types.api.CompressedJSONType)
-    rental_properties_by_number_of_rooms = sa.Column(sam.types.api.CompressedJSONType)
-
-    monthly_rent_including_utilities_studio_apt = sa.Column(sam.types.api.CompressedJSONType)
-    monthly_rent_including_utilities_1_b = sa.Column(sam.types.api.CompressedJSONType)
-    monthly_rent_including_utilities_2_b = sa.Column(sam.types.api.CompressedJSONType)
-    monthly_rent_including_utilities_3plus_b = sa.Column(sam.types.api.CompressedJSONType)
+    housing_type = _json_column(DeferredGroupEnum.housing)
+    year_housing_was_built = _json_column(DeferredGroupEnum.housing)
+    housing_occupancy = _json_column(DeferredGroupEnum.housing)
+    vacancy_reason = _json_column(DeferredGroupEnum.housing)
+    owner_occupied_home_values = _json_column(DeferredGroupEnum.housing)
+    rental_properties_by_number_of_rooms = _json_column(DeferredGroupEnum.housing)
+
+    monthly_rent_including_utilities_studio_apt = _json_column(DeferredGroupEnum.housing)
+    monthly_rent_including_utilities_1_b = _json_column(DeferredGroupEnum.housing)
+    monthly_rent_including_utilities_2_b = _json_column(DeferredGroupEnum.housing)
+    monthly_rent_including_utilities_3plus_b = _json_column(DeferredGroupEnum.housing)
 
     # Employment, Income, Earnings, and Work
-    employment_status = sa.Column(sam.types.api.CompressedJSONType)
-    average_household_income_over_time = sa.Column(sam.types.api.CompressedJSONType)
-    household_income = sa.Column(sam.types.api.CompressedJSONType)
-    annual_individual_earnings = sa.Column(sam.types.api.CompressedJSONType)
-
-    sources_of_household_income____percent_of_households_receiving_income = sa.Column(
-        sam.types.api.CompressedJSONType)
-    sources_of_household_income____average_income_per_household_by_income_source = sa.Column(
-        sam.types.api.CompressedJSONType)
-
-    household_investment_income____percent_of_households_receiving_investment_income = sa.Column(
-        sam.types.api.CompressedJSONType)
-    household_investment_income____average_income_per_household_by_income_source = sa.Column(
-        sam.types.api.CompressedJSONType)
-
-    household_retirement_income____percent_of_households_receiving_retirement_incom = sa.Column(
-        sam.types.api.CompressedJSONType)
-    household_retirement_income____average_income_per_household_by_income_source = sa.Column(
-        sam.types.api.CompressedJSONType)
-
-    source_of_earnings = sa.Column(sam.types.api.CompressedJSONType)
-    means_of_transportation_to_work_for_workers_16_and_over = sa.Column(
-        sam.types.api.CompressedJSONType)
-    travel_time_to_work_in_minutes = sa.Column(sam.types.api.CompressedJSONType)
+    employment_status = _json_column(DeferredGroupEnum.income)
+    average_household_income_over_time = _json_column(DeferredGroupEnum.income)
+    household_income = _json_column(DeferredGroupEnum.income)
+    annual_individual_earnings = _json_column(DeferredGroupEnum.income)
+
+    sources_of_household_income____percent_of_households_receiving_income = _json_column(
+        DeferredGroupEnum.income)
+    sources_of_household_income____average_income_per_household_by_income_source = _json_column(
+        DeferredGroupEnum.income)
+
+    household_investment_income____percent_of_households_receiving_investment_income = _json_column(
+        DeferredGroupEnum.income)
+    household_investment_income____average_income_per_household_by_income_source = _json_column(
+        DeferredGroupEnum.income)
+
+    household_retirement_income____percent_of_households_receiving_retirement_incom = _json_column(
+        DeferredGroupEnum.income)
+    household_retirement_income____average_income_per_household_by_income_source = _json_column(
+        DeferredGroupEnum.income)
+
+    source_of_earnings = _json_column(DeferredGroupEnum.income)
+    means_of_transportation_to_work_for_workers_16_and_over = _json_column(
+        DeferredGroupEnum.income)
+    travel_time_to_work_in_minutes = _json_column(DeferredGroupEnum.income)
 
     # Schools and Education
-    educational_attainment_for_population_25_and_over = sa.Column(
-        sam.types.api.CompressedJSONType)
-    school_enrollment_age_3_to_17 = sa.Column(sam.types.api.CompressedJSONType)
+    educational_attainment_for_population_25_and_over = _json_column(
+        DeferredGroupEnum.education)
+    school_enrollment_age_3_to_17 = _json_column(DeferredGroupEnum.education)
+
+    @classmethod
+    def defer_groups(
+        cls,
+        groups: typing.Iterable[typing.Union[str, DeferredGroupEnum]],
+    ) -> typing.List[orm.interfaces.LoaderOption]:
+        """
+        Loader options that don't load the json columns of the ``groups``
+        with the row, a column is loaded and decompressed the first time it
+        is accessed, which needs the session of the zipcode object.
+
+        Usage::
+
+            >>> stmt = sa.select(ComprehensiveZipcode).options(
+            ...     *ComprehensiveZipcode.defer_groups(["geometry", "housing"])
+            ... )
+        """
+        group_values = {DeferredGroupEnum(group).value for group in groups}
+        return [
+            orm.defer(getattr(cls, column.key))
+            for column in cls.__table__.columns
+            if column.info.get("group") in group_values
+        ]
+
+    @classmethod
+    def get_group_keys(cls, group: typing.Union[str, DeferredGroupEnum]) -> typing.List[str]:
+        """
+        Attribute names of the json columns in the ``group``.
+        """
+        group_value = DeferredGroupEnum(group).value
+        return [
+            column.key
+            for column in cls.__table__.columns
+            if column.info.get("group") == group_value
+        ]
+
+
+@sa.event.listens_for(AbstractComprehensiveZipcode, "load", propagate=True)
+def _load_deferred_groups(target: AbstractComprehensiveZipcode, context):
+    # replace the loader of each deferred json column by a group loader
+    state = orm.attributes.instance_state(target)
+    if not state.callables:
+        return
+    loaders: typing.Dict[str, _LoadDeferredGroup] = dict()
+    columns = state.mapper.columns
+    for key in list(state.callables):
+        try:
+            group = columns[key].info["group"]
+        except KeyError:
+            continue
+        if group not in loaders:
+            loaders[group] = _LoadDeferredGroup(target.get_group_keys(group))
+        state.callables[key] = loaders[group]
 
 
 class SimpleZipcode(AbstractSimpleZipcode):
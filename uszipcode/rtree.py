@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+SQLite R*Tree sidecar index of zipcode centroids.
+
+The zipcode table only has separate B-tree indexes on ``lat`` and ``lng``,
+a 2-D box query can only use one of them. The sidecar is a small sqlite file
+next to the database file, for example ``simple_db.rtree.sqlite`` for
+``simple_db.sqlite``, with the :data:`centroid_rtree` ``rtree`` virtual
+table of the ``(lat, lng)`` point of each zipcode.
+
+Rtree ids are mapped to zipcode in :data:`rtree_key`. The sidecar is built
+once, and rebuilt if the database file changes. It is attached to every
+connection as the :data:`RTREE_SCHEMA` schema.
+"""
+
+import os
+import sqlite3
+import typing
+
+import sqlalchemy as sa
+from pathlib_mate import Path
+
+from .db import get_db_file_signature
+
+RTREE_SCHEMA = "uszipcode_rtree"
+"""
+the schema name of the attached sidecar database.
+"""
+
+RTREE_FORMAT_VERSION = "2"
+
+_metadata = sa.MetaData()
+
+rtree_key = sa.Table(
+    "rtree_key", _metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("zipcode", sa.String),
+    schema=RTREE_SCHEMA,
+)
+"""
+rtree id to zipcode mapping.
+"""
+
+
+centroid_rtree = sa.Table(
+    "centroid_rtree", _metadata,
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("min_lat", sa.Float),
+    sa.Column("max_lat", sa.Float),
+    sa.Column("min_lng", sa.Float),
+    sa.Column("max_lng", sa.Float),
+    schema=RTREE_SCHEMA,
+)
+"""
+rtree of zipcode centroid.
+"""
+
+
+def get_rtree_file_path(db_file_path: str) -> str:
+    """
+    Path of the sidecar file of a database file.
+    """
+    p = Path(db_file_path)
+    return Path(p.parent, "{}.rtree.sqlite".format(p.fname)).abspath
+
+
+def _read_signature(rtree_file_path: str) -> typing.Optional[str]:
+    if not os.path.exists(rtree_file_path):
+        return None
+    uri = "{}?mode=ro".format(Path(rtree_file_path).absolute().as_uri())
+    try:
+        conn = sqlite3.connect(uri, uri=True)
+        try:
+            return conn.execute(
+                "SELECT value FROM meta WHERE key = 'signature'"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+    except (sqlite3.Error, TypeError):
+        return None
+
+
+def build_rtree_file(
+    db_file_path: str,
+    table_name: str,
+    rtree_file_path: str,
+):
+    """
+    Build the sidecar file of the zipcode table ``table_name``. It is
+    written to a temp file first, then moved to ``rtree_file_path``.
+    """
+    signature = get_db_file_signature(db_file_path, RTREE_FORMAT_VERSION, table_name)
+    tmp_path = "{}.{}.tmp".format(rtree_file_path, os.getpid())
+    if os.path.exists(tmp_path):  # pragma: no cover
+        os.remove(tmp_path)
+
+    source_uri = "{}?mode=ro".format(Path(db_file_path).absolute().as_uri())
+    source = sqlite3.connect(source_uri, uri=True)
+    try:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE rtree_key (id INTEGER PRIMARY KEY, zipcode TEXT)"
+            )
+            conn.execute(
+                "CREATE VIRTUAL TABLE {} USING rtree"
+                "(id, min_lat, max_lat, min_lng, max_lng)".format(centroid_rtree.name)
+            )
+
+            rows = source.execute(
+                "SELECT zipcode, lat, lng "
+                "FROM {} WHERE lat IS NOT NULL AND lng IS NOT NULL".format(table_name)
+            )
+            keys, centroids = list(), list()
+            for id_, (zipcode, lat, lng) in enumerate(rows, start=1):
+                keys.append((id_, zipcode))
+                centroids.append((id_, lat, lat, lng, lng))
+            conn.executemany("INSERT INTO rtree_key VALUES (?, ?)", keys)
+            conn.executemany(
+                "INSERT INTO centroid_rtree VALUES (?, ?, ?, ?, ?)", centroids,
+            )
+            conn.execute(
+                "INSERT INTO meta VALUES ('signature', ?)", (signature,),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, rtree_file_path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        source.close()
+
+
+def ensure_rtree_file(db_file_path: str, table_name: str) -> str:
+    """
+    Return the sidecar file path of the database file, build it if it doesn't
+    exist or the database file has changed.
+    """
+    rtree_file_path = get_rtree_file_path(db_file_path)
+    signature = get_db_file_signature(db_file_path, RTREE_FORMAT_VERSION, table_name)
+    if _read_signature(rtree_file_path) != signature:
+        build_rtree_file(db_file_path, table_name, rtree_file_path)
+    return rtree_file_path
+
+
+def attach_rtree_file(engine: sa.engine.Engine, rtree_file_path: str):
+    """
+    Attach the sidecar file to every new connection of the engine, as the
+    :data:`RTREE_SCHEMA` schema.
+    """
+
+    @sa.event.listens_for(engine, "connect")
+    def attach(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(
+                "ATTACH DATABASE ? AS {}".format(RTREE_SCHEMA),
+                (rtree_file_path,),
+            )
+        finally:
+            cursor.close()
+
+    # connections opened before the listener don't have the sidecar
+    engine.dispose()
+
+
+def rtree_filter(
+    zipcode_column: sa.Column,
+    rtree: sa.Table,
+    lat_lower: float,
+    lat_upper: float,
+    lng_lower: float,
+    lng_upper: float,
+) -> sa.ColumnElement:
+    """
+    Where clause of zipcode whose rectangle in ``rtree`` intersects the box.
+    """
+    return zipcode_column.in_(
+        sa.select(rtree_key.c.zipcode)
+        .join(rtree, rtree.c.id == rtree_key.c.id)
+        .where(
+            rtree.c.max_lat >= lat_lower,
+            rtree.c.min_lat <= lat_upper,
+            rtree.c.max_lng >= lng_lower,
+            rtree.c.min_lng <= lng_upper,
+        )
+    )
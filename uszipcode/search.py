@@ -6,10 +6,12 @@ This module allows developer to query zipcode with super clean API.
 
 import sys
 import math
+import sqlite3
+import warnings
 import enum
 import heapq
 import typing
-from collections import OrderedDict
+import threading
 
 import sqlalchemy as sa
 from sqlalchemy.engine import Engine
@@ -18,18 +20,36 @@ import sqlalchemy_mate as sam
 import sqlalchemy_mate.api 
 
 from pathlib_mate import Path
-from fuzzywuzzy.process import extract, extractOne
 
 from .db import (
-    download_db_file,
+    download_db_file_if_not_exists,
+    create_read_only_sqlite_engine,
+    create_in_memory_sqlite_engine,
     DEFAULT_SIMPLE_DB_FILE_PATH, DEFAULT_COMPREHENSIVE_DB_FILE_PATH,
     SIMPLE_DB_FILE_DOWNLOAD_URL, COMPREHENSIVE_DB_FILE_DOWNLOAD_URL,
 )
-from .model import ZipcodeTypeEnum, SimpleZipcode, ComprehensiveZipcode
+from .model import (
+    ZipcodeTypeEnum, SimpleZipcode, ComprehensiveZipcode, DeferredGroupEnum,
+)
+from .spatial import (
+    SpatialIndex, PolygonIndex, Cluster,
+    SQLITE_DIST_FUNCTION_NAME, dist_in_miles, sql_dist_in_miles,
+    normalize_lng, grid_cell_size,
+)
+from .geohash import GeohashIndex
+from .rtree import (
+    ensure_rtree_file, attach_rtree_file, rtree_filter, centroid_rtree,
+)
+from .citystate import build_city_state_data, load_city_state_data
+from .cache import LRUCache, NOTHING
 from .state_abbr import (
     MAPPER_STATE_ABBR_SHORT_TO_LONG, MAPPER_STATE_ABBR_LONG_TO_SHORT,
 )
 
+if typing.TYPE_CHECKING:  # pragma: no cover
+    # fuzzywuzzy is only imported on the first fuzzy city / state search
+    from .fuzzy import FuzzyIndex
+
 SORT_BY_DIST = "dist"
 """
 a string for ``sort_by`` arguments. order the result by distance from a coordinates.
@@ -40,6 +60,18 @@ DEFAULT_LIMIT = 5
 default number of results to return.
 """
 
+DEFAULT_MAX_POINTS = 500
+"""
+default max number of zipcode returned by a bounding box search, before
+they are grouped into clusters.
+"""
+
+MAX_IN_CLAUSE_SIZE = 500
+"""
+max number of bind parameters in a single ``IN (...)`` clause. Old SQLite
+builds only allow 999 variables per statement.
+"""
+
 HOME = Path.home().abspath
 HOME_USZIPCODE = Path(HOME, ".uszipcode").abspath
 
@@ -82,15 +114,98 @@ class SearchEngine(object):
         property allows you to customize where you want to store the data file
         locally. by default it is ${HOME}/.uszipcode/...
 
-    :type download_url: str
+    :type download_url: typing.Union[str, typing.List[str]]
     :param download_url: where you want to download the sqlite database file from.
         This property allows you to upload the .sqlite file to your private file
         host and download from it. In case the default download url fail.
+        A list of mirror urls are tried in order.
 
     :type engine: Engine
     :param engine: a sqlachemy engine object. It allows you to use any
         backend database instead of the default sqlite database.
 
+    :type use_spatial_index: bool
+    :param use_spatial_index: default False, if True, load all zipcode
+        centroids into an in memory :class:`~uszipcode.spatial.SpatialIndex`
+        on the first radius query, and answer ``lat``, ``lng``, ``radius``
+        queries from it. Full zipcode objects are only created for the
+        final results.
+
+    :type pk_cache_size: int
+    :param pk_cache_size: default 0, if greater than 0, keep up to this many
+        zipcode objects found by :meth:`SearchEngine.by_zipcode` and
+        :meth:`SearchEngine.by_zipcodes` in a LRU cache, including the not
+        found ones. Since the dataset is read only, cached result never
+        expires.
+
+    :type city_state_cache: typing.Union[int, LRUCache]
+    :param city_state_cache: default None, memorize the fuzzy search result
+        of raw ``city``, ``state`` arguments in a :class:`~uszipcode.cache.LRUCache`,
+        so repeated spellings skip the fuzzy matching. An int creates a
+        new cache of that size, a :class:`~uszipcode.cache.LRUCache` instance
+        can be shared between search engines, and persisted with
+        :meth:`~uszipcode.cache.LRUCache.dump`.
+
+    :type query_cache: typing.Union[int, LRUCache]
+    :param query_cache: default None, cache the results of
+        :meth:`SearchEngine.query` and the ``by_xxx`` methods built on it, in
+        a :class:`~uszipcode.cache.LRUCache`, keyed on the normalized
+        arguments (after the fuzzy city / state resolution). An int creates
+        a new cache of that size, a :class:`~uszipcode.cache.LRUCache`
+        instance with ``ttl`` can expire the results, and can be shared
+        between search engines. Cached zipcode objects are fully loaded and
+        detached from the session, don't modify them.
+
+    :type thread_safe: bool
+    :param thread_safe: default False, if True, open the sqlite file in read
+        only mode with a connection pool, and use a
+        ``sqlalchemy.orm.scoped_session``, so each thread works with its own
+        session. Then one instance can be shared by all threads.
+
+    :type in_memory: bool
+    :param in_memory: default False, if True, copy the sqlite file into an
+        in memory database at startup, all queries run with zero disk I/O.
+        It only applies to the sqlite file, not a custom ``engine``.
+
+    :type use_geohash_index: bool
+    :param use_geohash_index: default False, if True, sort all zipcode
+        centroids by geohash in an in memory
+        :class:`~uszipcode.geohash.GeohashIndex` on the first radius query,
+        and answer ``lat``, ``lng``, ``radius`` queries by looking up the
+        geohash cell of the center and its neighbors. It takes precedence
+        over ``use_spatial_index``.
+
+    :type use_rtree: bool
+    :param use_rtree: default False, if True, build a sqlite R*Tree index of
+        zipcode centroids next to the sqlite file (only once, see
+        :mod:`uszipcode.rtree`), and use it for the bounding box of radius
+        query. It only applies to the sqlite file, not a custom ``engine``.
+        If the index file can't be written, it warns and uses the ``lat`` /
+        ``lng`` index instead.
+
+    :type use_city_state_file: bool
+    :param use_city_state_file: default False, if True, save the city /
+        state lookup tables used by the fuzzy city / state search in a json
+        file next to the sqlite file (see :mod:`uszipcode.citystate`), later
+        processes load them from the file instead of scanning the table.
+        It only applies to the sqlite file, not a custom ``engine``.
+
+    :type warmup_city_state: bool
+    :param warmup_city_state: default False, if True, load the city / state
+        lookup tables in a background thread at construction, so the first
+        fuzzy city / state search doesn't wait for them.
+
+    :type defer_groups: typing.List[typing.Union[str, DeferredGroupEnum]]
+    :param defer_groups: default None, the json column groups of
+        :class:`~uszipcode.model.ComprehensiveZipcode` (see
+        :class:`~uszipcode.model.DeferredGroupEnum`) not loaded with the row,
+        for example ``["geometry", "housing"]``. The first access of any
+        column in a deferred group loads and decompresses the whole group in
+        one query, so it can't be read after :meth:`SearchEngine.close`. It
+        can't be used with ``thread_safe`` and ``pk_cache_size``, which share
+        zipcode objects between threads. By default all columns are loaded
+        with the row.
+
     Usage::
 
         >>> search = SearchEngine()
@@ -114,8 +229,9 @@ class SearchEngine(object):
 
     .. note::
 
-        :class:`SearchEngine` is not multi-thread safe. You should create different
-        instance for each thread.
+        By default, :class:`SearchEngine` is not multi-thread safe. You should
+        create different instance for each thread, or use
+        ``SearchEngine(thread_safe=True)``.
     """
 
     class SimpleOrComprehensiveArgEnum(enum.Enum):
@@ -135,8 +251,19 @@ class SearchEngine(object):
         self,
         simple_or_comprehensive: SimpleOrComprehensiveArgEnum = SimpleOrComprehensiveArgEnum.simple,
         db_file_path: typing.Union[str, None] = None,
-        download_url: typing.Union[str, None] = None,
+        download_url: typing.Union[str, typing.List[str], None] = None,
         engine: Engine = None,
+        use_spatial_index: bool = False,
+        pk_cache_size: int = 0,
+        city_state_cache: typing.Union[int, LRUCache, None] = None,
+        query_cache: typing.Union[int, LRUCache, None] = None,
+        thread_safe: bool = False,
+        in_memory: bool = False,
+        use_rtree: bool = False,
+        use_geohash_index: bool = False,
+        use_city_state_file: bool = False,
+        warmup_city_state: bool = False,
+        defer_groups: typing.Optional[typing.List[typing.Union[str, DeferredGroupEnum]]] = None,
     ):
         validate_enum_arg(
             self.SimpleOrComprehensiveArgEnum,
@@ -153,10 +280,21 @@ class SearchEngine(object):
             self.db_file_path = db_file_path
             self.download_url = download_url
             self._download_db_file_if_not_exists()
-            self.engine = sam.api.EngineCreator().create_sqlite(path=self.db_file_path)
+            if in_memory:
+                self.engine = create_in_memory_sqlite_engine(self.db_file_path)
+            elif thread_safe:
+                self.engine = create_read_only_sqlite_engine(self.db_file_path)
+            else:
+                self.engine = sam.api.EngineCreator().create_sqlite(path=self.db_file_path)
         self.eng = self.engine
-        self.session = orm.Session(self.engine)
+        self.thread_safe = thread_safe
+        self.session: typing.Union[orm.Session, orm.scoped_session] = self._create_session()
         self.ses = self.session
+        # guards the lazy loaded in memory data, such as city list and
+        # spatial index, so they are only built once. It doesn't guard the
+        # tasks of an AsyncSearchEngine, which all run in the event loop
+        # thread, the AsyncSearchEngine builds the indexes before them.
+        self._lock = threading.RLock()
 
         self.zip_klass: typing.Union[SimpleZipcode, ComprehensiveZipcode]
         if self.simple_or_comprehensive is self.SimpleOrComprehensiveArgEnum.simple:
@@ -164,27 +302,100 @@ class SearchEngine(object):
         elif self.simple_or_comprehensive is self.SimpleOrComprehensiveArgEnum.comprehensive:
             self.zip_klass = ComprehensiveZipcode
 
+        self.use_rtree = use_rtree
+        if self.use_rtree:
+            if self.db_file_path is None:
+                raise ValueError("`use_rtree` only works with the sqlite file!")
+            try:
+                rtree_file_path = ensure_rtree_file(
+                    self.db_file_path, self.zip_klass.__tablename__,
+                )
+            except (OSError, sqlite3.Error) as e:
+                # for example, the sqlite file is in a read only directory
+                warnings.warn(
+                    "failed to build the rtree sidecar file of {}, "
+                    "fall back to the lat / lng index: {}".format(self.db_file_path, e)
+                )
+                self.use_rtree = False
+            else:
+                attach_rtree_file(self.engine, rtree_file_path)
+
+        self.use_spatial_index = use_spatial_index
+        self._spatial_index: typing.Optional[SpatialIndex] = None
+        self.use_geohash_index = use_geohash_index
+        self._geohash_index: typing.Optional[GeohashIndex] = None
+        self._polygon_index: typing.Optional[PolygonIndex] = None
+
+        self._city_fuzzy_index_mapper: typing.Dict[typing.Optional[str], 'FuzzyIndex'] = dict()
+
+        self.use_city_state_file = use_city_state_file
+        if self.use_city_state_file and (self.db_file_path is None):
+            raise ValueError("`use_city_state_file` only works with the sqlite file!")
+
+        self.pk_cache: typing.Optional[LRUCache] = None
+        if pk_cache_size:
+            self.pk_cache = LRUCache(maxsize=pk_cache_size)
+
+        self.city_state_cache: typing.Optional[LRUCache] = None
+        if isinstance(city_state_cache, LRUCache):
+            self.city_state_cache = city_state_cache
+        elif city_state_cache:
+            self.city_state_cache = LRUCache(maxsize=city_state_cache)
+
+        self.query_cache: typing.Optional[LRUCache] = None
+        if isinstance(query_cache, LRUCache):
+            self.query_cache = query_cache
+        elif query_cache:
+            self.query_cache = LRUCache(maxsize=query_cache)
+
+        # deferred json columns are loaded on first access through the
+        # session of the zipcode object, the primary key cache shares the
+        # objects between the sessions of all threads.
+        self.defer_groups = list(defer_groups) if defer_groups else list()
+        self._load_options: typing.List[orm.interfaces.LoaderOption] = list()
+        if self.defer_groups:
+            if self.zip_klass is not ComprehensiveZipcode:
+                raise ValueError("`defer_groups` only works with the comprehensive database!")
+            if thread_safe and (self.pk_cache is not None):
+                raise ValueError(
+                    "`defer_groups` can't be used with `thread_safe` and `pk_cache_size`!"
+                )
+            self._load_options = self.zip_klass.defer_groups(self.defer_groups)
+
+        self._warmup_thread: typing.Optional[threading.Thread] = None
+        if warmup_city_state:
+            self._warmup_thread = threading.Thread(
+                target=self._warmup_city_state, daemon=True,
+            )
+            self._warmup_thread.start()
+
+    def _create_session(self) -> typing.Union[orm.Session, orm.scoped_session]:
+        if self.thread_safe:
+            return orm.scoped_session(orm.sessionmaker(bind=self.engine))
+        else:
+            return orm.Session(self.engine)
+
     def _download_db_file_if_not_exists(self):
         if self.db_file_path is None:
             self.db_file_path = self._default_db_file_path_mapper[self.simple_or_comprehensive]
         if self.download_url is None:
             self.download_url = self._default_download_url_mapper[self.simple_or_comprehensive]
-        p = Path(self.db_file_path)
-        if not p.exists():
-            if self.simple_or_comprehensive is self.SimpleOrComprehensiveArgEnum.simple:
-                download_db_file(
-                    db_file_path=self.db_file_path,
-                    download_url=self.download_url,
-                    chunk_size=1024 * 1024,
-                    progress_size=1024 * 1024,
-                )
-            elif self.simple_or_comprehensive is self.SimpleOrComprehensiveArgEnum.comprehensive:
-                download_db_file(
-                    db_file_path=self.db_file_path,
-                    download_url=self.download_url,
-                    chunk_size=1024 * 1024,
-                    progress_size=50 * 1024 * 1024,
-                )
+        if isinstance(self.download_url, str):
+            download_url, mirror_urls = self.download_url, []
+        else:
+            download_url, mirror_urls = self.download_url[0], self.download_url[1:]
+        if self.simple_or_comprehensive is self.SimpleOrComprehensiveArgEnum.simple:
+            progress_size = 1024 * 1024
+        else:
+            progress_size = 50 * 1024 * 1024
+        # concurrent processes wait for the one downloading the file
+        download_db_file_if_not_exists(
+            db_file_path=self.db_file_path,
+            download_url=download_url,
+            chunk_size=1024 * 1024,
+            progress_size=progress_size,
+            mirror_urls=mirror_urls,
+        )
 
     def __enter__(self):  # pragma: no cover
         return self
@@ -199,9 +410,13 @@ class SearchEngine(object):
 
     def close(self):
         """
-        close database connection.
+        close database connection. In thread safe mode, only the session of
+        the current thread is closed.
         """
-        self.ses.close()
+        if self.thread_safe:
+            self.ses.remove()
+        else:
+            self.ses.close()
 
     # Since fuzzy search on City and State requires full list of city and state
     # We load the full list from the database only once and store it in cache
@@ -222,55 +437,40 @@ class SearchEngine(object):
 
     _city_to_state_mapper: typing.Dict[str, list] = None
 
-    def _get_cache_data(self):
-        _city_set = set()
-        _state_to_city_mapper: typing.Dict[str, set] = dict()
-        _city_to_state_mapper: typing.Dict[str, set] = dict()
+    def _get_cache_data(self, ses: typing.Optional[orm.Session] = None):
+        with self._lock:
+            # another thread may have built it while we were waiting
+            if self._city_to_state_mapper is not None:
+                return
+            self._build_cache_data(ses)
 
+    def _build_cache_data(self, ses: typing.Optional[orm.Session] = None):
+        if ses is None:
+            ses = self.ses
         stmt = sa.select(self.zip_klass.major_city, self.zip_klass.state)
-        for major_city, state in self.ses.execute(stmt):
-            if major_city is not None:
-                _city_set.add(major_city)
-                if state is not None:
-                    state = state.upper()
-                    try:
-                        _state_to_city_mapper[state].add(major_city)
-                    except:
-                        _state_to_city_mapper[state] = {major_city, }
-
-                    try:
-                        _city_to_state_mapper[major_city].add(state)
-                    except:
-                        _city_to_state_mapper[major_city] = {state, }
-
-        self._city_list = list(_city_set)
-        self._city_list.sort()
-        self._state_list = list(MAPPER_STATE_ABBR_LONG_TO_SHORT)
-        self._state_list.sort()
-
-        self._state_to_city_mapper = OrderedDict(
-            sorted(
-                (
-                    (state, list(city_set))
-                    for state, city_set in _state_to_city_mapper.items()
-                ),
-                key=lambda x: x[0]
+        if self.use_city_state_file:
+            city_list, state_to_city_mapper, city_to_state_mapper = load_city_state_data(
+                self.db_file_path,
+                self.zip_klass.__tablename__,
+                lambda: ses.execute(stmt),
             )
-        )
-        for city_list in self._state_to_city_mapper.values():
-            city_list.sort()
-
-        self._city_to_state_mapper = OrderedDict(
-            sorted(
-                (
-                    (city, list(state_set))
-                    for city, state_set in _city_to_state_mapper.items()
-                ),
-                key=lambda x: x[0]
-            )
-        )
-        for state_list in self._city_to_state_mapper.values():
-            state_list.sort()
+        else:
+            city_list, state_to_city_mapper, city_to_state_mapper = \
+                build_city_state_data(ses.execute(stmt))
+        state_list = list(MAPPER_STATE_ABBR_LONG_TO_SHORT)
+        state_list.sort()
+
+        # only publish fully built data, ``_city_to_state_mapper`` goes last
+        # because it is the flag checked by ``_get_cache_data``
+        self._city_list = city_list
+        self._state_list = state_list
+        self._state_to_city_mapper = state_to_city_mapper
+        self._city_to_state_mapper = city_to_state_mapper
+
+    def _warmup_city_state(self):
+        # the session of the engine is not shared with the calling thread
+        with orm.Session(self.engine) as ses:
+            self._get_cache_data(ses)
 
     @property
     def city_list(self):  # pragma: no cover
@@ -302,6 +502,70 @@ class SearchEngine(object):
             self._get_cache_data()
         return self._city_to_state_mapper
 
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        """
+        In memory KD-tree of all zipcode centroids, built on first access.
+        """
+        if self._spatial_index is None:
+            with self._lock:
+                if self._spatial_index is None:
+                    self._spatial_index = SpatialIndex.from_session(
+                        self.ses, self.zip_klass,
+                    )
+        return self._spatial_index
+
+    @property
+    def geohash_index(self) -> GeohashIndex:
+        """
+        In memory geohash index of all zipcode centroids, built on first
+        access.
+        """
+        if self._geohash_index is None:
+            with self._lock:
+                if self._geohash_index is None:
+                    self._geohash_index = GeohashIndex.from_session(
+                        self.ses, self.zip_klass,
+                    )
+        return self._geohash_index
+
+    @property
+    def polygon_index(self) -> PolygonIndex:
+        """
+        In memory R-tree of all zipcode boundary bounding boxes, built on
+        first access. Only available for the comprehensive database.
+        """
+        if self._polygon_index is None:
+            if not hasattr(self.zip_klass, "polygon"):
+                raise ValueError(
+                    "zipcode polygon is only available in the comprehensive database!"
+                )
+            with self._lock:
+                if self._polygon_index is None:
+                    self._polygon_index = PolygonIndex.from_session(
+                        self.ses, self.zip_klass,
+                    )
+        return self._polygon_index
+
+    def get_city_fuzzy_index(self, state: typing.Optional[str] = None) -> 'FuzzyIndex':
+        """
+        Return the :class:`~uszipcode.fuzzy.FuzzyIndex` of all city names,
+        or city names in a state. It is built on first use.
+
+        :param state: two letter state abbreviation, all uppercase.
+        """
+        try:
+            return self._city_fuzzy_index_mapper[state]
+        except KeyError:
+            from .fuzzy import FuzzyIndex
+
+            if state is None:
+                fuzzy_index = FuzzyIndex(self.city_list)
+            else:
+                fuzzy_index = FuzzyIndex(self.state_to_city_mapper[state])
+            self._city_fuzzy_index_mapper[state] = fuzzy_index
+            return fuzzy_index
+
     def find_state(
         self,
         state: str,
@@ -322,6 +586,8 @@ class SearchEngine(object):
 
         # if not, find out what is the state that user looking for
         else:
+            from fuzzywuzzy.process import extract, extractOne
+
             if best_match:
                 state_long, confidence = extractOne(state, self.state_list)
                 if confidence >= min_similarity:
@@ -362,18 +628,18 @@ class SearchEngine(object):
         # find out what is the city that user looking for
         if state:
             state_short = self.find_state(state, best_match=True)[0]
-            city_pool = self.state_to_city_mapper[state_short.upper()]
+            fuzzy_index = self.get_city_fuzzy_index(state_short.upper())
         else:
-            city_pool = self.city_list
+            fuzzy_index = self.get_city_fuzzy_index()
 
         result_city_list = list()
 
         if best_match:
-            city, confidence = extractOne(city, city_pool)
+            city, confidence = fuzzy_index.extract_one(city)
             if confidence >= min_similarity:
                 result_city_list.append(city)
         else:
-            for city, confidence in extract(city, city_pool):
+            for city, confidence in fuzzy_index.extract(city):
                 if confidence >= min_similarity:
                     result_city_list.append(city)
 
@@ -382,6 +648,40 @@ class SearchEngine(object):
 
         return result_city_list
 
+    def _resolve_city_and_state(
+        self,
+        city: typing.Optional[str],
+        state: typing.Optional[str],
+    ) -> typing.Tuple[typing.Optional[str], typing.Optional[str]]:
+        """
+        Fuzzy search the best matched city and state. The result, including
+        not found, is memorized in :attr:`SearchEngine.city_state_cache`.
+
+        :return: tuple of city name and two letter state abbreviation, None
+            if the input is None.
+        """
+        key = (city, state)
+        if self.city_state_cache is not None:
+            value = self.city_state_cache.get(key)
+            if value is not NOTHING:
+                if value is None:
+                    raise ValueError(
+                        "'%s', '%s' is not a valid city, state" % key
+                    )
+                return tuple(value)
+        try:
+            if state is not None:
+                state = self.find_state(state, best_match=True)[0]
+            if city is not None:
+                city = self.find_city(city, state, best_match=True)[0]
+        except ValueError:
+            if self.city_state_cache is not None:
+                self.city_state_cache.put(key, None)
+            raise
+        if self.city_state_cache is not None:
+            self.city_state_cache.put(key, (city, state))
+        return city, state
+
     @staticmethod
     def _resolve_sort_by(sort_by: str, flag_radius_query: bool):
         """
@@ -408,6 +708,29 @@ class SearchEngine(object):
 
         return sort_by
 
+    def _resolve_fields(
+        self,
+        fields: typing.Optional[typing.List[typing.Union[str, sa.Column]]],
+    ) -> typing.Optional[typing.List[sa.Column]]:
+        """
+        Resolve ``fields`` argument to a list of column of the zipcode table.
+
+        :param fields: list of str or sqlalchemy ORM attribute.
+        """
+        if fields is None:
+            return None
+        columns = list()
+        for field in fields:
+            if not isinstance(field, str):
+                field = field.name
+            if field not in self.zip_klass.__table__.columns:
+                msg = "`fields` arg has to be a list of Zipcode attribute!"
+                raise ValueError(msg)
+            columns.append(self.zip_klass.__table__.columns[field])
+        if len(columns) == 0:
+            raise ValueError("`fields` arg can't be empty!")
+        return columns
+
     def query(
         self,
         zipcode: typing.Union[int, float] = None,
@@ -443,6 +766,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.zipcode.name,
         ascending: bool = True,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Query zipcode the simple way.
@@ -479,10 +803,167 @@ class SearchEngine(object):
             specified which field is used for sorting.
         :param ascending: bool, True means ascending, False means descending.
         :param returns: int or None, limit the number of result to returns.
+        :param fields: list of str or :class:`~uszipcode.model.Zipcode`
+            attribute. if specified, only select these columns, and returns
+            dict instead of zipcode object. It is much cheaper when you only
+            need a few columns.
 
         :return: list of :class:`~uszipcode.model.SimpleZipcode` or
-            :class:`~uszipcode.model.ComprehensiveZipcode`.
+            :class:`~uszipcode.model.ComprehensiveZipcode`, or list of dict
+            if ``fields`` is specified.
         """
+        return self._query(
+            batch_size=None,
+            zipcode=zipcode,
+            prefix=prefix,
+            pattern=pattern,
+            city=city,
+            state=state,
+            lat=lat,
+            lng=lng,
+            radius=radius,
+            population_lower=population_lower,
+            population_upper=population_upper,
+            population_density_lower=population_density_lower,
+            population_density_upper=population_density_upper,
+            land_area_in_sqmi_lower=land_area_in_sqmi_lower,
+            land_area_in_sqmi_upper=land_area_in_sqmi_upper,
+            water_area_in_sqmi_lower=water_area_in_sqmi_lower,
+            water_area_in_sqmi_upper=water_area_in_sqmi_upper,
+            housing_units_lower=housing_units_lower,
+            housing_units_upper=housing_units_upper,
+            occupied_housing_units_lower=occupied_housing_units_lower,
+            occupied_housing_units_upper=occupied_housing_units_upper,
+            median_home_value_lower=median_home_value_lower,
+            median_home_value_upper=median_home_value_upper,
+            median_household_income_lower=median_household_income_lower,
+            median_household_income_upper=median_household_income_upper,
+            zipcode_type=zipcode_type,
+            sort_by=sort_by,
+            ascending=ascending,
+            returns=returns,
+            fields=fields,
+        )
+
+    def iter_query(
+        self,
+        batch_size: int = 1000,
+        **kwargs
+    ) -> typing.Iterator[typing.Union[SimpleZipcode, ComprehensiveZipcode, dict]]:
+        """
+        Same as :meth:`SearchEngine.query`, but returns an iterator that
+        loads ``batch_size`` rows at a time, instead of a list. It returns
+        all matched zipcode by default (``returns=None``).
+
+        Each batch is removed from the session once it is consumed, so memory
+        usage doesn't grow with the number of results. The yielded zipcode
+        objects are detached, with all columns loaded.
+
+        Usage::
+
+            >>> for zipcode in search.iter_query(state="CA"):
+            ...     # do what every you want
+
+        :param batch_size: number of rows fetched from the database at a time.
+        :param kwargs: same arguments as :meth:`SearchEngine.query`.
+        """
+        if batch_size <= 0:
+            raise ValueError("`batch_size` has to be greater than 0!")
+        kwargs.setdefault("returns", None)
+        return iter(self._query(batch_size=batch_size, **kwargs))
+
+    def _stream_stmt(
+        self,
+        stmt: sa.Select,
+        columns: typing.Optional[typing.List[sa.Column]],
+        batch_size: int,
+    ) -> typing.Iterator[typing.Union[SimpleZipcode, ComprehensiveZipcode, dict]]:
+        """
+        Execute ``stmt`` with ``yield_per`` and yield the results, expunge
+        zipcode objects from the session batch by batch.
+        """
+        result = self.ses.execute(stmt.execution_options(yield_per=batch_size))
+        try:
+            if columns is None:
+                for partition in result.scalars().partitions():
+                    yield from partition
+                    for z in partition:
+                        self.ses.expunge(z)
+            else:
+                keys = [column.key for column in columns]
+                for partition in result.partitions():
+                    for row in partition:
+                        yield dict(zip(keys, row))
+        finally:
+            result.close()
+
+    def _stream_zipcodes(
+        self,
+        zipcode_list: typing.List[str],
+        columns: typing.Optional[typing.List[sa.Column]],
+        load_options: typing.List[orm.interfaces.LoaderOption],
+        batch_size: int,
+    ) -> typing.Iterator[typing.Union[SimpleZipcode, ComprehensiveZipcode, dict]]:
+        """
+        Fetch and yield zipcode objects by primary key in the order of
+        ``zipcode_list``, expunge them from the session batch by batch.
+        """
+        for i in range(0, len(zipcode_list), batch_size):
+            chunk = zipcode_list[i:i + batch_size]
+            mapper = self._fetch_zipcode_mapper(chunk, columns, load_options)
+            for zipcode in chunk:
+                if zipcode in mapper:
+                    yield mapper[zipcode]
+            if columns is None:
+                for z in mapper.values():
+                    self.ses.expunge(z)
+
+    def _query(
+        self,
+        batch_size: typing.Optional[int],
+        zipcode: typing.Union[int, float] = None,
+        prefix: str = None,
+        pattern: str = None,
+        city: str = None,
+        state: str = None,
+        lat: typing.Union[int, float] = None,
+        lng: typing.Union[int, float] = None,
+        radius=None,
+
+        population_lower: int = None,
+        population_upper: int = None,
+        population_density_lower: int = None,
+        population_density_upper: int = None,
+
+        land_area_in_sqmi_lower: int = None,
+        land_area_in_sqmi_upper: int = None,
+        water_area_in_sqmi_lower: int = None,
+        water_area_in_sqmi_upper: int = None,
+
+        housing_units_lower: int = None,
+        housing_units_upper: int = None,
+        occupied_housing_units_lower: int = None,
+        occupied_housing_units_upper: int = None,
+
+        median_home_value_lower: int = None,
+        median_home_value_upper: int = None,
+        median_household_income_lower: int = None,
+        median_household_income_upper: int = None,
+
+        zipcode_type: ZipcodeTypeEnum = ZipcodeTypeEnum.Standard,
+        sort_by: str = SimpleZipcode.zipcode.name,
+        ascending: bool = True,
+        returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
+    ):
+        """
+        Implementation of :meth:`SearchEngine.query` and
+        :meth:`SearchEngine.iter_query`.
+
+        :param batch_size: if None, returns a list. Otherwise, returns a
+            generator that loads ``batch_size`` rows at a time.
+        """
+        columns = self._resolve_fields(fields)
         filters = list()
 
         # by coordinates
@@ -513,7 +994,9 @@ class SearchEngine(object):
 
             # define lat lng boundary, should be slightly larger than the circle
             dist_btwn_lat_deg = 69.172
-            dist_btwn_lon_deg = math.cos(lat) * 69.172
+            dist_btwn_lon_deg = max(
+                math.cos(math.radians(lat)) * 69.172, 0.000001,
+            )
             lat_degr_rad = abs(radius * radius_coef / dist_btwn_lat_deg)
             lon_degr_rad = abs(radius * radius_coef / dist_btwn_lon_deg)
 
@@ -522,10 +1005,18 @@ class SearchEngine(object):
             lng_lower = lng - lon_degr_rad
             lng_upper = lng + lon_degr_rad
 
-            filters.append(self.zip_klass.lat >= lat_lower)
-            filters.append(self.zip_klass.lat <= lat_upper)
-            filters.append(self.zip_klass.lng >= lng_lower)
-            filters.append(self.zip_klass.lng <= lng_upper)
+            if self.use_rtree:
+                filters.append(rtree_filter(
+                    self.zip_klass.zipcode, centroid_rtree,
+                    lat_lower, lat_upper, lng_lower, lng_upper,
+                ))
+                n_coordinates_filters = 1
+            else:
+                filters.append(self.zip_klass.lat >= lat_lower)
+                filters.append(self.zip_klass.lat <= lat_upper)
+                filters.append(self.zip_klass.lng >= lng_lower)
+                filters.append(self.zip_klass.lng <= lng_upper)
+                n_coordinates_filters = 4
         elif _n_radius_param_not_null == 0:
             flag_radius_query = False
         else:
@@ -534,26 +1025,18 @@ class SearchEngine(object):
 
         # by city or state
         if (state is not None) and (city is not None):
-            state = self.find_state(state, best_match=True)[0]
-            city = self.find_city(city, state, best_match=True)[0]
+            city, state = self._resolve_city_and_state(city, state)
             filters.append(self.zip_klass.state == state)
             filters.append(self.zip_klass.major_city == city)
-            try:
-                state = self.find_state(state, best_match=True)[0]
-                city = self.find_city(city, state, best_match=True)[0]
-                filters.append(self.zip_klass.state == state)
-                filters.append(self.zip_klass.major_city == city)
-            except ValueError:  # pragma: no cover
-                return []
         elif (state is not None):
             try:
-                state = self.find_state(state, best_match=True)[0]
+                _, state = self._resolve_city_and_state(None, state)
                 filters.append(self.zip_klass.state == state)
             except ValueError:  # pragma: no cover
                 return []
         elif (city is not None):
             try:
-                city = self.find_city(city, None, best_match=True)[0]
+                city, _ = self._resolve_city_and_state(city, None)
                 filters.append(self.zip_klass.major_city == city)
             except ValueError:  # pragma: no cover
                 return []
@@ -643,7 +1126,45 @@ class SearchEngine(object):
         # --- solve coordinates and other search sort_by conflict ---
         sort_by = self._resolve_sort_by(sort_by, flag_radius_query)
 
-        stmt = sa.select(self.zip_klass).where(*filters)
+        cache_key = None
+        if (batch_size is None) and (self.query_cache is not None):
+            cache_key = (
+                self.zip_klass.__tablename__,
+                None if zipcode is None else str(zipcode),
+                None if prefix is None else str(prefix),
+                None if pattern is None else str(pattern),
+                city, state, lat, lng, radius,
+                population_lower, population_upper,
+                population_density_lower, population_density_upper,
+                land_area_in_sqmi_lower, land_area_in_sqmi_upper,
+                water_area_in_sqmi_lower, water_area_in_sqmi_upper,
+                housing_units_lower, housing_units_upper,
+                occupied_housing_units_lower, occupied_housing_units_upper,
+                median_home_value_lower, median_home_value_upper,
+                median_household_income_lower, median_household_income_upper,
+                None if zipcode_type is None else zipcode_type.value,
+                sort_by, bool(ascending), returns or None,
+                None if columns is None else tuple([column.name for column in columns]),
+            )
+            result = self.query_cache.get(cache_key)
+            if result is not NOTHING:
+                if columns is None:
+                    return list(result)
+                return [dict(row) for row in result]
+
+        if (batch_size is None) and (cache_key is None):
+            load_options = self._load_options
+        else:
+            # streamed and cached zipcode objects are expunged from the
+            # session, all columns have to be loaded before that
+            load_options = list()
+
+        if columns is None:
+            stmt = sa.select(self.zip_klass).where(*filters).options(
+                *load_options
+            )
+        else:
+            stmt = sa.select(*columns).where(*filters)
 
         if sort_by is None:
             pass
@@ -657,14 +1178,21 @@ class SearchEngine(object):
                 by = field.desc()
             stmt = stmt.order_by(by)
 
-        if flag_radius_query:
-            # if we query by radius, then ignore returns limit before the
-            # distance calculation, and then manually limit the returns
-            pairs = list()
-            for z in self.ses.scalars(stmt):
-                dist = z.dist_from(lat, lng)
-                if dist <= radius:
-                    pairs.append((dist, z))
+        if flag_radius_query and (self.use_spatial_index or self.use_geohash_index):
+            # the bounding box filters and the zipcode_type filter are
+            # all the spatial index can answer by itself
+            n_index_filters = n_coordinates_filters + int(zipcode_type is not None)
+            pairs = self._find_pairs_with_spatial_index(
+                stmt=stmt,
+                lat=lat,
+                lng=lng,
+                radius=radius,
+                zipcode_type=zipcode_type,
+                flag_index_only=len(filters) == n_index_filters,
+                sort_by=sort_by,
+                ascending=ascending,
+                returns=returns,
+            )
 
             if sort_by == SORT_BY_DIST:
                 if ascending:
@@ -682,20 +1210,192 @@ class SearchEngine(object):
                         pairs_new = list(
                             sorted(pairs, key=lambda x: x[0], reverse=True)
                         )
-                return [z for _, z in pairs_new]
+            elif returns:
+                pairs_new = pairs[:returns]
             else:
-                return [z for _, z in pairs[:returns]]
+                pairs_new = pairs
+
+            zipcode_list = [z for _, z in pairs_new]
+            if batch_size is not None:
+                return self._stream_zipcodes(
+                    zipcode_list, columns, load_options, batch_size,
+                )
+            if cache_key is not None:
+                mapper = self._fetch_zipcode_mapper(
+                    zipcode_list, columns, load_options,
+                )
+                return self._cache_query_result(cache_key, columns, [
+                    mapper[zipcode]
+                    for zipcode in zipcode_list
+                    if zipcode in mapper
+                ])
+            return self.by_zipcodes(
+                zipcode_list, zero_padding=False, fields=fields,
+            )
+
+        if flag_radius_query:
+            # the distance is computed, filtered and sorted in the database,
+            # only the final rows are loaded as zipcode objects
+            dist = self._sql_dist_from(lat, lng)
+            stmt = stmt.where(dist <= radius)
+            if sort_by == SORT_BY_DIST:
+                if ascending:
+                    stmt = stmt.order_by(dist.asc())
+                else:
+                    stmt = stmt.order_by(dist.desc())
+
+        if returns:
+            stmt = stmt.limit(returns)
+
+        if batch_size is not None:
+            return self._stream_stmt(stmt, columns, batch_size)
+
+        if columns is None:
+            result = self.ses.scalars(stmt).all()
         else:
-            if returns:
-                stmt = stmt.limit(returns)
+            keys = [column.key for column in columns]
+            result = [dict(zip(keys, row)) for row in self.ses.execute(stmt)]
+        if cache_key is not None:
+            return self._cache_query_result(cache_key, columns, result)
+        return result
 
-            return self.ses.scalars(stmt).all()
+    def _cache_query_result(
+        self,
+        cache_key: tuple,
+        columns: typing.Optional[typing.List[sa.Column]],
+        result: list,
+    ) -> list:
+        """
+        Put a query result in :attr:`SearchEngine.query_cache` as a tuple,
+        zipcode objects are expunged from the session first, so they can be
+        shared between sessions and threads. Returns a copy.
+        """
+        if columns is None:
+            for z in result:
+                if z in self.ses:
+                    self.ses.expunge(z)
+            self.query_cache.put(cache_key, tuple(result))
+            return list(result)
+        self.query_cache.put(cache_key, tuple(result))
+        return [dict(row) for row in result]
+
+    def _sql_dist_from(
+        self,
+        lat: typing.Union[int, float],
+        lng: typing.Union[int, float],
+    ) -> sa.ColumnElement:
+        """
+        SQL expression of the distance in miles between the zipcode center
+        and the coordinates. On sqlite, it registers the
+        :func:`~uszipcode.spatial.dist_in_miles` function on the connection
+        used by the session, only once per connection.
+        """
+        dialect_name = self.engine.dialect.name
+        if dialect_name == "sqlite":
+            pooled_conn = self.ses.connection().connection
+            if SQLITE_DIST_FUNCTION_NAME not in pooled_conn.info:
+                pooled_conn.dbapi_connection.create_function(
+                    SQLITE_DIST_FUNCTION_NAME, 4, dist_in_miles,
+                )
+                pooled_conn.info[SQLITE_DIST_FUNCTION_NAME] = True
+        return sql_dist_in_miles(
+            self.zip_klass.lat, self.zip_klass.lng, lat, lng, dialect_name,
+        )
+
+    def _find_pairs_with_spatial_index(
+        self,
+        stmt: sa.Select,
+        lat: typing.Union[int, float],
+        lng: typing.Union[int, float],
+        radius: typing.Union[int, float],
+        zipcode_type: typing.Optional[ZipcodeTypeEnum],
+        flag_index_only: bool,
+        sort_by: typing.Optional[str],
+        ascending: bool,
+        returns: typing.Optional[int],
+    ) -> typing.List[typing.Tuple[float, str]]:
+        """
+        Find ``(dist, zipcode)`` pairs within the radius using
+        :attr:`SearchEngine.geohash_index` if ``use_geohash_index`` is on,
+        otherwise :attr:`SearchEngine.spatial_index`.
+
+        If the query has no filter other than coordinates and zipcode type,
+        the index answers it alone. Otherwise, only the ``zipcode`` column
+        of ``stmt`` is selected from the database, in the ``stmt`` order,
+        and intersected with the index candidates.
+        """
+        zipcode_type_value = None if zipcode_type is None else zipcode_type.value
+        if self.use_geohash_index:
+            index = self.geohash_index
+        else:
+            index = self.spatial_index
+        if flag_index_only and (sort_by == SORT_BY_DIST):
+            if ascending and returns:
+                return index.query_nearest(
+                    lat, lng, k=returns, radius=radius,
+                    zipcode_type=zipcode_type_value,
+                )
+            return index.query_radius(
+                lat, lng, radius, zipcode_type=zipcode_type_value,
+            )
+
+        dist_mapper = {
+            zipcode: dist
+            for dist, zipcode in index.query_radius(
+                lat, lng, radius, zipcode_type=zipcode_type_value,
+            )
+        }
+        return [
+            (dist_mapper[zipcode], zipcode)
+            for zipcode in self.ses.scalars(
+                stmt.with_only_columns(self.zip_klass.zipcode)
+            )
+            if zipcode in dist_mapper
+        ]
+
+    def _fetch_zipcode_mapper(
+        self,
+        zipcode_list: typing.List[str],
+        columns: typing.Optional[typing.List[sa.Column]] = None,
+        load_options: typing.Optional[typing.List[orm.interfaces.LoaderOption]] = None,
+    ) -> typing.Dict[str, typing.Union[SimpleZipcode, ComprehensiveZipcode, dict]]:
+        """
+        Fetch zipcode objects by primary key with ``IN (...)`` queries, at
+        most :data:`MAX_IN_CLAUSE_SIZE` keys per query.
+
+        :param columns: if specified, only select these columns, and fetch
+            dict instead of zipcode object.
+        :param load_options: loader options of the zipcode objects, default
+            to the options of the search engine.
+
+        :return: zipcode to zipcode object mapper, keys not found are absent.
+        """
+        if load_options is None:
+            load_options = self._load_options
+        mapper = dict()
+        for i in range(0, len(zipcode_list), MAX_IN_CLAUSE_SIZE):
+            chunk = zipcode_list[i:i + MAX_IN_CLAUSE_SIZE]
+            if columns is None:
+                stmt = sa.select(self.zip_klass).where(
+                    self.zip_klass.zipcode.in_(chunk)
+                ).options(*load_options)
+                for z in self.ses.scalars(stmt):
+                    mapper[z.zipcode] = z
+            else:
+                keys = [column.key for column in columns]
+                stmt = sa.select(self.zip_klass.zipcode, *columns).where(
+                    self.zip_klass.zipcode.in_(chunk)
+                )
+                for row in self.ses.execute(stmt):
+                    mapper[row[0]] = dict(zip(keys, row[1:]))
+        return mapper
 
     def by_zipcode(
         self,
         zipcode: typing.Union[int, str],
         zero_padding: bool = True,
-    ) -> typing.Union[SimpleZipcode, ComprehensiveZipcode, None]:
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
+    ) -> typing.Union[SimpleZipcode, ComprehensiveZipcode, dict, None]:
         """
         Search zipcode by exact 5 digits zipcode. No zero padding is needed.
 
@@ -704,12 +1404,75 @@ class SearchEngine(object):
         :param zipcode_type: str or :class`~uszipcode.model.ZipcodeType` attribute.
             by default, it returns any zipcode type.
         :param zero_padding: bool, toggle on and off automatic zero padding.
+        :param fields: see :meth:`SearchEngine.query`.
         """
+        if fields is not None:
+            return self.by_zipcodes(
+                [zipcode, ], zero_padding=zero_padding, fields=fields,
+            )[0]
         if zero_padding:
             zipcode = str(zipcode).zfill(5)
         else:  # pragma: no cover
             zipcode = str(zipcode)
-        return self.ses.get(self.zip_klass, zipcode)
+        if self.pk_cache is None:
+            return self.ses.get(
+                self.zip_klass, zipcode, options=self._load_options,
+            )
+        z = self.pk_cache.get(zipcode)
+        if z is NOTHING:
+            z = self.ses.get(
+                self.zip_klass, zipcode, options=self._load_options,
+            )
+            self.pk_cache.put(zipcode, z)
+        return z
+
+    def by_zipcodes(
+        self,
+        zipcodes: typing.Iterable[typing.Union[int, str]],
+        zero_padding: bool = True,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
+    ) -> typing.List[typing.Union[SimpleZipcode, ComprehensiveZipcode, dict, None]]:
+        """
+        Search many zipcode by exact 5 digits zipcode at once.
+
+        Duplicate keys are only fetched once, and all keys are fetched with
+        a few ``IN (...)`` queries instead of one query per zipcode.
+
+        :param zipcodes: iterable of int or str zipcode.
+        :param zero_padding: bool, toggle on and off automatic zero padding.
+        :param fields: see :meth:`SearchEngine.query`. The primary key cache
+            is not used.
+
+        :return: list of zipcode object in the same order as the input, None
+            if the zipcode is not found.
+        """
+        columns = self._resolve_fields(fields)
+        if zero_padding:
+            key_list = [str(zipcode).zfill(5) for zipcode in zipcodes]
+        else:
+            key_list = [str(zipcode) for zipcode in zipcodes]
+
+        mapper = dict()
+        missing_key_list = list()
+        for key in key_list:
+            if key in mapper:
+                continue
+            if (self.pk_cache is None) or (columns is not None):
+                z = NOTHING
+            else:
+                z = self.pk_cache.get(key)
+            mapper[key] = z
+            if z is NOTHING:
+                missing_key_list.append(key)
+
+        fetched_mapper = self._fetch_zipcode_mapper(missing_key_list, columns)
+        for key in missing_key_list:
+            z = fetched_mapper.get(key)
+            mapper[key] = z
+            if (self.pk_cache is not None) and (columns is None):
+                self.pk_cache.put(key, z)
+
+        return [mapper[key] for key in key_list]
 
     def by_prefix(
         self,
@@ -718,6 +1481,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.zipcode.name,
         ascending: bool = True,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by first N digits.
@@ -728,6 +1492,7 @@ class SearchEngine(object):
             prefix=prefix,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_pattern(
@@ -737,6 +1502,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.zipcode.name,
         ascending: bool = True,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode by wildcard.
@@ -747,6 +1513,7 @@ class SearchEngine(object):
             pattern=pattern,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_city(
@@ -756,6 +1523,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.zipcode.name,
         ascending: bool = True,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by fuzzy City name.
@@ -766,6 +1534,7 @@ class SearchEngine(object):
             city=city,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_state(
@@ -775,6 +1544,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.zipcode.name,
         ascending: bool = True,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by fuzzy State name.
@@ -785,6 +1555,7 @@ class SearchEngine(object):
             state=state,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_city_and_state(
@@ -795,6 +1566,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.zipcode.name,
         ascending: bool = True,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by fuzzy city and state name.
@@ -806,6 +1578,7 @@ class SearchEngine(object):
             state=state,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_coordinates(
@@ -817,6 +1590,7 @@ class SearchEngine(object):
         sort_by: str = SORT_BY_DIST,
         ascending: bool = True,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information near a coordinates on a map.
@@ -839,7 +1613,329 @@ class SearchEngine(object):
             lat=lat, lng=lng, radius=radius,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
+        )
+
+    def by_point(
+        self,
+        lat: typing.Union[int, float],
+        lng: typing.Union[int, float],
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
+    ) -> typing.Union[ComprehensiveZipcode, dict, None]:
+        """
+        Reverse geocoding by boundary, find the zipcode whose polygon
+        contains the point. Only available for the comprehensive database.
+
+        Unlike :meth:`SearchEngine.by_coordinates`, which returns the nearest
+        zipcode center, the result is exact near the zipcode borders. The
+        candidates are found in :attr:`SearchEngine.polygon_index` by
+        bounding box, then tested by ray casting. Polygons are loaded and
+        decompressed only once.
+
+        :param lat: latitude.
+        :param lng: longitude.
+        :param fields: see :meth:`SearchEngine.query`.
+
+        :return: the zipcode, or None if the point is not in any zipcode.
+        """
+        index = self.polygon_index
+        candidates = index.candidates(lat, lng)
+        missing_zipcode_list = index.missing(candidates)
+        if missing_zipcode_list:
+            stmt = sa.select(self.zip_klass.zipcode, self.zip_klass.polygon) \
+                .where(self.zip_klass.zipcode.in_(missing_zipcode_list))
+            for zipcode, polygon in self.ses.execute(stmt):
+                index.add(zipcode, polygon)
+        for zipcode in candidates:
+            if index.contains(zipcode, lat, lng):
+                return self.by_zipcode(zipcode, zero_padding=False, fields=fields)
+        return None
+
+    def _bbox_filters(
+        self,
+        west: float,
+        south: float,
+        east: float,
+        north: float,
+    ) -> typing.List[sa.ColumnElement]:
+        """
+        Where clauses of zipcode whose centroid is in the bounding box. The
+        longitude range crosses the antimeridian if ``west > east``.
+
+        With :attr:`SearchEngine.use_rtree`, the rtree filter narrows down
+        the rows, the exact lat / lng comparisons are still required, the
+        rtree stores float32 coordinates rounded outward.
+        """
+        filters = [
+            self.zip_klass.lat >= south,
+            self.zip_klass.lat <= north,
+        ]
+        if west <= east:
+            filters.append(self.zip_klass.lng >= west)
+            filters.append(self.zip_klass.lng <= east)
+        else:
+            filters.append(sa.or_(
+                self.zip_klass.lng >= west,
+                self.zip_klass.lng <= east,
+            ))
+
+        if self.use_rtree:
+            if west <= east:
+                filters.insert(0, rtree_filter(
+                    self.zip_klass.zipcode, centroid_rtree,
+                    south, north, west, east,
+                ))
+            else:
+                filters.insert(0, sa.or_(
+                    rtree_filter(
+                        self.zip_klass.zipcode, centroid_rtree,
+                        south, north, west, 180,
+                    ),
+                    rtree_filter(
+                        self.zip_klass.zipcode, centroid_rtree,
+                        south, north, -180, east,
+                    ),
+                ))
+        return filters
+
+    def by_bbox(
+        self,
+        west: typing.Union[int, float],
+        south: typing.Union[int, float],
+        east: typing.Union[int, float],
+        north: typing.Union[int, float],
+        zoom: typing.Optional[int] = None,
+        max_points: int = DEFAULT_MAX_POINTS,
+        zipcode_type: ZipcodeTypeEnum = ZipcodeTypeEnum.Standard,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
+    ) -> typing.List[typing.Union[SimpleZipcode, ComprehensiveZipcode, dict, Cluster]]:
+        """
+        Search zipcode in a map viewport.
+
+        If at most ``max_points`` zipcode centroids are in the bounding box,
+        returns them, sorted by zipcode. Otherwise, the bounding box is
+        divided into a square grid, and returns a
+        :class:`~uszipcode.spatial.Cluster` for each non empty cell, with the
+        number of zipcode, the average centroid and the total population.
+        The grouping is done in the database, no zipcode object is created.
+
+        :param west: min longitude. if ``west > east``, the bounding box
+            crosses the antimeridian.
+        :param south: min latitude.
+        :param east: max longitude.
+        :param north: max latitude.
+        :param zoom: web map zoom level. if specified, the grid is aligned
+            with the map tiles at this zoom level (see
+            :func:`~uszipcode.spatial.grid_cell_size`), so clusters don't
+            move when the map is panned. Otherwise, the grid is chosen so
+            there are at most ``max_points`` clusters.
+        :param max_points: max number of zipcode returned without clustering.
+        :param zipcode_type: if None, allows any type of zipcode.
+        :param fields: see :meth:`SearchEngine.query`, only applies to the
+            zipcode, not the clusters.
+
+        Usage::
+
+            >>> result = search.by_bbox(-125.0, 24.0, -66.0, 50.0, zoom=4)
+            >>> result[0]
+            Cluster(lat=32.1, lng=-116.8, count=389, population=4861528)
+        """
+        if south > north:
+            raise ValueError("`south` can't be greater than `north`!")
+        if max_points <= 0:
+            raise ValueError("`max_points` has to be greater than 0!")
+        columns = self._resolve_fields(fields)
+
+        filters = self._bbox_filters(west, south, east, north)
+        if zipcode_type is not None:
+            filters.append(self.zip_klass.zipcode_type == zipcode_type.value)
+
+        n_zipcode = self.ses.scalar(
+            sa.select(sa.func.count()).select_from(self.zip_klass).where(*filters)
+        )
+        if n_zipcode <= max_points:
+            if columns is None:
+                stmt = sa.select(self.zip_klass).options(*self._load_options)
+            else:
+                stmt = sa.select(*columns)
+            stmt = stmt.where(*filters).order_by(self.zip_klass.zipcode)
+            if columns is None:
+                return self.ses.scalars(stmt).all()
+            keys = [column.key for column in columns]
+            return [dict(zip(keys, row)) for row in self.ses.execute(stmt)]
+
+        cell_size = grid_cell_size(
+            west, south, east, north, max_cells=max_points, zoom=zoom,
+        )
+        if west <= east:
+            lng_offset = self.zip_klass.lng - west
+        else:
+            lng_offset = sa.case(
+                (self.zip_klass.lng >= west, self.zip_klass.lng - west),
+                else_=self.zip_klass.lng - west + 360,
+            )
+        if zoom is None:
+            lng_origin, lat_origin = west, south
+        else:
+            # align the grid with the tiles, instead of the viewport
+            lng_origin = math.floor((west + 180) / cell_size) * cell_size - 180
+            lat_origin = math.floor((south + 90) / cell_size) * cell_size - 90
+            lng_offset = lng_offset + (west - lng_origin)
+
+        lat_offset = self.zip_klass.lat - lat_origin
+        if self.engine.dialect.name == "sqlite":
+            # offsets are non negative inside the bounding box, cast
+            # truncates them to the cell index. floor() is not always
+            # available in sqlite.
+            col = sa.cast(lng_offset / cell_size, sa.Integer)
+            row = sa.cast(lat_offset / cell_size, sa.Integer)
+        else:
+            col = sa.func.floor(lng_offset / cell_size)
+            row = sa.func.floor(lat_offset / cell_size)
+        stmt = (
+            sa.select(
+                row,
+                col,
+                sa.func.count(),
+                sa.func.avg(self.zip_klass.lat),
+                sa.func.avg(lng_offset),
+                sa.func.sum(sa.func.coalesce(self.zip_klass.population, 0)),
+            )
+            .where(*filters)
+            .group_by(row, col)
+            .order_by(row, col)
+        )
+        clusters = list()
+        for row_ind, col_ind, count, lat, lng, population in self.ses.execute(stmt):
+            cell_west = lng_origin + int(col_ind) * cell_size
+            cell_south = lat_origin + int(row_ind) * cell_size
+            clusters.append(Cluster(
+                lat=lat,
+                lng=normalize_lng(lng_origin + lng),
+                count=count,
+                population=population,
+                west=normalize_lng(cell_west),
+                south=cell_south,
+                east=normalize_lng(cell_west + cell_size),
+                north=cell_south + cell_size,
+            ))
+        return clusters
+
+    def batch_nearest(
+        self,
+        lats: typing.Iterable[typing.Union[int, float]],
+        lngs: typing.Iterable[typing.Union[int, float]],
+        k: int = 1,
+        radius: typing.Union[int, float, None] = None,
+        zipcode_type: ZipcodeTypeEnum = ZipcodeTypeEnum.Standard,
+    ) -> typing.Tuple[list, list]:
+        """
+        Reverse geocoding for many coordinates at once. Find the nearest
+        zipcode for every ``(lat, lng)`` pair.
+
+        It doesn't touch the database except for building
+        :attr:`SearchEngine.spatial_index` on the first call, and no zipcode
+        object is created.
+
+        If ``numpy`` is installed, all points are answered by
+        :meth:`~uszipcode.spatial.SpatialIndex.batch_query_nearest`, a
+        vectorized tile query without Python code per point, about 3 times
+        faster, which is the way to go for millions of rows. Without ``numpy``, each point is a KD-tree
+        query in Python, tens of microseconds per point.
+
+        :param lats: sequence of latitude, list, tuple or numpy array.
+        :param lngs: sequence of longitude, same length as ``lats``.
+        :param k: number of nearest zipcode for each coordinates.
+        :param radius: if specified, ignore zipcode further than
+            ``radius`` miles.
+        :param zipcode_type: if None, allows any type of zipcode.
+
+        :return: a tuple of two list, zipcode and distance in miles, aligned
+            with the input. If ``k == 1``, each item is a str and a float,
+            or None if nothing found (or the coordinates is null). Otherwise,
+            each item is a list of at most ``k`` str / float, nearest first.
+            If ``lats`` is a numpy array, it returns two numpy arrays
+            instead, of shape ``(n,)`` if ``k == 1`` else ``(n, k)``, the
+            zipcode array has None and the distance array has NaN for not
+            found.
+
+        Usage::
+
+            >>> search.batch_nearest([38.897835, 40.7484], [-77.036541, -73.9967])
+            (["20004", "10001"], [0.38, 0.12])
+        """
+        zipcode_type_value = None if zipcode_type is None else zipcode_type.value
+        index = self.spatial_index
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is not None:
+            return self._batch_nearest_numpy(
+                np, index, lats, lngs, k, radius, zipcode_type_value,
+            )
+
+        zipcode_list, dist_list = list(), list()
+        for lat, lng in zip(lats, lngs):
+            if (lat is None) or (lng is None) or (lat != lat) or (lng != lng):
+                pairs = []  # null or NaN
+            else:
+                pairs = index.query_nearest(
+                    float(lat), float(lng), k=k, radius=radius,
+                    zipcode_type=zipcode_type_value,
+                )
+            if k == 1:
+                if pairs:
+                    dist_list.append(pairs[0][0])
+                    zipcode_list.append(pairs[0][1])
+                else:
+                    dist_list.append(None)
+                    zipcode_list.append(None)
+            else:
+                dist_list.append([dist for dist, _ in pairs])
+                zipcode_list.append([zipcode for _, zipcode in pairs])
+        return zipcode_list, dist_list
+
+    @staticmethod
+    def _batch_nearest_numpy(
+        np,
+        index: SpatialIndex,
+        lats,
+        lngs,
+        k: int,
+        radius: typing.Optional[float],
+        zipcode_type_value: typing.Optional[str],
+    ) -> tuple:
+        return_array = isinstance(lats, np.ndarray)
+        if not return_array:
+            lats, lngs = list(lats), list(lngs)
+        positions, dists = index.batch_query_nearest(
+            lats, lngs, k=k, radius=radius, zipcode_type=zipcode_type_value,
         )
+        # position -1 is the trailing None
+        zipcode_array = np.array(index.zipcodes + [None, ], dtype=object)
+        zipcodes = zipcode_array[positions]
+        if return_array:
+            if k == 1:
+                return zipcodes[:, 0], dists[:, 0]
+            return zipcodes, dists
+        found = positions >= 0
+        if k == 1:
+            return (
+                zipcodes[:, 0].tolist(),
+                [
+                    float(dist) if is_found else None
+                    for dist, is_found in zip(dists[:, 0].tolist(), found[:, 0].tolist())
+                ],
+            )
+        zipcode_list, dist_list = list(), list()
+        for row_zipcodes, row_dists, row_found in zip(
+            zipcodes.tolist(), dists.tolist(), found.tolist(),
+        ):
+            n_found = sum(row_found)
+            zipcode_list.append(row_zipcodes[:n_found])
+            dist_list.append(row_dists[:n_found])
+        return zipcode_list, dist_list
 
     def by_population(
         self,
@@ -849,6 +1945,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.population.name,
         ascending: bool = False,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by population range.
@@ -858,6 +1955,7 @@ class SearchEngine(object):
             population_upper=upper,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_population_density(
@@ -868,6 +1966,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.population_density.name,
         ascending: bool = False,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by population density range.
@@ -879,6 +1978,7 @@ class SearchEngine(object):
             population_density_upper=upper,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_land_area_in_sqmi(
@@ -889,6 +1989,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.land_area_in_sqmi.name,
         ascending: bool = False,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by land area / sq miles range.
@@ -898,6 +1999,7 @@ class SearchEngine(object):
             land_area_in_sqmi_upper=upper,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_water_area_in_sqmi(
@@ -908,6 +2010,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.water_area_in_sqmi.name,
         ascending: bool = False,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by water area / sq miles range.
@@ -917,6 +2020,7 @@ class SearchEngine(object):
             water_area_in_sqmi_upper=upper,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_housing_units(
@@ -927,6 +2031,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.housing_units.name,
         ascending: bool = False,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by house of units.
@@ -936,6 +2041,7 @@ class SearchEngine(object):
             housing_units_upper=upper,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_occupied_housing_units(
@@ -946,6 +2052,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.occupied_housing_units.name,
         ascending: bool = False,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by occupied house of units.
@@ -955,6 +2062,7 @@ class SearchEngine(object):
             occupied_housing_units_upper=upper,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_median_home_value(
@@ -965,6 +2073,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.median_home_value.name,
         ascending: bool = False,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by median home value.
@@ -974,6 +2083,7 @@ class SearchEngine(object):
             median_home_value_upper=upper,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
         )
 
     def by_median_household_income(
@@ -984,6 +2094,7 @@ class SearchEngine(object):
         sort_by: str = SimpleZipcode.median_household_income.name,
         ascending: bool = False,
         returns: int = DEFAULT_LIMIT,
+        fields: typing.List[typing.Union[str, sa.Column]] = None,
     ):
         """
         Search zipcode information by median household income.
@@ -993,6 +2104,69 @@ class SearchEngine(object):
             median_household_income_upper=upper,
             sort_by=sort_by, zipcode_type=zipcode_type,
             ascending=ascending, returns=returns,
+            fields=fields,
+        )
+
+    def export(
+        self,
+        path: str,
+        format: str = "parquet",
+        columns: typing.List[typing.Union[str, sa.Column]] = None,
+        filters: typing.List[sa.ColumnElement] = None,
+        batch_size: int = 10000,
+    ) -> int:
+        """
+        Export the zipcode table to a parquet, arrow or feather file, without
+        creating any zipcode object. It requires ``pyarrow``. See
+        :mod:`uszipcode.export`.
+
+        Usage::
+
+            >>> search.export(
+            ...     "zipcode.parquet",
+            ...     columns=["zipcode", "state", "population_by_age"],
+            ...     filters=[ComprehensiveZipcode.population >= 10000],
+            ... )
+
+        :param path: the output file path.
+        :param format: "parquet", "arrow" or "feather".
+        :param columns: list of str or :class:`~uszipcode.model.Zipcode`
+            attribute. if not specified, export all columns.
+        :param filters: list of sqlalchemy where clause, for example
+            ``[SimpleZipcode.state == "CA", ]``.
+        :param batch_size: number of rows per row group / record batch.
+
+        :return: number of exported rows.
+        """
+        from .export import export
+
+        columns = self._resolve_fields(columns)
+        if columns is None:
+            columns = list(self.zip_klass.__table__.columns)
+        stmt = sa.select(*columns).order_by(self.zip_klass.zipcode)
+        if filters:
+            stmt = stmt.where(*filters)
+        return export(
+            engine=self.engine,
+            stmt=stmt,
+            path=path,
+            format=format,
+            batch_size=batch_size,
+        )
+
+    def create_snapshot(self, path: str) -> int:
+        """
+        Dump the simple zipcode columns to a memory mapped snapshot file,
+        see :class:`uszipcode.snapshot.Snapshot`.
+
+        :return: number of zipcode in the snapshot.
+        """
+        from .snapshot import create_snapshot
+
+        return create_snapshot(
+            engine=self.engine,
+            path=path,
+            table=self.zip_klass.__table__,
         )
 
     def inspect_raw_data(self, zipcode: str):
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+"""
+A compact, read only, memory mapped snapshot of the simple zipcode dataset.
+
+The snapshot is a single binary file::
+
+    magic (8 bytes) | metadata length (uint64) | metadata json | sections
+
+Each column is a section of fixed width values, 8 bytes aligned:
+
+- the zipcode key array, sorted, ``key_width`` bytes per zipcode.
+- float columns, ``float64``, NaN is NULL.
+- integer columns, ``int64``, :data:`INT_NULL` is NULL.
+- string and json columns, ``uint32`` index into the string table,
+  :data:`STR_NULL` is NULL. The string table is an ``uint32`` offset array
+  and a utf-8 blob, each distinct string is stored once.
+
+:class:`Snapshot` maps the file with ``mmap`` and reads the columns through
+``memoryview``, nothing is copied or parsed at startup. ``by_zipcode`` is a
+binary search over the key array. Processes opening the same file share
+one physical copy of the data through the OS page cache.
+
+All numbers are little endian, so the columns can be read in place on
+little endian machines (x86, ARM), which are the only supported ones.
+"""
+
+import sys
+import json
+import mmap
+import struct
+import bisect
+import typing
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+import sqlalchemy_mate as sam
+import sqlalchemy_mate.api
+from atomicwrites import atomic_write
+
+from .model import SimpleZipcode
+
+MAGIC = b"USZIPSN1"
+"""
+the first 8 bytes of a snapshot file, including the format version.
+"""
+
+INT_NULL = -2 ** 63
+"""
+``int64`` value representing NULL in integer columns.
+"""
+
+STR_NULL = 2 ** 32 - 1
+"""
+``uint32`` value representing NULL in string and json columns.
+"""
+
+_ALIGN = 8
+
+_STR = "str"
+_JSON = "json"
+_INT = "int"
+_FLOAT = "float"
+
+_CODES = {
+    _STR: "I",
+    _JSON: "I",
+    _INT: "q",
+    _FLOAT: "d",
+}
+
+
+def _column_kind(column: sa.Column) -> str:
+    if isinstance(column.type, sam.types.api.CompressedJSONType):
+        return _JSON
+    elif isinstance(column.type, sa.Integer):
+        return _INT
+    elif isinstance(column.type, sa.Float):
+        return _FLOAT
+    else:
+        return _STR
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % _ALIGN)
+
+
+def create_snapshot(engine: Engine, path: str, table: sa.Table = None) -> int:
+    """
+    Dump the simple zipcode columns of ``table`` to a snapshot file.
+
+    :param engine: the database engine.
+    :param path: the output file path, it is written atomically.
+    :param table: the zipcode table, default is the simple zipcode table.
+        Only the columns of :class:`~uszipcode.model.SimpleZipcode` are
+        exported.
+
+    :return: number of zipcode in the snapshot.
+    """
+    if table is None:
+        table = SimpleZipcode.__table__
+    columns = [
+        table.columns[column.name]
+        for column in SimpleZipcode.__table__.columns
+        if column.name != SimpleZipcode.zipcode.name
+    ]
+    stmt = sa.select(table.columns["zipcode"], *columns) \
+        .order_by(table.columns["zipcode"])
+    with engine.connect() as conn:
+        rows = conn.execute(stmt).all()
+
+    # zipcode are ascii digits, sorted by the database collation, which is
+    # the same as bytes order
+    zipcode_list = [row[0].encode("ascii") for row in rows]
+    key_width = max([len(key) for key in zipcode_list], default=1)
+    keys = b"".join([key.ljust(key_width, b"\0") for key in zipcode_list])
+
+    string_mapper: typing.Dict[str, int] = dict()
+
+    def to_string_index(value: typing.Optional[str]) -> int:
+        if value is None:
+            return STR_NULL
+        try:
+            return string_mapper[value]
+        except KeyError:
+            string_mapper[value] = len(string_mapper)
+            return string_mapper[value]
+
+    sections = [("zipcode", "key", keys), ]
+    for ind, column in enumerate(columns, start=1):
+        kind = _column_kind(column)
+        values = [row[ind] for row in rows]
+        if kind == _STR:
+            values = [to_string_index(value) for value in values]
+        elif kind == _JSON:
+            values = [
+                to_string_index(None if value is None else json.dumps(value))
+                for value in values
+            ]
+        elif kind == _INT:
+            values = [INT_NULL if value is None else value for value in values]
+        else:
+            values = [
+                float("nan") if value is None else value
+                for value in values
+            ]
+        data = struct.pack("<{}{}".format(len(values), _CODES[kind]), *values)
+        sections.append((column.name, kind, data))
+
+    string_list = [s.encode("utf-8") for s in string_mapper]
+    offsets = [0, ]
+    for s in string_list:
+        offsets.append(offsets[-1] + len(s))
+    sections.append((
+        "_string_offsets", "offset",
+        struct.pack("<{}I".format(len(offsets)), *offsets),
+    ))
+    sections.append(("_string_data", "blob", b"".join(string_list)))
+
+    # section offsets are relative to the end of the metadata
+    metadata = {
+        "n_rows": len(rows),
+        "key_width": key_width,
+        "sections": list(),
+    }
+    offset = 0
+    for name, kind, data in sections:
+        metadata["sections"].append([name, kind, offset, len(data)])
+        offset += len(_pad(data))
+    metadata_bytes = _pad(json.dumps(metadata).encode("utf-8"))
+
+    with atomic_write(path, mode="wb", overwrite=True) as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(metadata_bytes)))
+        f.write(metadata_bytes)
+        for _, _, data in sections:
+            f.write(_pad(data))
+    return len(rows)
+
+
+class _KeyArray(object):
+    """
+    Sequence view of the fixed width key array, for :mod:`bisect`.
+    """
+
+    def __init__(self, buffer: memoryview, key_width: int, n_rows: int):
+        self.buffer = buffer
+        self.key_width = key_width
+        self.n_rows = n_rows
+
+    def __len__(self):
+        return self.n_rows
+
+    def __getitem__(self, ind: int) -> bytes:
+        start = ind * self.key_width
+        return self.buffer[start:start + self.key_width].tobytes()
+
+
+class Snapshot(object):
+    """
+    Read only zipcode lookup over a memory mapped snapshot file created by
+    :func:`create_snapshot`, or :meth:`~uszipcode.search.SearchEngine.create_snapshot`.
+
+    Usage::
+
+        >>> search.create_snapshot("simple.snapshot")
+        >>> with Snapshot("simple.snapshot") as snapshot:
+        ...     zipcode = snapshot.by_zipcode("10001")
+        ...     zipcode.major_city
+        'New York'
+    """
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":  # pragma: no cover
+            raise NotImplementedError(
+                "snapshot can only be mapped on little endian machine!"
+            )
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        if self._buffer[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("{} is not a uszipcode snapshot file!".format(path))
+        (metadata_length,) = struct.unpack_from("<Q", self._buffer, len(MAGIC))
+        start = len(MAGIC) + 8
+        metadata = json.loads(
+            self._buffer[start:start + metadata_length].tobytes().decode("utf-8")
+        )
+        start += metadata_length
+
+        self.n_rows: int = metadata["n_rows"]
+        self._views: typing.Dict[str, memoryview] = dict()
+        self._kinds: typing.Dict[str, str] = dict()
+        for name, kind, offset, length in metadata["sections"]:
+            view = self._buffer[start + offset:start + offset + length]
+            if kind in _CODES:
+                view = view.cast(_CODES[kind])
+            elif kind == "offset":
+                view = view.cast("I")
+            self._views[name] = view
+            self._kinds[name] = kind
+        self._keys = _KeyArray(
+            self._views["zipcode"], metadata["key_width"], self.n_rows,
+        )
+        self._string_offsets = self._views.pop("_string_offsets")
+        self._string_data = self._views.pop("_string_data")
+        del self._kinds["_string_offsets"]
+        del self._kinds["_string_data"]
+
+    def __len__(self):
+        return self.n_rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Release the memory map.
+        """
+        for view in getattr(self, "_views", dict()).values():
+            view.release()
+        for attr in ["_string_offsets", "_string_data", "_buffer"]:
+            view = getattr(self, attr, None)
+            if view is not None:
+                view.release()
+        self._mmap.close()
+
+    def _get_string(self, ind: int) -> typing.Optional[str]:
+        if ind == STR_NULL:
+            return None
+        start = self._string_offsets[ind]
+        end = self._string_offsets[ind + 1]
+        return self._string_data[start:end].tobytes().decode("utf-8")
+
+    def _find(self, zipcode: str) -> typing.Optional[int]:
+        try:
+            key = zipcode.encode("ascii")
+        except UnicodeEncodeError:
+            return None
+        if len(key) > self._keys.key_width:
+            return None
+        key = key.ljust(self._keys.key_width, b"\0")
+        ind = bisect.bisect_left(self._keys, key)
+        if (ind < self.n_rows) and (self._keys[ind] == key):
+            return ind
+        return None
+
+    def get_row(self, ind: int) -> typing.Dict[str, typing.Any]:
+        """
+        Read the ``ind`` th zipcode in the key order as a dict.
+        """
+        row = dict()
+        for name, kind in self._kinds.items():
+            if kind == "key":
+                row[name] = self._keys[ind].rstrip(b"\0").decode("ascii")
+                continue
+            value = self._views[name][ind]
+            if kind == _STR:
+                value = self._get_string(value)
+            elif kind == _JSON:
+                value = self._get_string(value)
+                if value is not None:
+                    value = json.loads(value)
+            elif kind == _INT:
+                if value == INT_NULL:
+                    value = None
+            elif value != value:  # NaN
+                value = None
+            row[name] = value
+        return row
+
+    def by_zipcode(
+        self,
+        zipcode: typing.Union[int, str],
+        zero_padding: bool = True,
+    ) -> typing.Optional[SimpleZipcode]:
+        """
+        Search zipcode by exact 5 digits zipcode, same as
+        :meth:`~uszipcode.search.SearchEngine.by_zipcode`. It returns a
+        :class:`~uszipcode.model.SimpleZipcode` object that doesn't belong to
+        any session.
+
+        :param zipcode: int or str.
+        :param zero_padding: bool, toggle on and off automatic zero padding.
+        """
+        if zero_padding:
+            zipcode = str(zipcode).zfill(5)
+        else:  # pragma: no cover
+            zipcode = str(zipcode)
+        ind = self._find(zipcode)
+        if ind is None:
+            return None
+        return SimpleZipcode(**self.get_row(ind))
+
+    def by_zipcodes(
+        self,
+        zipcodes: typing.Iterable[typing.Union[int, str]],
+        zero_padding: bool = True,
+    ) -> typing.List[typing.Optional[SimpleZipcode]]:
+        """
+        Search many zipcode by exact 5 digits zipcode at once, same as
+        :meth:`~uszipcode.search.SearchEngine.by_zipcodes`.
+        """
+        return [
+            self.by_zipcode(zipcode, zero_padding=zero_padding)
+            for zipcode in zipcodes
+        ]
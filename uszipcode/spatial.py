@@ -0,0 +1,922 @@
+# -*- coding: utf-8 -*-
+
+"""
+Great circle distance in Python and SQL, and the in memory spatial index
+for zipcode centroids.
+
+Every zipcode centroid is projected onto the unit sphere as a ``(x, y, z)``
+vector and stored in a KD-tree. The straight line (chord) distance between
+two unit vectors grows monotonically with the great circle distance, so a
+radius or k-nearest query on the sphere becomes a plain euclidean query in the
+tree. Only the candidates that survive the tree pruning are measured with the
+exact haversine formula.
+
+Zipcode boundary polygons are indexed by their bounding box in a static
+R-tree, a point is only tested against the polygons whose bounding box
+contains it.
+"""
+
+import math
+import heapq
+import typing
+from array import array
+
+import sqlalchemy as sa
+import sqlalchemy.orm as orm
+from haversine import haversine, Unit
+
+from .model import SimpleZipcode, ComprehensiveZipcode
+
+EARTH_RADIUS_IN_MILES = haversine((0, 0), (0, 180), unit=Unit.MILES) / math.pi
+"""
+the average earth radius used by the ``haversine`` library, in miles.
+"""
+
+SQLITE_DIST_FUNCTION_NAME = "uszipcode_dist_in_miles"
+"""
+name of the sqlite user defined function for :func:`dist_in_miles`.
+"""
+
+BATCH_TILE_SIZE = 0.5
+"""
+width and height in degree of the tiles used by
+:meth:`SpatialIndex.batch_query_nearest`, it must divide 180.
+"""
+
+BATCH_MATRIX_SIZE = 2 ** 22
+"""
+max number of cells of the query x centroid matrix computed at once by
+:meth:`SpatialIndex.batch_query_nearest`, about 32MB of float64.
+"""
+
+_LEAF = -1
+
+
+def dist_in_miles(
+    lat1: typing.Optional[float],
+    lng1: typing.Optional[float],
+    lat2: typing.Optional[float],
+    lng2: typing.Optional[float],
+) -> typing.Optional[float]:
+    """
+    Great circle distance in miles, the same as
+    :meth:`~uszipcode.model.AbstractSimpleZipcode.dist_from`. Returns None
+    if any of the coordinates is None, like a SQL function on NULL.
+    """
+    if (lat1 is None) or (lng1 is None) or (lat2 is None) or (lng2 is None):
+        return None
+    return haversine((lat1, lng1), (lat2, lng2), unit=Unit.MILES)
+
+
+def sql_dist_in_miles(
+    lat_column: sa.ColumnElement,
+    lng_column: sa.ColumnElement,
+    lat: float,
+    lng: float,
+    dialect_name: str,
+) -> sa.ColumnElement:
+    """
+    SQL expression of the great circle distance in miles between the
+    coordinates columns and a point.
+
+    On sqlite, it calls the :data:`SQLITE_DIST_FUNCTION_NAME` user defined
+    function, which has to be registered on the connection. On other
+    databases, it is the haversine formula with the standard ``sin``,
+    ``cos``, ``asin`` and ``sqrt`` functions.
+    """
+    if dialect_name == "sqlite":
+        return getattr(sa.func, SQLITE_DIST_FUNCTION_NAME)(
+            lat_column, lng_column, lat, lng,
+        )
+    rad = math.pi / 180
+    half_dlat = (lat_column - lat) * (rad / 2)
+    half_dlng = (lng_column - lng) * (rad / 2)
+    a = (
+        sa.func.sin(half_dlat) * sa.func.sin(half_dlat)
+        + math.cos(lat * rad) * sa.func.cos(lat_column * rad)
+        * sa.func.sin(half_dlng) * sa.func.sin(half_dlng)
+    )
+    return 2 * EARTH_RADIUS_IN_MILES * sa.func.asin(sa.func.sqrt(a))
+
+
+def to_unit_vector(lat: float, lng: float) -> typing.Tuple[float, float, float]:
+    """
+    Convert a latitude, longitude pair to a vector on the unit sphere.
+    """
+    lat, lng = math.radians(lat), math.radians(lng)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lng), cos_lat * math.sin(lng), math.sin(lat))
+
+
+def miles_to_chord(miles: float) -> float:
+    """
+    Convert a great circle distance in miles to the chord length between
+    the two points on the unit sphere.
+    """
+    theta = miles / EARTH_RADIUS_IN_MILES
+    if theta >= math.pi:
+        return 2.0
+    return 2.0 * math.sin(theta / 2.0)
+
+
+class SpatialIndex(object):
+    """
+    A KD-tree over zipcode centroids on the unit sphere.
+
+    :param records: iterable of ``(zipcode, zipcode_type, lat, lng)``.
+        records without coordinates are ignored.
+    :param leaf_size: max number of points stored in a leaf node.
+
+    Usage::
+
+        >>> index = SpatialIndex.from_session(ses, SimpleZipcode)
+        >>> index.query_radius(38.897835, -77.036541, radius=5)
+        [(0.38, "20004"), (0.52, "20006"), ...]
+        >>> index.query_nearest(38.897835, -77.036541, k=1)
+        [(0.38, "20004")]
+    """
+
+    def __init__(
+        self,
+        records: typing.Iterable[typing.Tuple[str, str, float, float]],
+        leaf_size: int = 16,
+    ):
+        self.zipcodes: typing.List[str] = list()
+        self.zipcode_types: typing.List[str] = list()
+        self.lats: typing.List[float] = list()
+        self.lngs: typing.List[float] = list()
+        self._xyz: typing.List[typing.Tuple[float, float, float]] = list()
+        for zipcode, zipcode_type, lat, lng in records:
+            if (lat is None) or (lng is None):
+                continue
+            self.zipcodes.append(zipcode)
+            self.zipcode_types.append(zipcode_type)
+            self.lats.append(lat)
+            self.lngs.append(lng)
+            self._xyz.append(to_unit_vector(lat, lng))
+        self.leaf_size = leaf_size
+        self._root = self._build(list(range(len(self.zipcodes))))
+        # numpy arrays for batch_query_nearest, by zipcode type
+        self._arrays: typing.Dict[typing.Optional[str], tuple] = dict()
+
+    @classmethod
+    def from_session(
+        cls,
+        ses: orm.Session,
+        zip_klass: typing.Union[typing.Type[SimpleZipcode], typing.Type[ComprehensiveZipcode]],
+        **kwargs
+    ) -> 'SpatialIndex':
+        """
+        Load all zipcode centroids from the database in one query and build
+        the index. Only four columns are selected, no ORM object is created.
+        """
+        stmt = sa.select(
+            zip_klass.zipcode,
+            zip_klass.zipcode_type,
+            zip_klass.lat,
+            zip_klass.lng,
+        )
+        return cls(ses.execute(stmt), **kwargs)
+
+    def __len__(self):
+        return len(self.zipcodes)
+
+    def _build(self, indices: typing.List[int]) -> tuple:
+        """
+        Recursively split the points on the axis with the largest spread.
+
+        A node is ``(axis, split, left, right)``. A leaf is
+        ``(_LEAF, None, indices, None)``.
+        """
+        if len(indices) <= self.leaf_size:
+            return (_LEAF, None, indices, None)
+        xyz = self._xyz
+        spreads = list()
+        for axis in range(3):
+            values = [xyz[i][axis] for i in indices]
+            spreads.append(max(values) - min(values))
+        axis = spreads.index(max(spreads))
+        indices.sort(key=lambda i: xyz[i][axis])
+        mid = len(indices) // 2
+        split = xyz[indices[mid]][axis]
+        return (
+            axis,
+            split,
+            self._build(indices[:mid]),
+            self._build(indices[mid:]),
+        )
+
+    def _dist(self, i: int, lat: float, lng: float) -> float:
+        return haversine(
+            (self.lats[i], self.lngs[i]), (lat, lng), unit=Unit.MILES,
+        )
+
+    def _collect_within(self, node, q, r2, zipcode_type, out):
+        axis, split, left, right = node
+        if axis == _LEAF:
+            xyz = self._xyz
+            for i in left:
+                if (zipcode_type is not None) \
+                        and (self.zipcode_types[i] != zipcode_type):
+                    continue
+                p = xyz[i]
+                d2 = (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+                if d2 <= r2:
+                    out.append(i)
+            return
+        diff = q[axis] - split
+        if diff < 0:
+            near, far = left, right
+        else:
+            near, far = right, left
+        self._collect_within(near, q, r2, zipcode_type, out)
+        if diff * diff <= r2:
+            self._collect_within(far, q, r2, zipcode_type, out)
+
+    def query_radius(
+        self,
+        lat: float,
+        lng: float,
+        radius: float,
+        zipcode_type: typing.Optional[str] = None,
+    ) -> typing.List[typing.Tuple[float, str]]:
+        """
+        Find all zipcode within ``radius`` miles from ``lat``, ``lng``.
+
+        :param zipcode_type: if specified, only returns this zipcode type.
+
+        :return: list of ``(dist, zipcode)`` sorted by distance ascending.
+        """
+        # a little slack to avoid losing points on the boundary because of
+        # floating point error, the exact haversine check removes them
+        r = miles_to_chord(radius) * 1.000001
+        indices = list()
+        self._collect_within(
+            self._root, to_unit_vector(lat, lng), r * r, zipcode_type, indices,
+        )
+        pairs = list()
+        for i in indices:
+            dist = self._dist(i, lat, lng)
+            if dist <= radius:
+                pairs.append((dist, self.zipcodes[i]))
+        pairs.sort()
+        return pairs
+
+    def _collect_nearest(self, node, q, k, heap, bound2, zipcode_type):
+        axis, split, left, right = node
+        if axis == _LEAF:
+            xyz = self._xyz
+            for i in left:
+                if (zipcode_type is not None) \
+                        and (self.zipcode_types[i] != zipcode_type):
+                    continue
+                p = xyz[i]
+                d2 = (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2 + (p[2] - q[2]) ** 2
+                if d2 > bound2:
+                    continue
+                # heap is a max heap of the k best so far, by negative d2
+                if len(heap) < k:
+                    heapq.heappush(heap, (-d2, i))
+                elif d2 < -heap[0][0]:
+                    heapq.heapreplace(heap, (-d2, i))
+            return
+        diff = q[axis] - split
+        if diff < 0:
+            near, far = left, right
+        else:
+            near, far = right, left
+        self._collect_nearest(near, q, k, heap, bound2, zipcode_type)
+        worst2 = -heap[0][0] if len(heap) == k else bound2
+        if diff * diff <= min(worst2, bound2):
+            self._collect_nearest(far, q, k, heap, bound2, zipcode_type)
+
+    def query_nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int = 1,
+        radius: typing.Optional[float] = None,
+        zipcode_type: typing.Optional[str] = None,
+    ) -> typing.List[typing.Tuple[float, str]]:
+        """
+        Find the ``k`` nearest zipcode from ``lat``, ``lng``.
+
+        :param radius: if specified, ignore zipcode further than ``radius``
+            miles.
+        :param zipcode_type: if specified, only returns this zipcode type.
+
+        :return: list of ``(dist, zipcode)`` sorted by distance ascending,
+            at most ``k`` items.
+        """
+        if k <= 0:
+            return []
+        if radius is None:
+            bound2 = 4.0
+        else:
+            bound2 = (miles_to_chord(radius) * 1.000001) ** 2
+        heap = list()
+        self._collect_nearest(
+            self._root, to_unit_vector(lat, lng), k, heap, bound2, zipcode_type,
+        )
+        pairs = list()
+        for _, i in heap:
+            dist = self._dist(i, lat, lng)
+            if (radius is None) or (dist <= radius):
+                pairs.append((dist, self.zipcodes[i]))
+        pairs.sort()
+        return pairs
+
+    def _get_arrays(self, zipcode_type: typing.Optional[str]) -> tuple:
+        """
+        numpy arrays of the centroids of ``zipcode_type``, built once per
+        type: positions in :attr:`SpatialIndex.zipcodes`, unit vectors,
+        latitudes and longitudes in radians, all sorted by
+        :data:`BATCH_TILE_SIZE` tile, and the sorted tile keys.
+        """
+        import numpy as np
+
+        if zipcode_type in self._arrays:
+            return self._arrays[zipcode_type]
+        positions = np.array([
+            i for i, type_ in enumerate(self.zipcode_types)
+            if (zipcode_type is None) or (type_ == zipcode_type)
+        ], dtype=np.int64)
+        lats = np.array(self.lats, dtype=np.float64)[positions]
+        lngs = np.array(self.lngs, dtype=np.float64)[positions]
+        keys = _tile_key(*_tile_indexes(np, lats, lngs))
+        order = np.argsort(keys, kind="stable")
+        positions = positions[order]
+        xyz = np.array(self._xyz, dtype=np.float64).reshape(-1, 3)[positions]
+        arrays = (
+            positions, xyz,
+            np.radians(lats[order]), np.radians(lngs[order]),
+            keys[order],
+        )
+        self._arrays[zipcode_type] = arrays
+        return arrays
+
+    def _batch_nearest_among(
+        self,
+        np,
+        arrays: tuple,
+        q_lats,
+        q_lngs,
+        q_xyz,
+        candidates,
+        k: int,
+        radius: typing.Optional[float],
+    ) -> tuple:
+        """
+        The ``k`` nearest centroids of each query point among its
+        ``candidates``, the query coordinates are in radians.
+
+        :param candidates: a ``(n_points, width)`` array of indexes in
+            ``arrays``, -1 for padding, or a 1D array shared by all points.
+
+        :return: two ``(n_points, min(k, width))`` arrays, the positions in
+            :attr:`SpatialIndex.zipcodes` (-1 if not found) and the distances
+            in miles (NaN if not found), nearest first.
+        """
+        positions, xyz, c_lats, c_lngs, _ = arrays
+        width = candidates.shape[-1]
+        k_ = min(k, width)
+        if candidates.ndim == 1:
+            dot = q_xyz @ xyz[candidates].T
+            padding = None
+        else:
+            padding = candidates < 0
+            dot = np.einsum("ij,ikj->ik", q_xyz, xyz[candidates])
+            dot[padding] = -np.inf
+        if k_ < width:
+            nearest = np.argpartition(-dot, k_ - 1, axis=1)[:, :k_]
+        else:
+            nearest = np.broadcast_to(np.arange(k_), dot.shape).copy()
+        if candidates.ndim == 1:
+            nearest = candidates[nearest]
+            missing = np.zeros(nearest.shape, dtype=bool)
+        else:
+            missing = np.take_along_axis(padding, nearest, axis=1)
+            nearest = np.take_along_axis(candidates, nearest, axis=1)
+
+        # haversine, the same formula as the ``haversine`` library
+        lat1 = q_lats[:, None]
+        lat2 = c_lats[nearest]
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) \
+            * np.sin((c_lngs[nearest] - q_lngs[:, None]) / 2) ** 2
+        dists = 2 * EARTH_RADIUS_IN_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        dists[missing] = np.inf
+
+        order = np.argsort(dists, axis=1, kind="stable")
+        found = positions[np.take_along_axis(nearest, order, axis=1)]
+        dists = np.take_along_axis(dists, order, axis=1)
+        not_found = np.isinf(dists)
+        if radius is not None:
+            not_found |= dists > radius
+        found[not_found] = -1
+        dists[not_found] = np.nan
+        return found, dists
+
+    def batch_query_nearest(
+        self,
+        lats,
+        lngs,
+        k: int = 1,
+        radius: typing.Optional[float] = None,
+        zipcode_type: typing.Optional[str] = None,
+    ) -> tuple:
+        """
+        Vectorized :meth:`SpatialIndex.query_nearest` for many coordinates,
+        it requires ``numpy``.
+
+        Centroids are sorted by :data:`BATCH_TILE_SIZE` tile. Each point is
+        compared with the centroids of its tile and the 8 neighbor tiles,
+        gathered in a padded matrix, points with about the same number of
+        candidates at once. A point whose ``k`` th nearest centroid could be
+        outside of the 9 tiles, for example in the ocean, is compared with
+        all centroids. There is no Python code per point.
+
+        :param lats: array like of latitude, None or NaN for null.
+        :param lngs: array like of longitude, same length as ``lats``.
+
+        :return: two ``(n_points, k)`` arrays, the positions in
+            :attr:`SpatialIndex.zipcodes` (-1 if not found) and the distances
+            in miles (NaN if not found), nearest first.
+        """
+        import numpy as np
+
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lngs = np.asarray(lngs, dtype=np.float64).reshape(-1)
+        if lats.shape != lngs.shape:
+            raise ValueError("`lats` and `lngs` must have the same length!")
+        n_points = lats.shape[0]
+        result_positions = np.full((n_points, max(k, 0)), -1, dtype=np.int64)
+        result_dists = np.full((n_points, max(k, 0)), np.nan, dtype=np.float64)
+        arrays = self._get_arrays(zipcode_type)
+        keys = arrays[4]
+        n_centroids = keys.shape[0]
+        if (k <= 0) or (n_centroids == 0):
+            return result_positions, result_dists
+
+        valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lngs)))
+        v_lats, v_lngs = lats[valid], lngs[valid]
+        q_lats, q_lngs = np.radians(v_lats), np.radians(v_lngs)
+        cos_q_lats = np.cos(q_lats)
+        q_xyz = np.stack([
+            cos_q_lats * np.cos(q_lngs), cos_q_lats * np.sin(q_lngs), np.sin(q_lats),
+        ], axis=1)
+
+        def save(members, found, dists):
+            rows = valid[members]
+            result_positions[rows, :found.shape[1]] = found
+            result_dists[rows, :found.shape[1]] = dists
+
+        # distance from the point to the border of the 9 tiles around it,
+        # any centroid outside of the 9 tiles is further than that
+        tile = BATCH_TILE_SIZE
+        n_cols = int(round(360 / tile))
+        rows, cols = _tile_indexes(np, v_lats, v_lngs)
+        south, north = (rows - 1) * tile, (rows + 2) * tile
+        d_lat = np.minimum(v_lats - south, north - v_lats)
+        d_lng = np.radians(np.minimum(
+            np.mod(v_lngs - (cols - 1) * tile, 360.0),
+            np.mod((cols + 2) * tile - v_lngs, 360.0),
+        ))
+        margin = EARTH_RADIUS_IN_MILES * np.minimum(
+            np.radians(d_lat),
+            np.arcsin(np.minimum(cos_q_lats * np.sin(np.minimum(d_lng, np.pi / 2)), 1.0)),
+        )
+        margin[(south <= -90) | (north >= 90)] = -1.0  # near the poles
+
+        # index range in ``keys`` of each of the 9 tiles around each point
+        neighbor_keys = np.stack([
+            _tile_key(rows + d_row, np.mod(cols + d_col, n_cols))
+            for d_row in (-1, 0, 1)
+            for d_col in (-1, 0, 1)
+        ], axis=1)
+        lows = np.searchsorted(keys, neighbor_keys, side="left")
+        counts = np.searchsorted(keys, neighbor_keys, side="right") - lows
+        totals = counts.sum(axis=1)
+
+        pending = [np.flatnonzero(totals == 0)]
+        members_by_total = np.flatnonzero(totals > 0)
+        members_by_total = members_by_total[np.argsort(totals[members_by_total], kind="stable")]
+        start = 0
+        while start < members_by_total.shape[0]:
+            # points are sorted by number of candidates, the last one of a
+            # chunk is the widest
+            chunk_size = max(1, BATCH_MATRIX_SIZE // int(totals[members_by_total[start]]))
+            members = members_by_total[start:start + chunk_size]
+            while (members.shape[0] > 1) \
+                    and (members.shape[0] * int(totals[members[-1]]) > BATCH_MATRIX_SIZE):
+                members = members[:members.shape[0] // 2]
+            start += members.shape[0]
+
+            # concatenate the index ranges of the 9 tiles of each point,
+            # then pad the rows to the same width
+            m_counts = counts[members].ravel()
+            m_totals = totals[members]
+            n_candidates = int(m_totals.sum())
+            range_starts = np.cumsum(m_counts) - m_counts
+            flat = np.repeat(lows[members].ravel() - range_starts, m_counts) \
+                + np.arange(n_candidates)
+            row_starts = np.cumsum(m_totals) - m_totals
+            candidates = np.full((members.shape[0], int(m_totals[-1])), -1, dtype=np.int64)
+            candidates[
+                np.repeat(np.arange(members.shape[0]), m_totals),
+                np.arange(n_candidates) - np.repeat(row_starts, m_totals),
+            ] = flat
+
+            found, dists = self._batch_nearest_among(
+                np, arrays, q_lats[members], q_lngs[members], q_xyz[members],
+                candidates, k, radius,
+            )
+            member_margin = margin[members]
+            if found.shape[1] == k:
+                ok = dists[:, k - 1] <= member_margin
+            else:
+                ok = np.zeros(members.shape[0], dtype=bool)
+            if radius is not None:
+                # all centroids within radius are in the 9 tiles
+                ok |= (radius <= member_margin)
+            save(members[ok], found[ok], dists[ok])
+            pending.append(members[~ok])
+
+        pending = np.concatenate(pending)
+        all_candidates = np.arange(n_centroids)
+        chunk_size = max(1, BATCH_MATRIX_SIZE // n_centroids)
+        for start in range(0, pending.shape[0], chunk_size):
+            members = pending[start:start + chunk_size]
+            found, dists = self._batch_nearest_among(
+                np, arrays, q_lats[members], q_lngs[members], q_xyz[members],
+                all_candidates, k, radius,
+            )
+            save(members, found, dists)
+        return result_positions, result_dists
+
+
+def _tile_indexes(np, lats, lngs) -> tuple:
+    tile = BATCH_TILE_SIZE
+    n_cols = int(round(360 / tile))
+    rows = np.floor(lats / tile).astype(np.int64)
+    cols = np.mod(np.floor(lngs / tile).astype(np.int64), n_cols)
+    return rows, cols
+
+
+def _tile_key(rows, cols):
+    # rows are shifted to be non negative, so keys sort by row then col
+    n_rows = int(round(180 / BATCH_TILE_SIZE))
+    n_cols = int(round(360 / BATCH_TILE_SIZE))
+    return (rows + n_rows) * n_cols + cols
+
+
+class RTree(object):
+    """
+    A static R-tree of rectangles, packed with the Sort-Tile-Recursive
+    algorithm.
+
+    :param items: iterable of ``(key, west, south, east, north)``.
+    :param node_size: max number of children of a node.
+
+    Usage::
+
+        >>> rtree = RTree([("a", 0, 0, 1, 1), ("b", 2, 2, 3, 3)])
+        >>> rtree.query_point(0.5, 0.5)
+        ['a']
+        >>> rtree.query_bbox(0, 0, 5, 5)
+        ['a', 'b']
+    """
+
+    def __init__(
+        self,
+        items: typing.Iterable[typing.Tuple[typing.Any, float, float, float, float]],
+        node_size: int = 16,
+    ):
+        self.node_size = node_size
+        # a node is (west, south, east, north, children, key), children is
+        # None for a leaf entry
+        nodes = [
+            (west, south, east, north, None, key)
+            for key, west, south, east, north in items
+        ]
+        self._size = len(nodes)
+        while len(nodes) > node_size:
+            nodes = self._pack(nodes)
+        self._root = self._make_parent(nodes)
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def _make_parent(children: list) -> tuple:
+        if not children:
+            return (math.inf, math.inf, -math.inf, -math.inf, [], None)
+        return (
+            min([child[0] for child in children]),
+            min([child[1] for child in children]),
+            max([child[2] for child in children]),
+            max([child[3] for child in children]),
+            children,
+            None,
+        )
+
+    def _pack(self, nodes: list) -> list:
+        """
+        Group nodes into parents of at most ``node_size`` children: sort by
+        x center into vertical slices, then sort each slice by y center.
+        """
+        n_parents = math.ceil(len(nodes) / self.node_size)
+        slice_size = math.ceil(math.sqrt(n_parents)) * self.node_size
+        nodes = sorted(nodes, key=lambda node: node[0] + node[2])
+        parents = list()
+        for i in range(0, len(nodes), slice_size):
+            slice_ = sorted(
+                nodes[i:i + slice_size], key=lambda node: node[1] + node[3],
+            )
+            for j in range(0, len(slice_), self.node_size):
+                parents.append(self._make_parent(slice_[j:j + self.node_size]))
+        return parents
+
+    def query_bbox(
+        self,
+        west: float,
+        south: float,
+        east: float,
+        north: float,
+    ) -> list:
+        """
+        Return keys of all rectangles intersecting the box.
+        """
+        keys = list()
+        stack = [self._root, ]
+        while stack:
+            node = stack.pop()
+            if (node[0] > east) or (node[2] < west) \
+                    or (node[1] > north) or (node[3] < south):
+                continue
+            if node[4] is None:
+                keys.append(node[5])
+            else:
+                stack.extend(node[4])
+        return keys
+
+    def query_point(self, x: float, y: float) -> list:
+        """
+        Return keys of all rectangles containing the point.
+        """
+        return self.query_bbox(x, y, x, y)
+
+
+def to_rings(polygon: list) -> typing.List[array]:
+    """
+    Convert a polygon, a list of ``[lng, lat]`` pairs, or a nested list of
+    them (multiple rings), to flat coordinate arrays
+    ``array("d", [lng0, lat0, lng1, lat1, ...])``, one per ring.
+    """
+    rings = list()
+    stack = [polygon, ]
+    while stack:
+        item = stack.pop()
+        if not item:
+            continue
+        if isinstance(item[0][0], (int, float)):
+            ring = array("d")
+            for lng, lat in item:
+                ring.append(lng)
+                ring.append(lat)
+            rings.append(ring)
+        else:
+            stack.extend(item)
+    return rings
+
+
+def rings_bounds(rings: typing.List[array]) -> typing.Tuple[float, float, float, float]:
+    """
+    Return ``(west, south, east, north)`` of the rings.
+    """
+    return (
+        min([min(ring[0::2]) for ring in rings]),
+        min([min(ring[1::2]) for ring in rings]),
+        max([max(ring[0::2]) for ring in rings]),
+        max([max(ring[1::2]) for ring in rings]),
+    )
+
+
+def point_in_rings(rings: typing.List[array], x: float, y: float) -> bool:
+    """
+    Ray casting test with the even-odd rule, holes and multi polygons are
+    supported as separate rings.
+    """
+    inside = False
+    for ring in rings:
+        n = len(ring)
+        x1, y1 = ring[n - 2], ring[n - 1]
+        for i in range(0, n, 2):
+            x2, y2 = ring[i], ring[i + 1]
+            if (y2 > y) != (y1 > y):
+                if x < (x1 - x2) * (y - y2) / (y1 - y2) + x2:
+                    inside = not inside
+            x1, y1 = x2, y2
+    return inside
+
+
+class PolygonIndex(object):
+    """
+    Point in polygon lookup of zipcode boundaries.
+
+    The bounding boxes are kept in a :class:`RTree`. Polygons are added with
+    :meth:`PolygonIndex.add` when they are needed, and cached as compact
+    coordinate arrays.
+
+    :param records: iterable of ``(zipcode, west, south, east, north)``.
+    """
+
+    def __init__(
+        self,
+        records: typing.Iterable[typing.Tuple[str, float, float, float, float]],
+    ):
+        self._area: typing.Dict[str, float] = dict()
+        items = list()
+        for zipcode, west, south, east, north in records:
+            self._area[zipcode] = (east - west) * (north - south)
+            items.append((zipcode, west, south, east, north))
+        self.rtree = RTree(items)
+        self._rings: typing.Dict[str, typing.List[array]] = dict()
+
+    @classmethod
+    def from_session(
+        cls,
+        ses: orm.Session,
+        zip_klass: typing.Type[ComprehensiveZipcode],
+    ) -> 'PolygonIndex':
+        """
+        Load the bounding box of all zipcode having a polygon. If the
+        ``bounds_*`` columns are null, the polygon is loaded to compute it.
+        """
+        has_bounds = sa.and_(
+            zip_klass.bounds_west.isnot(None),
+            zip_klass.bounds_south.isnot(None),
+            zip_klass.bounds_east.isnot(None),
+            zip_klass.bounds_north.isnot(None),
+        )
+        stmt = sa.select(
+            zip_klass.zipcode,
+            zip_klass.bounds_west,
+            zip_klass.bounds_south,
+            zip_klass.bounds_east,
+            zip_klass.bounds_north,
+        ).where(zip_klass.polygon.isnot(None), has_bounds)
+        records = list(ses.execute(stmt))
+
+        rings_mapper = dict()
+        stmt = sa.select(zip_klass.zipcode, zip_klass.polygon) \
+            .where(zip_klass.polygon.isnot(None), sa.not_(has_bounds))
+        for zipcode, polygon in ses.execute(stmt):
+            rings = to_rings(polygon)
+            if rings:
+                rings_mapper[zipcode] = rings
+                records.append((zipcode, *rings_bounds(rings)))
+
+        index = cls(records)
+        index._rings.update(rings_mapper)
+        return index
+
+    def __len__(self):
+        return len(self.rtree)
+
+    def candidates(self, lat: float, lng: float) -> typing.List[str]:
+        """
+        Zipcode whose bounding box contains the point, smallest box first.
+        """
+        zipcode_list = self.rtree.query_point(lng, lat)
+        zipcode_list.sort(key=lambda zipcode: (self._area[zipcode], zipcode))
+        return zipcode_list
+
+    def missing(self, zipcode_list: typing.Iterable[str]) -> typing.List[str]:
+        """
+        Zipcode whose polygon is not added yet.
+        """
+        return [
+            zipcode for zipcode in zipcode_list
+            if zipcode not in self._rings
+        ]
+
+    def add(self, zipcode: str, polygon: list):
+        """
+        Cache the polygon of a zipcode.
+        """
+        self._rings[zipcode] = to_rings(polygon)
+
+    def contains(self, zipcode: str, lat: float, lng: float) -> bool:
+        """
+        Exact test if the polygon of the zipcode contains the point, the
+        polygon has to be added.
+        """
+        return point_in_rings(self._rings[zipcode], lng, lat)
+
+
+CLUSTER_CELLS_PER_TILE = 4
+"""
+number of grid cells per side of a web map tile, when the cluster grid is
+derived from the map zoom level. A 256 pixels tile has 64 pixels cells.
+"""
+
+
+def normalize_lng(lng: float) -> float:
+    """
+    Wrap longitude into ``[-180, 180)``.
+    """
+    return (lng + 180) % 360 - 180
+
+
+def lng_span(west: float, east: float) -> float:
+    """
+    Width in degree of the longitude range from ``west`` to ``east``, it
+    crosses the antimeridian if ``west > east``.
+    """
+    if west <= east:
+        return east - west
+    return east - west + 360
+
+
+def grid_cell_size(
+    west: float,
+    south: float,
+    east: float,
+    north: float,
+    max_cells: int,
+    zoom: typing.Optional[int] = None,
+) -> float:
+    """
+    Cell size in degree of the square grid over a bounding box.
+
+    If ``zoom`` is specified, there are :data:`CLUSTER_CELLS_PER_TILE` cells
+    per side of a web map tile at this zoom level, so the grid is stable when
+    the map is panned. Otherwise, the cells are as small as possible while
+    the grid has at most ``max_cells`` cells.
+    """
+    if zoom is not None:
+        return 360 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+    width = lng_span(west, east)
+    height = north - south
+    cell_size = max(
+        math.sqrt(width * height / max_cells),
+        max(width, height) / max_cells,
+        1e-9,
+    )
+    while (math.floor(width / cell_size) + 1) \
+            * (math.floor(height / cell_size) + 1) > max_cells:
+        cell_size *= 1.05
+    return cell_size
+
+
+class Cluster(object):
+    """
+    Zipcode in a grid cell of a bounding box search, see
+    :meth:`~uszipcode.search.SearchEngine.by_bbox`.
+
+    :param lat: average latitude of the zipcode centroids.
+    :param lng: average longitude of the zipcode centroids.
+    :param count: number of zipcode.
+    :param population: total population of the zipcode.
+    :param west: bounds of the grid cell.
+    :param south: bounds of the grid cell.
+    :param east: bounds of the grid cell.
+    :param north: bounds of the grid cell.
+    """
+
+    def __init__(
+        self,
+        lat: float,
+        lng: float,
+        count: int,
+        population: int,
+        west: float,
+        south: float,
+        east: float,
+        north: float,
+    ):
+        self.lat = lat
+        self.lng = lng
+        self.count = count
+        self.population = population
+        self.west = west
+        self.south = south
+        self.east = east
+        self.north = north
+
+    def __repr__(self):
+        return "Cluster(lat={!r}, lng={!r}, count={!r}, population={!r})".format(
+            self.lat, self.lng, self.count, self.population,
+        )
+
+    def to_dict(self) -> dict:
+        return dict(
+            lat=self.lat,
+            lng=self.lng,
+            count=self.count,
+            population=self.population,
+            west=self.west,
+            south=self.south,
+            east=self.east,
+            north=self.north,
+        )